@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+A typical 5 AT command sequence, the firmware query, sent by at() one by
+one against CellMgmt.at_batch(), with the fake cell_mgmt.
+
+    python benchmarks/bench_at_batch.py [-n 20] [--latency 0.05]
+
+Reports per sequence wall time, spawned processes and modem lock
+acquisitions.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+SEQUENCE = [
+    "ATE0",
+    "AT!ENTERCND=\"A710\"",
+    "AT+CGMR",
+    ("AT!priid?", 3),
+    "AT!GOBIIMPREF?",
+]
+
+
+def one_by_one(cell_mgmt):
+    return [
+        cell_mgmt.at(cmd) if isinstance(cmd, basestring)
+        else cell_mgmt.at(*cmd)
+        for cmd in SEQUENCE]
+
+
+def batch(cell_mgmt):
+    return cell_mgmt.at_batch(SEQUENCE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds the fake modem takes per command")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_at_batch.")
+    os.environ["FAKE_CELL_MGMT_STATE"] = os.path.join(workdir, "modem.json")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + \
+        os.environ["PATH"]
+
+    from fake_cell_mgmt import Modem
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.lock import ModemLock
+
+    modem = Modem()
+    modem.init({"latency": {"default": args.latency}, "jitter": 0})
+    cell_mgmt = CellMgmt()
+
+    print "{:<12} {:>10} {:>10} {:>8}".format(
+        "method", "wall ms", "spawns", "locks")
+    expected = None
+    for name, func in [("at", one_by_one), ("at_batch", batch)]:
+        CellMgmt._lock = ModemLock(os.path.join(workdir, name + ".lock"))
+        modem.init({"latency": {"default": args.latency}, "jitter": 0})
+        shells = [0]
+        shell = cell_mgmt._shell
+
+        def counting_shell(*shell_args, **kwargs):
+            shells[0] += 1
+            return shell(*shell_args, **kwargs)
+        cell_mgmt._shell = counting_shell
+
+        begin = monotonic()
+        for _ in xrange(args.number):
+            result = func(cell_mgmt)
+        wall = monotonic() - begin
+        cell_mgmt._shell = shell
+
+        if expected is None:
+            expected = result
+        elif result != expected:
+            print "results differ: {} != {}".format(result, expected)
+
+        spawns = sum(modem.stats()["calls"].values()) + shells[0]
+        locks = sum([
+            lock["count"] for lock in CellMgmt.lock_stats().values()])
+        print "{:<12} {:>10.1f} {:>10.1f} {:>8.1f}".format(
+            name, wall * 1000 / args.number,
+            float(spawns) / args.number, float(locks) / args.number)
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
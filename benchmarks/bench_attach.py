@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Attach detection latency of Manager._attach() against a pty fake modem
+over the "at" backend, polling attach_status only against waking on
+registration URCs.
+
+    python benchmarks/bench_attach.py [-n 10] [--delay 3]
+
+Each trial starts _attach() detached, attaches the modem after a random
+delay up to --delay seconds and reports the time from attach until
+_attach() returns, and the AT+CGATT? queries it made.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+from threading import Thread
+from time import sleep
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from cellular_utility.at_session import AtSessionBackend  # noqa
+from cellular_utility.cell_mgmt import CellMgmt  # noqa
+from cellular_utility.lock import ModemLock  # noqa
+from cellular_utility.management import Manager  # noqa
+from cellular_utility.scheduler import CommandScheduler  # noqa
+from cellular_utility.tests.fake_modem import FakeModem  # noqa
+from cellular_utility.urc import UrcListener  # noqa
+
+
+class Modem(object):
+    def __init__(self):
+        self.attached = False
+        self.fake = FakeModem({
+            "ATE0": [],
+            "AT+CMEE=2": [],
+            "AT+COPS=3,0": [],
+            "AT+CPIN?": ["+CPIN: READY"],
+            "AT+CREG=2": [],
+            "AT+CGREG=2": [],
+            "AT+CEREG=2": [],
+            "AT+CMER=3,0,0,1": [],
+            "AT+CGREG?": lambda cmd: [
+                "+CGREG: 2,{}".format(1 if self.attached else 2)],
+            "AT+CEREG?": lambda cmd: [
+                "+CEREG: 2,{}".format(1 if self.attached else 2)],
+            "AT+CGATT?": lambda cmd: [
+                "+CGATT: {}".format(1 if self.attached else 0)],
+        })
+
+    def attach(self):
+        self.attached = True
+        self.fake.send_urc("+CGREG: 1")
+
+    def detach(self):
+        self.attached = False
+        self.fake.send_urc("+CGREG: 2")
+
+    def queries(self):
+        return self.fake.received.count("AT+CGATT?")
+
+
+def trial(mgr, modem, delay):
+    modem.detach()
+    sleep(0.2)
+    queries = modem.queries()
+
+    result = []
+    thread = Thread(target=lambda: result.append(mgr._attach()))
+    thread.start()
+
+    sleep(random.uniform(0, delay))
+    attached_at = monotonic()
+    modem.attach()
+    thread.join()
+    latency = monotonic() - attached_at
+
+    return result[0], latency, modem.queries() - queries
+
+
+def run(use_urc, number, delay):
+    modem = Modem()
+    backend = AtSessionBackend(modem.fake.port)
+    CellMgmt.set_backend(backend)
+    CellMgmt._cache.clear()
+
+    listener = None
+    if use_urc:
+        listener = UrcListener(backend.session)
+        listener.start()
+
+    scheduler = CommandScheduler(CellMgmt())
+    scheduler.start()
+    mgr = Manager(
+        dev_name="lo",
+        enabled=True,
+        pin=None,
+        pdp_context_static=False,
+        pdp_context_id=1,
+        pdp_context_primary_apn="internet",
+        pdp_context_primary_type="ipv4v6",
+        pdp_context_primary_auth="none",
+        pdp_context_retry_timeout=60,
+        keepalive_enabled=False,
+        keepalive_host="127.0.0.1",
+        keepalive_period_sec=60,
+        log_period_sec=60,
+        scheduler=scheduler,
+        urc_listener=listener)
+    # _attach() runs without the Manager thread, as if started
+    mgr._stop = False
+    if listener is not None:
+        listener.subscribe(mgr._on_urc)
+
+    latencies = []
+    queries = []
+    for _ in xrange(number):
+        attached, latency, count = trial(mgr, modem, delay)
+        if not attached:
+            print "attach timed out"
+        latencies.append(latency)
+        queries.append(count)
+
+    if listener is not None:
+        listener.stop()
+    scheduler.stop()
+    CellMgmt.set_backend(None)
+    modem.fake.close()
+
+    latencies.sort()
+    return {
+        "mean_ms": sum(latencies) * 1000 / number,
+        "max_ms": latencies[-1] * 1000,
+        "queries": float(sum(queries)) / number
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=10)
+    parser.add_argument("--delay", type=float, default=3.0,
+                        help="attach within this many seconds")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_attach.")
+    # never contend with a real modem on this box
+    CellMgmt._lock = ModemLock(os.path.join(workdir, "cell_mgmt.lock"))
+
+    print "{:<8} {:>10} {:>10} {:>10}".format(
+        "wait", "mean ms", "max ms", "queries")
+    for name, use_urc in [("poll", False), ("urc", True)]:
+        result = run(use_urc, args.number, args.delay)
+        print "{:<8} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            name, result["mean_ms"], result["max_ms"], result["queries"])
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
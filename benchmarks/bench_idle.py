@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Wake-ups of the bundle while idle: Manager connected against the fake
+cell_mgmt, nothing to do until the next keepalive.
+
+    python benchmarks/bench_idle.py [--window 20]
+
+Reports the context switches of all threads of this process per second
+over the window, and the threads alive. Observation queries in the
+window are counted too, they are work rather than polling.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+from time import sleep
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+
+def context_switches():
+    """Return the context switches of all threads of this process."""
+    total = 0
+    task_dir = "/proc/self/task"
+    for tid in os.listdir(task_dir):
+        try:
+            with open(os.path.join(task_dir, tid, "status")) as status:
+                for line in status:
+                    if line.startswith(("voluntary_ctxt_switches:",
+                                        "nonvoluntary_ctxt_switches:")):
+                        total += int(line.split()[1])
+        except IOError:
+            # thread gone meanwhile
+            pass
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--window", type=float, default=20,
+                        help="seconds to measure once connected")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_idle.")
+    os.environ["FAKE_CELL_MGMT_STATE"] = os.path.join(workdir, "modem.json")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + \
+        os.environ["PATH"]
+
+    from fake_cell_mgmt import Modem
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.lock import ModemLock
+    from cellular_utility.management import Manager
+
+    # never contend with a real modem on this box
+    CellMgmt._lock = ModemLock(os.path.join(workdir, "cell_mgmt.lock"))
+    CellMgmt._cache.clear()
+
+    modem = Modem()
+    modem.init({"latency": {"default": 0.01, "start": 0.1}, "jitter": 0})
+
+    mgr = Manager(
+        dev_name="lo",
+        enabled=True,
+        pin=None,
+        pdp_context_static=False,
+        pdp_context_id=1,
+        pdp_context_primary_apn="internet",
+        pdp_context_primary_type="ipv4v6",
+        pdp_context_primary_auth="none",
+        pdp_context_retry_timeout=60,
+        keepalive_enabled=True,
+        keepalive_host="127.0.0.1",
+        keepalive_period_sec=3600,
+        log_period_sec=60)
+    mgr.start()
+
+    while mgr.status() != Manager.Status.connected:
+        sleep(0.1)
+    # let the first observation and log settle
+    sleep(2)
+
+    calls = sum(modem.stats()["calls"].values())
+    switches = context_switches()
+    begin = monotonic()
+    sleep(args.window)
+    elapsed = monotonic() - begin
+    switches = context_switches() - switches
+    calls = sum(modem.stats()["calls"].values()) - calls
+    threads = len(os.listdir("/proc/self/task"))
+
+    mgr.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    print "window:               {:.1f}s".format(elapsed)
+    print "context switches/s:   {:.1f}".format(switches / elapsed)
+    print "threads:              {}".format(threads)
+    print "cell_mgmt calls:      {}".format(calls)
+
+
+if __name__ == "__main__":
+    main()
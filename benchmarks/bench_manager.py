@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Drive Manager end to end against the fake cell_mgmt, report how long the
+state machine takes to connect, recover and how many cell_mgmt calls it
+makes.
+
+    python benchmarks/bench_manager.py --profile signal-loss --duration 60
+    python benchmarks/bench_manager.py --profile-file my_profile.json
+
+See fake_cell_mgmt.py for the profile format.
+"""
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+from time import sleep
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+PROFILES = {
+    "fast": {
+        "latency": {"default": 0.01, "start": 0.1, "power_on": 0.2}
+    },
+    "typical": {
+        "latency": {
+            "default": 0.1, "m_info": 0.4, "signal_adv": 0.3,
+            "location_info": 0.3, "start": 3.0, "stop": 0.5,
+            "power_off": 1.0, "power_on": 8.0
+        }
+    },
+    "flaky": {
+        "latency": {"default": 0.1, "start": 2.0, "power_on": 5.0},
+        "busy_rate": {"default": 0.15},
+        "failure_rate": {"start": 0.3, "get_profiles": 0.05}
+    },
+    "sim-removal": {
+        "latency": {"default": 0.05, "start": 1.0, "power_on": 2.0},
+        "scenario": [
+            {"at": 10, "set": {"sim": "nosim"}},
+            {"at": 25, "set": {"sim": "ready"}}
+        ]
+    },
+    "signal-loss": {
+        "latency": {"default": 0.05, "start": 1.0, "power_on": 2.0},
+        "scenario": [
+            {"at": 10, "set": {"csq": 99, "registered": False}},
+            {"at": 25, "set": {"csq": 21, "registered": True}}
+        ]
+    },
+}
+
+
+def run(profile, duration, keepalive_period):
+    workdir = tempfile.mkdtemp(prefix="bench_manager.")
+    os.environ["FAKE_CELL_MGMT_STATE"] = os.path.join(workdir, "modem.json")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + \
+        os.environ["PATH"]
+
+    # imported late, sh resolves cell_mgmt and ping from PATH
+    from fake_cell_mgmt import Modem
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.lock import ModemLock
+    from cellular_utility.management import Manager
+    from cellular_utility.scheduler import CommandScheduler
+
+    # never contend with a real modem on this box
+    CellMgmt._lock = ModemLock(os.path.join(workdir, "cell_mgmt.lock"))
+    CellMgmt._cache.clear()
+
+    modem = Modem()
+    modem.init(profile)
+
+    scheduler = CommandScheduler(CellMgmt())
+    scheduler.start()
+
+    begin = monotonic()
+    mgr = Manager(
+        dev_name="lo",
+        enabled=True,
+        pin=None,
+        pdp_context_static=False,
+        pdp_context_id=1,
+        pdp_context_primary_apn="internet",
+        pdp_context_primary_type="ipv4v6",
+        pdp_context_primary_auth="none",
+        pdp_context_retry_timeout=60,
+        keepalive_enabled=True,
+        keepalive_host="127.0.0.1",
+        keepalive_period_sec=keepalive_period,
+        log_period_sec=60,
+        scheduler=scheduler)
+    mgr.start()
+
+    transitions = []
+    status = None
+    while monotonic() - begin < duration:
+        if mgr.status() != status:
+            status = mgr.status()
+            transitions.append((monotonic() - begin, status.name))
+        sleep(0.01)
+
+    stop_begin = monotonic()
+    mgr.stop()
+    stop_sec = monotonic() - stop_begin
+    scheduler.stop()
+
+    result = {
+        "transitions": transitions,
+        "time_in_status": _time_in_status(transitions, duration),
+        "first_connected_sec": next(
+            (at for at, name in transitions if name == "connected"), None),
+        "reconnects": _reconnects(transitions),
+        "stop_sec": stop_sec,
+        "cell_mgmt": modem.stats(),
+        "lock": CellMgmt.lock_stats(),
+        "retry": CellMgmt.retry_stats(),
+        "cache": CellMgmt.cache_stats(),
+        "scheduler": scheduler.stats(),
+    }
+    shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def _time_in_status(transitions, duration):
+    times = {}
+    for index, (at, name) in enumerate(transitions):
+        end = transitions[index + 1][0] if index + 1 < len(transitions) \
+            else duration
+        times[name] = times.get(name, 0.0) + end - at
+    return times
+
+
+def _reconnects(transitions):
+    """Return seconds from each lost connection to the next connected."""
+    reconnects = []
+    connected = False
+    lost = None
+    for at, name in transitions:
+        if name == "connected":
+            if lost is not None:
+                reconnects.append(at - lost)
+            connected = True
+            lost = None
+        elif connected and lost is None:
+            lost = at
+    return reconnects
+
+
+def report(result):
+    print "status transitions:"
+    for at, name in result["transitions"]:
+        print "  {:8.2f}s {}".format(at, name)
+
+    print "time in status:"
+    for name, sec in sorted(result["time_in_status"].items(),
+                            key=lambda item: -item[1]):
+        print "  {:<20} {:8.2f}s".format(name, sec)
+
+    print "first connected: {}".format(
+        "never" if result["first_connected_sec"] is None
+        else "{:.2f}s".format(result["first_connected_sec"]))
+    print "reconnects: {}".format(", ".join([
+        "{:.2f}s".format(sec) for sec in result["reconnects"]]) or "none")
+    print "stop: {:.2f}s".format(result["stop_sec"])
+
+    stats = result["cell_mgmt"]
+    print "cell_mgmt calls: {} (busy {}, failures {})".format(
+        sum(stats["calls"].values()), sum(stats["busy"].values()),
+        sum(stats["failures"].values()))
+    for name, count in sorted(stats["calls"].items(),
+                              key=lambda item: -item[1]):
+        print "  {:<16} {:6d}  busy {:4d}  failures {:4d}".format(
+            name, count, stats["busy"].get(name, 0),
+            stats["failures"].get(name, 0))
+
+    print "lock wait/hold (s):"
+    for name, lock in sorted(result["lock"].items(),
+                             key=lambda item: -item[1]["hold_total"]):
+        print "  {:<24} {:5d}  wait {:7.3f} max {:6.3f}  " \
+            "hold {:7.3f} max {:6.3f}".format(
+                name, lock["count"], lock["wait_total"], lock["wait_max"],
+                lock["hold_total"], lock["hold_max"])
+
+    scheduler = result["scheduler"]
+    print "scheduler: max depth {}, coalesced {}".format(
+        scheduler["max_depth"], sum(scheduler["coalesced"].values()))
+    for name, stats in sorted(scheduler["priorities"].items()):
+        print "  {:<24} {:5d}  wait {:7.3f} max {:6.3f}".format(
+            name, stats["count"], stats["wait_total"], stats["wait_max"])
+
+    for name, retry in sorted(result["retry"].items()):
+        print "retry {}: {}".format(name, json.dumps(retry, sort_keys=True))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark Manager against the fake cell_mgmt.")
+    parser.add_argument("--profile", choices=sorted(PROFILES.keys()),
+                        default="typical")
+    parser.add_argument("--profile-file",
+                        help="JSON profile, overrides --profile")
+    parser.add_argument("--duration", type=float, default=60,
+                        help="seconds to run the manager")
+    parser.add_argument("--keepalive-period", type=int, default=5)
+    parser.add_argument("--json", action="store_true",
+                        help="print the result as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        stream=sys.stderr,
+        level=logging.DEBUG if args.verbose else logging.ERROR)
+    logging.getLogger("sh").setLevel(logging.WARNING)
+
+    profile = PROFILES[args.profile]
+    if args.profile_file:
+        with open(args.profile_file) as profile_file:
+            profile = json.load(profile_file)
+
+    result = run(profile, args.duration, args.keepalive_period)
+    if args.json:
+        print json.dumps(result, indent=2, sort_keys=True)
+    else:
+        report(result)
+
+
+if __name__ == "__main__":
+    main()
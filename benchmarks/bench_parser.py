@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Micro-benchmark of parsing cell_mgmt and vnstat outputs, the per-key
+regex searches used before against the single-pass KeyValueParser.
+
+    python benchmarks/bench_parser.py [-n 20000]
+
+The parser is only used where it is not slower: location_info, sim_info
+and the firmware listings. start, module_ids and vnstat keep their
+per-key searches.
+
+Allocations are reported when tracemalloc is available (Python 3).
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cellular_utility.parser import KeyValueParser  # noqa
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+LOCATION_INFO = "LAC: 2817\nCellID: 01073AEE\n"
+
+START = (
+    "IP=111.70.154.149\n"
+    "SubnetMask=255.255.255.252\n"
+    "Gateway=111.70.154.150\n"
+    "DNS=168.95.1.1 168.95.192.1\n")
+
+MODULE_IDS = "IMEI: 359225050018813\nESN: \n"
+
+DUMPDB = (
+    "version;3\nactive;1\ninterface;wwan0\nnick;wwan0\n"
+    "created;1459152201\nupdated;1459153660\n"
+    "totalrx;12\ntotaltx;3\ncurrx;172246839\ncurtx;1704694\n"
+    "totalrxk;857\ntotaltxk;4\nbtime;1458897060\n" +
+    "".join(["d;{};0;0;0;0;0;0\n".format(i) for i in range(30)]) +
+    "".join(["h;{};0;0;0\n".format(i) for i in range(24)]))
+
+
+def _searches(*patterns):
+    regexes = [re.compile(pattern) for pattern in patterns]
+
+    def parse(output):
+        values = []
+        for regex in regexes:
+            match = regex.search(output)
+            values.append(match.group(1) if match else "")
+        return values
+    return parse
+
+
+KV_PARSER = KeyValueParser()
+DUMPDB_PARSER = KeyValueParser(";")
+DUMPDB_KEYS = frozenset(["totalrx", "totalrxk", "totaltx", "totaltxk"])
+
+# name: (output, before, after)
+CASES = [
+    ("location_info", LOCATION_INFO,
+     _searches(r"LAC: ([\S]*)\n", r"CellID: ([\S]*)\n", r"TAC: ([\S]*)\n",
+               r"NID: ([\S]*)\n", r"BID: ([\S]*)\n"),
+     KV_PARSER.parse),
+    ("start", START,
+     _searches(r"IP=([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\n",
+               r"SubnetMask=([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\n",
+               r"Gateway=([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\n",
+               r"DNS=([0-9\. ]*)\n"),
+     KV_PARSER.parse),
+    ("module_ids", MODULE_IDS,
+     _searches(r"IMEI: ([\S]*)\n", r"ESN: ([\S]*)\n"),
+     KV_PARSER.parse),
+    ("vnstat", DUMPDB,
+     _searches(r"totalrx;([0-9]+)\n", r"totalrxk;([0-9]+)\n",
+               r"totaltx;([0-9]+)\n", r"totaltxk;([0-9]+)\n"),
+     lambda output: DUMPDB_PARSER.parse(output, DUMPDB_KEYS)),
+]
+
+
+def allocations(func, output, number):
+    """Return (blocks, bytes) allocated per call, or None."""
+    if tracemalloc is None:
+        return None
+
+    func(output)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    results = [func(output) for _ in range(number)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del results
+
+    stats = after.compare_to(before, "filename")
+    blocks = sum([stat.count_diff for stat in stats])
+    size = sum([stat.size_diff for stat in stats])
+    return float(blocks) / number, float(size) / number
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    print("{:<14} {:>10} {:>10} {:>8} {:>18} {:>18}".format(
+        "output", "before us", "after us", "speedup",
+        "before blk/bytes", "after blk/bytes"))
+    for name, output, before, after in CASES:
+        times = []
+        allocs = []
+        for func in (before, after):
+            elapsed = min(timeit.repeat(
+                lambda: func(output), number=args.number, repeat=3))
+            times.append(elapsed * 1e6 / args.number)
+
+            alloc = allocations(func, output, 1000)
+            allocs.append(
+                "n/a" if alloc is None else "{:.1f}/{:.0f}".format(*alloc))
+
+        print("{:<14} {:>10.2f} {:>10.2f} {:>7.2f}x {:>18} {:>18}".format(
+            name, times[0], times[1], times[0] / times[1], *allocs))
+
+
+if __name__ == "__main__":
+    main()
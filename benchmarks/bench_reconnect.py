@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Cost of Manager._connect() attempts against the fake cell_mgmt with
+typical latencies.
+
+    python benchmarks/bench_reconnect.py [-n 5]
+
+Scenarios:
+    reconnect  the connection dropped, each attempt connects again
+    retry      the module is not registered, each attempt fails at
+               _attach(), as retried every 10s for pdp_context_retry_timeout
+Reports seconds and cell_mgmt calls per attempt, the 10s waits between
+retries excluded.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+PROFILE = {
+    "latency": {
+        "default": 0.1, "m_info": 0.4, "start": 3.0, "stop": 0.5
+    },
+    "jitter": 0
+}
+
+
+def attempts(mgr, modem, number, registered):
+    modem.set(registered=registered, connected=False)
+
+    calls = sum(modem.stats()["calls"].values())
+    durations = []
+    results = []
+    for _ in xrange(number):
+        begin = monotonic()
+        results.append(mgr._connect("internet", "ipv4v6", "none", "", ""))
+        durations.append(monotonic() - begin)
+        # dropped
+        modem.set(connected=False)
+    calls = sum(modem.stats()["calls"].values()) - calls
+
+    return {
+        "connected": results.count(True),
+        "mean_sec": sum(durations) / number,
+        "calls": float(calls) / number
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_reconnect.")
+    os.environ["FAKE_CELL_MGMT_STATE"] = os.path.join(workdir, "modem.json")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + \
+        os.environ["PATH"]
+
+    from fake_cell_mgmt import Modem
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.lock import ModemLock
+    from cellular_utility.management import Manager
+
+    # never contend with a real modem on this box
+    CellMgmt._lock = ModemLock(os.path.join(workdir, "cell_mgmt.lock"))
+    CellMgmt._cache.clear()
+
+    modem = Modem()
+    modem.init(PROFILE)
+
+    mgr = Manager(
+        dev_name="lo",
+        enabled=True,
+        pin=None,
+        pdp_context_static=False,
+        pdp_context_id=1,
+        pdp_context_primary_apn="internet",
+        pdp_context_primary_type="ipv4v6",
+        pdp_context_primary_auth="none",
+        pdp_context_retry_timeout=60,
+        keepalive_enabled=True,
+        keepalive_host="127.0.0.1",
+        keepalive_period_sec=60,
+        log_period_sec=60)
+    # _connect() runs without the Manager thread, as if started
+    mgr._stop = False
+    mgr.ATTACH_TIMEOUT_SEC = 0
+
+    print "{:<10} {:>10} {:>10} {:>10}".format(
+        "attempt", "mean s", "calls", "connected")
+    for name, registered in [("reconnect", True), ("retry", False)]:
+        result = attempts(mgr, modem, args.number, registered)
+        print "{:<10} {:>10.2f} {:>10.1f} {:>10}".format(
+            name, result["mean_sec"], result["calls"], result["connected"])
+
+    mgr._scheduler.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
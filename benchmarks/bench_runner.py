@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Spawn overhead of `sh` against cellular_utility.runner.
+
+    python benchmarks/bench_runner.py [-n 200] [--command "echo CSQ: 21"]
+
+Reports per call wall time and CPU time of this process, threads alive
+right after a call and the resident set size growth.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import shlex
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+import sh  # noqa
+from cellular_utility.runner import Command  # noqa
+
+
+def rss_kb():
+    """Return VmRSS of this process in kB, or None."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except IOError:
+        pass
+    return None
+
+
+def measure(command, args, number):
+    command(*args)
+    rss_before = rss_kb()
+    threads = 0
+    cpu_before = sum(os.times()[:2])
+    begin = time.time()
+    for _ in range(number):
+        command(*args)
+        threads = max(threads, threading.active_count())
+    wall = time.time() - begin
+    cpu = sum(os.times()[:2]) - cpu_before
+    rss_after = rss_kb()
+
+    return {
+        "wall_ms": wall * 1000 / number,
+        "cpu_ms": cpu * 1000 / number,
+        "threads": threads,
+        "rss_kb": None if rss_before is None else rss_after - rss_before
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=200)
+    parser.add_argument("--command", default="echo CSQ: 21",
+                        help="command line to spawn")
+    args = parser.parse_args()
+
+    argv = shlex.split(args.command)
+    runners = [
+        ("sh", getattr(sh, argv[0])),
+        ("runner", Command(argv[0])),
+    ]
+
+    print("{:<8} {:>10} {:>10} {:>8} {:>10}".format(
+        "runner", "wall ms", "cpu ms", "threads", "rss kB"))
+    for name, command in runners:
+        result = measure(command, argv[1:], args.number)
+        print("{:<8} {:>10.2f} {:>10.2f} {:>8d} {:>10}".format(
+            name, result["wall_ms"], result["cpu_ms"], result["threads"],
+            "n/a" if result["rss_kb"] is None else result["rss_kb"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Latency of Manager.stop() while the Manager thread is in the middle of a
+long modem operation, against the fake cell_mgmt.
+
+    python benchmarks/bench_stop.py [-n 3]
+
+Scenarios, stop() is called while the Manager waits for:
+    start    cell_mgmt start taking 60s
+    ping     the keepalive ping of _connect() taking 20s
+    busy     cell_mgmt start exiting busy, between backoff retries
+Reports the time stop() takes, including the final cell_mgmt stop.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from monotonic import monotonic
+from time import sleep
+
+BENCH_DIR = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, BENCH_DIR)
+
+SCENARIOS = [
+    # name, profile, command calls to wait for, then seconds
+    ("start", {"latency": {"default": 0.01, "start": 60}},
+     "start", 0.5),
+    ("ping", {"latency": {"default": 0.01, "start": 0.1, "ping": 20}},
+     "status", 0.5),
+    ("busy", {"latency": {"default": 0.01}, "busy_rate": {"start": 1.0}},
+     "start", 2),
+]
+
+
+def trial(modem, profile, command, settle):
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.management import Manager
+
+    CellMgmt._cache.clear()
+    modem.init(dict(profile, jitter=0))
+
+    mgr = Manager(
+        dev_name="lo",
+        enabled=True,
+        pin=None,
+        pdp_context_static=False,
+        pdp_context_id=1,
+        pdp_context_primary_apn="internet",
+        pdp_context_primary_type="ipv4v6",
+        pdp_context_primary_auth="none",
+        pdp_context_retry_timeout=60,
+        keepalive_enabled=True,
+        keepalive_host="127.0.0.1",
+        keepalive_period_sec=60,
+        log_period_sec=60)
+    mgr.start()
+
+    while modem.stats()["calls"].get(command, 0) == 0:
+        sleep(0.05)
+    sleep(settle)
+
+    begin = monotonic()
+    mgr.stop()
+    return monotonic() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=3)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_stop.")
+    os.environ["FAKE_CELL_MGMT_STATE"] = os.path.join(workdir, "modem.json")
+    os.environ["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + \
+        os.environ["PATH"]
+
+    from fake_cell_mgmt import Modem
+    from cellular_utility.cell_mgmt import CellMgmt
+    from cellular_utility.lock import ModemLock
+
+    # never contend with a real modem on this box
+    CellMgmt._lock = ModemLock(os.path.join(workdir, "cell_mgmt.lock"))
+
+    modem = Modem()
+    print "{:<8} {:>10} {:>10}".format("during", "mean s", "max s")
+    for name, profile, command, settle in SCENARIOS:
+        latencies = [trial(modem, profile, command, settle)
+                     for _ in xrange(args.number)]
+        print "{:<8} {:>10.2f} {:>10.2f}".format(
+            name, sum(latencies) / len(latencies), max(latencies))
+
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
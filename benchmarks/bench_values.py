@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Memory and time of the information objects sampled from the modem,
+the __dict__ based classes used before against the __slots__ Values.
+
+    python benchmarks/bench_values.py [-n 100000]
+
+The "before" classes are rebuilt from the current ones without
+__slots__ and Value, so both run the same validation.
+"""
+
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cellular_utility.cell_mgmt import (  # noqa
+    CellularLocation, MInfo, NetworkInformation, Signal
+)
+from cellular_utility.management import CellularInformation, Manager  # noqa
+
+# name: (class, args)
+CASES = [
+    ("Signal", Signal, ("lte", -73, -3.5, 21)),
+    ("CellularLocation", CellularLocation,
+     ("01073AEE", "2817", "", "", "")),
+    ("MInfo", MInfo,
+     ("MC7354", "wwan0", "2817", "01073AEE", "89886920042507847476",
+      "359225050018813", "/dev/cdc-wdm0", "/dev/ttyUSB2")),
+    ("NetworkInformation", NetworkInformation,
+     (True, "10.24.42.11", "255.255.255.252", "10.24.42.10",
+      ["168.95.1.1", "168.95.192.1"])),
+    ("CellularInformation", CellularInformation,
+     ("lte", 21, -73, -3.5, "Chunghwa Telecom", "2817", "", "",
+      "01073AEE", "")),
+    ("StaticInformation", Manager.StaticInformation,
+     (3, "89886920042507847476", "466924200478474", "359225050018813")),
+]
+
+
+def legacy(cls):
+    """Return cls as a plain class with a __dict__ and no Value base."""
+    attrs = dict([
+        (name, value) for name, value in cls.__dict__.items()
+        if name not in cls.__slots__ and name != "__slots__"])
+    return type(cls.__name__, (object,), attrs)
+
+
+def instance_bytes(obj):
+    size = sys.getsizeof(obj)
+    if hasattr(obj, "__dict__"):
+        size += sys.getsizeof(obj.__dict__)
+    return size
+
+
+def legacy_equal(a, b):
+    """Field by field comparison callers had to write before."""
+    return all([getattr(a, name) == getattr(b, name) for name in vars(a)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    print("{:<20} {:>13} {:>13} {:>13} {:>13}".format(
+        "class", "bytes before", "bytes after", "new us bef/aft",
+        "eq us bef/aft"))
+    for name, cls, values in CASES:
+        before = legacy(cls)
+
+        new_us = min(timeit.repeat(
+            lambda: before(*values), number=args.number, repeat=3)) \
+            * 1e6 / args.number
+        a, b = before(*values), before(*values)
+        eq_before = min(timeit.repeat(
+            lambda: legacy_equal(a, b), number=args.number, repeat=3)) \
+            * 1e6 / args.number
+
+        new_after = min(timeit.repeat(
+            lambda: cls(*values), number=args.number, repeat=3)) \
+            * 1e6 / args.number
+        c, d = cls(*values), cls(*values)
+        eq_after = min(timeit.repeat(
+            lambda: c == d, number=args.number, repeat=3)) \
+            * 1e6 / args.number
+
+        print("{:<20} {:>13d} {:>13d} {:>6.2f}/{:<6.2f} {:>6.2f}/{:<6.2f}"
+              .format(name, instance_bytes(a), instance_bytes(c),
+                      new_us, new_after, eq_before, eq_after))
+
+
+if __name__ == "__main__":
+    main()
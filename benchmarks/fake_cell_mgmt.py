@@ -0,0 +1,455 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+"""
+Stand-in for /sbin/cell_mgmt (and ping) backed by a JSON modem state,
+for benchmarking the bundle on a plain Linux box.
+
+    fake_cell_mgmt.py init [profile.json]   # reset the modem state
+    fake_cell_mgmt.py set sim=nosim csq=99  # change the modem state
+    fake_cell_mgmt.py stats                 # invocation counters
+    bin/cell_mgmt <subcommand> ...          # what CellMgmt runs
+    bin/ping ...                            # succeeds while connected
+
+The state file is $FAKE_CELL_MGMT_STATE (/tmp/fake_cell_mgmt.json).
+A profile is a dict like:
+    {
+        "latency": {"default": 0.05, "start": 2.0},  # seconds
+        "jitter": 0.2,                    # +-20% on latency
+        "busy_rate": {"signal_adv": 0.1}, # exit 60 probability
+        "failure_rate": {"start": 0.3},   # exit 1 probability
+        "scenario": [                     # applied at seconds since init
+            {"at": 30, "set": {"sim": "nosim"}},
+            {"at": 60, "set": {"sim": "ready"}}
+        ]
+    }
+Like the real one, a command exits 60 if another one is running.
+"""
+
+from __future__ import print_function
+
+import errno
+import fcntl
+import json
+import os
+import random
+import sys
+import time
+
+STATE_PATH = os.getenv("FAKE_CELL_MGMT_STATE", "/tmp/fake_cell_mgmt.json")
+
+DEFAULT_STATE = {
+    "power": True,
+    "sim": "ready",         # ready, pin, nosim
+    "pin": "0000",
+    "pin_retries": 3,
+    "registered": True,
+    "connected": False,
+    "mode": "umts",
+    "csq": 21,
+    "ecio": -3.5,
+    "operator": "Chunghwa Telecom",
+    "lac": "2817",
+    "tac": "",
+    "cell_id": "01073AEE",
+    "module": "MC7354",
+    "wwan_node": "lo",
+    "imei": "359225050018813",
+    "esn": "",
+    "iccid": "89886920041308467183",
+    "imsi": "466920411401101",
+    "profiles": [[1, "internet", "IP"], [2, "TPC", "IPV4V6"]],
+    "ip": "10.24.42.11",
+    "netmask": "255.255.255.252",
+    "gateway": "10.24.42.10",
+    "dns": "168.95.1.1 168.95.192.1",
+}
+
+DEFAULT_PROFILE = {
+    "latency": {"default": 0.05, "start": 1.0, "power_on": 2.0},
+    "jitter": 0.2,
+    "busy_rate": {},
+    "failure_rate": {},
+    "scenario": []
+}
+
+
+def _open_locked(path, mode):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o666)
+    fcntl.flock(fd, mode)
+    return fd
+
+
+def _load(fd):
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = b""
+    while True:
+        chunk = os.read(fd, 65536)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data.decode("utf-8")) if data else None
+
+
+def _save(fd, state):
+    data = json.dumps(state, indent=2, sort_keys=True).encode("utf-8")
+    os.lseek(fd, 0, os.SEEK_SET)
+    os.ftruncate(fd, 0)
+    os.write(fd, data)
+
+
+class Modem(object):
+    """Modem state, each method holds the state file locked."""
+
+    def __init__(self, path=STATE_PATH):
+        self.path = path
+
+    def init(self, profile=None, **changes):
+        state = dict(DEFAULT_STATE)
+        state.update(changes)
+        state["profile"] = dict(DEFAULT_PROFILE, **(profile or {}))
+        state["epoch"] = time.time()
+        state["scenario_next"] = 0
+        state["calls"] = {}
+        state["busy"] = {}
+        state["failures"] = {}
+
+        fd = _open_locked(self.path, fcntl.LOCK_EX)
+        try:
+            _save(fd, state)
+        finally:
+            os.close(fd)
+
+    def update(self, func):
+        """Return func(state), which may change the state."""
+        fd = _open_locked(self.path, fcntl.LOCK_EX)
+        try:
+            state = _load(fd)
+            if state is None:
+                raise RuntimeError("run `fake_cell_mgmt.py init` first")
+            self._play_scenario(state)
+            result = func(state)
+            _save(fd, state)
+            return result
+        finally:
+            os.close(fd)
+
+    def set(self, **changes):
+        self.update(lambda state: state.update(changes))
+
+    def stats(self):
+        return self.update(lambda state: {
+            "calls": state["calls"],
+            "busy": state["busy"],
+            "failures": state["failures"]
+        })
+
+    @staticmethod
+    def _play_scenario(state):
+        scenario = state["profile"].get("scenario", [])
+        elapsed = time.time() - state["epoch"]
+        while state["scenario_next"] < len(scenario):
+            event = scenario[state["scenario_next"]]
+            if event["at"] > elapsed:
+                break
+            state.update(event["set"])
+            state["scenario_next"] += 1
+
+
+class CommandError(Exception):
+    def __init__(self, exit_code, output=""):
+        super(CommandError, self).__init__(output)
+        self.exit_code = exit_code
+        self.output = output
+
+
+def _attached(state):
+    return (state["power"] and state["sim"] == "ready" and
+            state["registered"] and state["csq"] != 99)
+
+
+def _signal(state, args):
+    if not state["power"] or state["csq"] == 99:
+        return "\n"
+    return "{} {} dbm\n".format(state["mode"], -113 + 2 * state["csq"])
+
+
+def _signal_adv(state, args):
+    if not state["power"] or state["csq"] == 99:
+        return "\n"
+    return "CSQ: {csq}\nRSSI: {mode} {rssi} dBm\nEcIo: {mode} {ecio} dBm\n" \
+        .format(csq=state["csq"], mode=state["mode"],
+                rssi=-113 + 2 * state["csq"], ecio=state["ecio"])
+
+
+def _m_info(state, args):
+    return (
+        "Module={module}\nWWAN_node={wwan_node}\nAT_port=\nGPS_port=\n"
+        "LAC={lac}\nCellID={cell_id}\nICC-ID={iccid}\nIMEI={imei}\n"
+        "QMI_port=\n").format(**state)
+
+
+def _module_ids(state, args):
+    return "IMEI: {imei}\nESN: {esn}\n".format(**state)
+
+
+def _sim_status(state, args):
+    if state["sim"] == "nosim" or not state["power"]:
+        raise CommandError(1, "+CME ERROR: SIM not inserted\n")
+    if state["sim"] == "pin":
+        return "+CPIN: SIM PIN\n"
+    return "+CPIN: READY\n"
+
+
+def _pin_retries(state, args):
+    return "{}\n".format(state["pin_retries"])
+
+
+def _unlock_pin(state, args):
+    if state["sim"] != "pin":
+        raise CommandError(1, "+CME ERROR: operation not allowed\n")
+    if args and args[0] == state["pin"] and state["pin_retries"] > 0:
+        state["sim"] = "ready"
+        state["pin_retries"] = 3
+        return ""
+    state["pin_retries"] = max(0, state["pin_retries"] - 1)
+    raise CommandError(1, "+CME ERROR: incorrect password\n")
+
+
+def _iccid(state, args):
+    return "ICC-ID: {}\n".format(
+        state["iccid"] if state["sim"] != "nosim" else "")
+
+
+def _imsi(state, args):
+    return "IMSI: {}\n".format(
+        state["imsi"] if state["sim"] == "ready" else "")
+
+
+def _operator(state, args):
+    return "{}\n".format(state["operator"] if _attached(state) else "")
+
+
+def _attach_status(state, args):
+    status = "attached" if _attached(state) else "detached"
+    return "CS: {0}\nPS: {0}\n".format(status)
+
+
+def _location_info(state, args):
+    if not _attached(state):
+        return ""
+    if state["mode"] == "lte":
+        return "TAC: {tac}\nCellID: {cell_id}\n".format(**state)
+    return "LAC: {lac}\nCellID: {cell_id}\n".format(**state)
+
+
+def _get_profiles(state, args):
+    return "".join([
+        "{},{},{}\n".format(id_, apn, type_)
+        for id_, apn, type_ in state["profiles"]])
+
+
+def _set_profile(state, args):
+    id_, apn, pdp_type = int(args[0]), args[1], args[2].upper()
+    profiles = [item for item in state["profiles"] if item[0] != id_]
+    profiles.append([id_, apn, "IP" if pdp_type == "IP" else pdp_type])
+    state["profiles"] = sorted(profiles)
+    return ""
+
+
+def _start(state, args):
+    if not _attached(state):
+        raise CommandError(1, "not attached\n")
+    state["connected"] = True
+    return "IP={ip}\nSubnetMask={netmask}\nGateway={gateway}\nDNS={dns}\n" \
+        .format(**state)
+
+
+def _stop(state, args):
+    state["connected"] = False
+    return ""
+
+
+def _status(state, args):
+    if not (state["connected"] and _attached(state)):
+        state["connected"] = False
+        raise CommandError(1, "disconnected\n")
+    return "connected\n"
+
+
+def _power_off(state, args):
+    state["power"] = False
+    state["connected"] = False
+    return ""
+
+
+def _power_on(state, args):
+    state["power"] = True
+    return ""
+
+
+# firmware management queries of an MC7354
+_FW_AT = {
+    "AT+CGMR": "SWI9X15C_05.05.58.01 r27038 carmd-fwbuild1 2015/03/04",
+    "AT!PRIID?": (
+        "PRI Part Number: 9904780\r\n"
+        "Carrier PRI: 9999999_9904609_SWI9X15C_05.05.58.01_00_"
+        "VZW_005.029_001\r\n"
+        "Carrier PRI: 9999999_9904594_SWI9X15C_05.05.58.00_00_"
+        "ATT_005.026_000"),
+    "AT!GOBIIMPREF?": (
+        "preferred fw version:   05.05.58.01\r\n"
+        "preferred carrier name: VZW\r\n"
+        "preferred config name:  VZW_005.029_001\r\n"
+        "current fw version:     05.05.58.01\r\n"
+        "current carrier name:   VZW\r\n"
+        "current config name:    VZW_005.029_001"),
+}
+
+
+def _at(state, args):
+    cmd = args[0].upper() if args else ""
+    if cmd == "AT+CSQ":
+        return "\r\n+CSQ: {},99\r\n\r\nOK\r\n".format(state["csq"])
+    if cmd == "AT+CFUN?":
+        return "\r\n+CFUN: {}\r\n\r\nOK\r\n".format(
+            1 if state["power"] else 0)
+    if cmd in _FW_AT:
+        return "\r\n{}\r\n\r\nOK\r\n".format(_FW_AT[cmd])
+    if cmd.startswith("AT!ENTERCND="):
+        return "\r\nOK\r\n"
+    if cmd.startswith("AT") and "?" not in cmd and "=" not in cmd[2:]:
+        return "\r\nOK\r\n"
+    return "\r\nERROR\r\n"
+
+
+COMMANDS = {
+    "signal": _signal,
+    "signal_adv": _signal_adv,
+    "m_info": _m_info,
+    "module_ids": _module_ids,
+    "sim_status": _sim_status,
+    "pin_retries": _pin_retries,
+    "unlock_pin": _unlock_pin,
+    "iccid": _iccid,
+    "imsi": _imsi,
+    "operator": _operator,
+    "attach_status": _attach_status,
+    "location_info": _location_info,
+    "get_profiles": _get_profiles,
+    "set_profile": _set_profile,
+    "start": _start,
+    "stop": _stop,
+    "status": _status,
+    "power_off": _power_off,
+    "power_on": _power_on,
+    "at": _at,
+}
+
+
+def cell_mgmt(args, modem=None):
+    """Run one cell_mgmt invocation, return the exit code."""
+    modem = modem or Modem()
+    cmd = args[0] if args else ""
+    handler = COMMANDS.get(cmd)
+    if handler is None:
+        sys.stderr.write("unknown command: {}\n".format(cmd))
+        return 1
+
+    # the real cell_mgmt exits 60 while another instance runs
+    busy_fd = os.open(modem.path + ".busy", os.O_RDWR | os.O_CREAT, 0o666)
+    try:
+        fcntl.flock(busy_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        busy = False
+    except IOError as exc:
+        if exc.errno not in (errno.EAGAIN, errno.EACCES):
+            raise
+        busy = True
+
+    try:
+        def begin(state):
+            profile = state["profile"]
+            state["calls"][cmd] = state["calls"].get(cmd, 0) + 1
+            if busy or random.random() < profile["busy_rate"].get(
+                    cmd, profile["busy_rate"].get("default", 0)):
+                state["busy"][cmd] = state["busy"].get(cmd, 0) + 1
+                return None
+
+            latency = profile["latency"].get(
+                cmd, profile["latency"].get("default", 0))
+            jitter = profile.get("jitter", 0)
+            return latency * (1 + jitter * (2 * random.random() - 1))
+
+        latency = modem.update(begin)
+        if latency is None:
+            sys.stderr.write("modem is busy\n")
+            return 60
+
+        time.sleep(max(0, latency))
+
+        def finish(state):
+            profile = state["profile"]
+            if random.random() < profile["failure_rate"].get(
+                    cmd, profile["failure_rate"].get("default", 0)):
+                state["failures"][cmd] = state["failures"].get(cmd, 0) + 1
+                raise CommandError(1, "simulated failure\n")
+            return handler(state, args[1:])
+
+        try:
+            output = modem.update(finish)
+        except CommandError as exc:
+            sys.stdout.write(exc.output)
+            return exc.exit_code
+
+        sys.stdout.write(output)
+        return 0
+    finally:
+        os.close(busy_fd)
+
+
+def ping(args, modem=None):
+    """Succeed while the fake connection is up, after latency "ping"."""
+    modem = modem or Modem()
+    time.sleep(modem.update(
+        lambda state: state["profile"]["latency"].get("ping", 0)))
+    connected = modem.update(
+        lambda state: state["connected"] and _attached(state))
+    if not connected:
+        sys.stdout.write("1 packets transmitted, 0 received\n")
+        return 1
+    sys.stdout.write("1 packets transmitted, 1 received\n")
+    return 0
+
+
+def _value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def main(argv):
+    if not argv:
+        print(__doc__)
+        return 1
+
+    modem = Modem()
+    if argv[0] == "init":
+        profile = None
+        if len(argv) > 1:
+            with open(argv[1]) as profile_file:
+                profile = json.load(profile_file)
+        modem.init(profile)
+    elif argv[0] == "set":
+        modem.set(**dict([
+            (key, _value(value))
+            for key, value in [item.split("=", 1) for item in argv[1:]]]))
+    elif argv[0] == "stats":
+        print(json.dumps(modem.stats(), indent=2, sort_keys=True))
+    else:
+        print(__doc__)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,464 @@
+"""
+Long-lived AT port session, an alternative backend for CellMgmt.
+"""
+
+import errno
+import logging
+import os
+import re
+import select
+import termios
+import tty
+from monotonic import monotonic
+import sh
+from threading import RLock
+
+from cellular_utility.cancel import check as check_cancel
+from cellular_utility.deadline import (
+    check as check_deadline, remaining as deadline_remaining
+)
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class AtSessionError(Exception):
+    """AtSessionError"""
+    pass
+
+
+class AtSession(object):
+    """
+    Keep the modem AT port open and exchange AT commands over it.
+    """
+
+    DEFAULT_TIMEOUT_SEC = 5
+
+    _final_result_regex = re.compile(
+        r"^(OK|ERROR|NO CARRIER|\+CM[ES] ERROR: .*)$")
+    _line_split_regex = re.compile(r"[\r\n]+")
+    _cmd_prefix_regex = re.compile(r"^AT([+!$#%^][A-Z0-9]+)", re.IGNORECASE)
+
+    # unsolicited result codes which may interleave with a response
+    URC_PREFIXES = (
+        "+CREG:", "+CGREG:", "+CEREG:", "+CIEV:", "+CMTI:", "+CUSD:",
+        "+CGEV:", "RING")
+
+    def __init__(self, port):
+        self._port = port
+        self._fd = None
+        self._buf = ""
+        self._lock = RLock()
+        self._open_count = 0
+
+        self._urc_callback = None
+        self._close_callback = None
+
+    @property
+    def port(self):
+        return self._port
+
+    @property
+    def lock(self):
+        """Held while the port is in use, see read_urcs()."""
+        return self._lock
+
+    @property
+    def open_count(self):
+        """How many times the port has been opened, the module may have
+        reset its settings in between."""
+        return self._open_count
+
+    def is_open(self):
+        return self._fd is not None
+
+    def fileno(self):
+        """Return the file descriptor of the port, None if closed."""
+        return self._fd
+
+    def set_urc_callback(self, callback):
+        """callback(line) is called for every unsolicited result code."""
+        self._urc_callback = callback
+
+    def set_close_callback(self, callback):
+        """callback() is called whenever the port is closed, like to stop
+        waiting on its file descriptor."""
+        self._close_callback = callback
+
+    def open(self):
+        with self._lock:
+            if self._fd is not None:
+                return
+
+            try:
+                fd = os.open(self._port, os.O_RDWR | os.O_NOCTTY)
+            except OSError as exc:
+                raise AtSessionError(
+                    "cannot open {}: {}".format(self._port, exc))
+
+            try:
+                tty.setraw(fd)
+                attr = termios.tcgetattr(fd)
+                attr[4] = attr[5] = termios.B115200
+                termios.tcsetattr(fd, termios.TCSANOW, attr)
+                termios.tcflush(fd, termios.TCIOFLUSH)
+            except termios.error:
+                # not a real serial line (e.g. a test pty), keep going
+                pass
+
+            self._fd = fd
+            self._buf = ""
+            self._open_count += 1
+            _logger.debug("at session opened: " + self._port)
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            try:
+                os.close(self._fd)
+            except OSError:
+                pass
+            self._fd = None
+            self._buf = ""
+            _logger.debug("at session closed: " + self._port)
+            if self._close_callback is not None:
+                self._close_callback()
+
+    def command(self, cmd, timeout=None):
+        """
+        Send one AT command, return the raw response like
+            "\\r\\n+CFUN: 1\\r\\n\\r\\nOK\\r\\n"
+        which is the same as the output of `cell_mgmt at`.
+        """
+        if timeout is None:
+            timeout = self.DEFAULT_TIMEOUT_SEC
+        check_cancel()
+        check_deadline()
+        timeout = deadline_remaining(timeout)
+
+        with self._lock:
+            self.open()
+            try:
+                self._write(cmd + "\r")
+                return self._read_response(cmd, monotonic() + timeout)
+            except (OSError, IOError) as exc:
+                self.close()
+                raise AtSessionError("{}: {}".format(cmd, exc))
+
+    def read_urcs(self):
+        """
+        Dispatch the unsolicited result codes received between commands,
+        without waiting for more.
+        Return False without reading if the port is in use.
+        """
+        if not self._lock.acquire(False):
+            return False
+
+        try:
+            if self._fd is None:
+                return True
+
+            try:
+                while select.select([self._fd], [], [], 0)[0]:
+                    data = os.read(self._fd, 4096)
+                    if data == "":
+                        raise IOError(errno.EIO, "AT port hang up")
+                    self._buf += data
+            except (OSError, IOError, select.error) as exc:
+                self.close()
+                raise AtSessionError("urc: {}".format(exc))
+
+            while True:
+                line = self._read_line(0)
+                if line is None:
+                    return True
+                if line.startswith(self.URC_PREFIXES):
+                    self._dispatch_urc(line)
+                else:
+                    _logger.debug("unexpected line: " + line)
+        finally:
+            self._lock.release()
+
+    def _write(self, data):
+        while data:
+            written = os.write(self._fd, data)
+            data = data[written:]
+
+    def _read_line(self, until):
+        while True:
+            lines = self._line_split_regex.split(self._buf, 1)
+            if len(lines) == 2:
+                self._buf = lines[1]
+                if lines[0] == "":
+                    continue
+                return lines[0]
+
+            remain = until - monotonic()
+            if remain <= 0:
+                return None
+
+            try:
+                readable, _, _ = select.select([self._fd], [], [], remain)
+            except select.error as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                raise
+
+            if not readable:
+                return None
+
+            data = os.read(self._fd, 4096)
+            if data == "":
+                raise IOError(errno.EIO, "AT port hang up")
+            self._buf += data
+
+    def _read_response(self, cmd, until):
+        match = self._cmd_prefix_regex.match(cmd)
+        prefix = match.group(1).upper() + ":" if match else None
+
+        info = []
+        while True:
+            line = self._read_line(until)
+            if line is None:
+                # the modem may still answer, drop it with the port
+                self.close()
+                check_deadline()
+                raise AtSessionError("{}: timeout".format(cmd))
+
+            # echo, if ATE0 is not in effect yet
+            if line == cmd:
+                continue
+
+            if self._final_result_regex.match(line):
+                return "\r\n{}\r\n{}\r\n".format(
+                    "\r\n".join(info) + "\r\n" if info else "", line)
+
+            if (line.startswith(self.URC_PREFIXES) and
+                    (prefix is None or not line.startswith(prefix))):
+                self._dispatch_urc(line)
+                continue
+
+            info.append(line)
+
+    def _dispatch_urc(self, line):
+        _logger.debug("urc: " + line)
+        if self._urc_callback is None:
+            return
+        try:
+            self._urc_callback(line)
+        except Exception as exc:
+            _logger.warning("urc callback: {}".format(exc))
+
+
+def error_return_code(returncode, args, stdout=""):
+    """Build the sh exception that `cell_mgmt` would have raised."""
+    exc = getattr(sh, "ErrorReturnCode_{}".format(returncode))
+    return exc(
+        "cell_mgmt " + " ".join([str(arg) for arg in args]), stdout, "")
+
+
+class AtSessionBackend(object):
+    """
+    Serve `cell_mgmt` subcommands over an AtSession, output is formatted
+    the same way as `cell_mgmt` does so that CellMgmt parsing is unchanged.
+
+    Subcommands which need more than the AT port (start, stop, power_on,
+    power_off, ...) are forwarded to the `cell_mgmt` binary.
+    """
+
+    _init_commands = ["ATE0", "AT+CMEE=2", "AT+COPS=3,0"]
+
+    _info_regex = re.compile(r"^[\r\n]*([\s\S]*?)[\r\n]+(\S[^\r\n]*)[\r\n]*$")
+    _csq_regex = re.compile(r"\+CSQ:\s*([0-9]+),")
+    _cops_regex = re.compile(
+        r"\+COPS:\s*[0-9]+(?:,[0-9]+,\"([^\"]*)\"(?:,([0-9]+))?)?")
+    _cgatt_regex = re.compile(r"\+CGATT:\s*([01])")
+    _cpin_regex = re.compile(r"(\+CPIN:\s*[\S ]+)")
+    _cgdcont_regex = re.compile(
+        r"\+CGDCONT:\s*([0-9]+),\"([^\"]*)\",\"([^\"]*)\"")
+    _creg_mode_regex = re.compile(r"\+C(?:E|G)?REG:\s*([0-9]+)")
+    _creg_regex = re.compile(
+        r"\+C(?:E|G)?REG:\s*[0-9]+,[0-9]+,\"([0-9A-Fa-f]*)\","
+        r"\"([0-9A-Fa-f]*)\"")
+    _digits_regex = re.compile(r"([0-9A-Fa-f]{6,})")
+
+    # 3GPP TS 27.007 <AcT> to cell_mgmt mode
+    _act_mode = {
+        "0": "gsm", "1": "gsm", "3": "gsm",
+        "2": "umts", "4": "umts", "5": "umts", "6": "umts",
+        "7": "lte"
+    }
+
+    _pdp_type = {"ip": "IP", "ipv6": "IPV6", "ipv4v6": "IPV4V6"}
+
+    def __init__(self, port):
+        self._session = AtSession(port)
+        self._initialized = False
+
+        self._handlers = {
+            "at": self._at,
+            "sim_status": self._sim_status,
+            "attach_status": self._attach_status,
+            "operator": self._operator,
+            "signal": self._signal,
+            "signal_adv": self._signal_adv,
+            "get_profiles": self._get_profiles,
+            "set_profile": self._set_profile,
+            "unlock_pin": self._unlock_pin,
+            "iccid": self._iccid,
+            "imsi": self._imsi,
+            "module_ids": self._module_ids,
+            "location_info": self._location_info,
+        }
+
+    @property
+    def session(self):
+        return self._session
+
+    def close(self):
+        self._session.close()
+        self._initialized = False
+
+    def execute(self, fallback, *args, **kwargs):
+        """
+        Run `cell_mgmt <args>` over the AT session if possible,
+        otherwise call `fallback(*args, **kwargs)`.
+        """
+        handler = self._handlers.get(args[0] if args else None)
+        if handler is None:
+            if args and args[0].startswith("power_"):
+                # module goes away, the port has to be reopened afterwards
+                self.close()
+            return self._fallback(fallback, *args, **kwargs)
+
+        try:
+            if not self._initialized:
+                for cmd in self._init_commands:
+                    self._session.command(cmd)
+                self._initialized = True
+
+            return handler(*args[1:])
+
+        except AtSessionError as exc:
+            _logger.warning("at session: {}, fallback to cell_mgmt".format(
+                exc))
+            self.close()
+            return self._fallback(fallback, *args, **kwargs)
+
+    def _fallback(self, fallback, *args, **kwargs):
+        # cell_mgmt may talk on the AT port too, keep URC reading off it
+        with self._session.lock:
+            return fallback(*args, **kwargs)
+
+    def _query(self, cmd, timeout=None):
+        """Return (final result, info) of an AT command."""
+        output = self._session.command(cmd, timeout)
+        match = self._info_regex.match(output)
+        return match.group(2), match.group(1).strip("\r\n")
+
+    def _at(self, cmd, timeout=None):
+        return self._session.command(
+            cmd, None if timeout is None else int(timeout))
+
+    def _sim_status(self):
+        result, info = self._query("AT+CPIN?")
+        match = self._cpin_regex.search(info)
+        if result != "OK" or not match:
+            raise error_return_code(1, ["sim_status"], info)
+        return match.group(1) + "\n"
+
+    def _attach_status(self):
+        result, info = self._query("AT+CGATT?")
+        match = self._cgatt_regex.search(info)
+        if result != "OK" or not match:
+            raise error_return_code(1, ["attach_status"], info)
+        return "PS: {}\n".format(
+            "attached" if match.group(1) == "1" else "detached")
+
+    def _cops(self):
+        result, info = self._query("AT+COPS?")
+        match = self._cops_regex.search(info)
+        if result != "OK" or not match:
+            return "", "none"
+        return (match.group(1) or "",
+                self._act_mode.get(match.group(2), "none"))
+
+    def _csq(self):
+        result, info = self._query("AT+CSQ")
+        match = self._csq_regex.search(info)
+        if result != "OK" or not match:
+            raise error_return_code(1, ["signal"], info)
+        return int(match.group(1))
+
+    def _operator(self):
+        return self._cops()[0] + "\n"
+
+    def _signal(self):
+        csq = self._csq()
+        if csq == 99:
+            return "\n"
+        return "{} {} dbm\n".format(self._cops()[1], -113 + 2 * csq)
+
+    def _signal_adv(self):
+        csq = self._csq()
+        if csq == 99:
+            return "\n"
+        mode = self._cops()[1]
+        # EcIo is not available from 3GPP AT commands, left out
+        return "CSQ: {}\nRSSI: {} {} dBm\n".format(
+            csq, mode, -113 + 2 * csq)
+
+    def _get_profiles(self):
+        result, info = self._query("AT+CGDCONT?")
+        if result != "OK":
+            raise error_return_code(1, ["get_profiles"], info)
+        return "".join([
+            "{},{},{}\n".format(id_, apn, type_)
+            for id_, type_, apn in self._cgdcont_regex.findall(info)])
+
+    def _set_profile(self, id_, apn, pdp_type):
+        result, info = self._query("AT+CGDCONT={},\"{}\",\"{}\"".format(
+            id_, self._pdp_type.get(pdp_type, pdp_type.upper()), apn))
+        if result != "OK":
+            raise error_return_code(4, ["set_profile"], info)
+        return ""
+
+    def _unlock_pin(self, pin):
+        result, info = self._query("AT+CPIN=\"{}\"".format(pin))
+        if result != "OK":
+            # with AT+CMEE=2 the final line tells the error in words
+            raise error_return_code(1, ["unlock_pin"], "\n".join(
+                [line for line in (info, result) if line]))
+        return ""
+
+    def _iccid(self):
+        result, info = self._query("AT+ICCID")
+        match = self._digits_regex.search(info)
+        return "ICC-ID: {}\n".format(
+            match.group(1) if result == "OK" and match else "")
+
+    def _imsi(self):
+        result, info = self._query("AT+CIMI")
+        return "IMSI: {}\n".format(info if result == "OK" else "")
+
+    def _module_ids(self):
+        result, info = self._query("AT+CGSN")
+        return "IMEI: {}\n".format(info if result == "OK" else "")
+
+    def _location_info(self):
+        # LTE first, then UMTS/GSM
+        for query, area in (("CEREG", "TAC"), ("CGREG", "LAC"),
+                            ("CREG", "LAC")):
+            result, info = self._query("AT+{}?".format(query))
+            mode = self._creg_mode_regex.search(info)
+            if result == "OK" and mode and mode.group(1) != "2":
+                # the location is only told in mode 2, which the URC
+                # listener may have set already, put the mode back
+                self._query("AT+{}=2".format(query))
+                result, info = self._query("AT+{}?".format(query))
+                self._query("AT+{}={}".format(query, mode.group(1)))
+            match = self._creg_regex.search(info)
+            if result == "OK" and match:
+                return "{}: {}\nCellID: {}\n".format(
+                    area, match.group(1), match.group(2))
+        return ""
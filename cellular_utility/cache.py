@@ -0,0 +1,115 @@
+"""
+TTL based result cache for cell_mgmt read commands.
+"""
+
+from monotonic import monotonic
+from threading import Lock
+
+
+class TtlCache(object):
+    """
+    Per-command result cache.
+
+    ttls is a dict like {"m_info": None, "signal_adv": 5}, None means the
+    entry lives until invalidated. Commands not in ttls are never cached.
+    """
+
+    def __init__(self, ttls):
+        self._ttls = dict(ttls)
+        self._lock = Lock()
+
+        # name: {key: (expire, value)}
+        self._entries = {}
+        # name: generation, bumped on invalidation
+        self._generations = {}
+        # name: {"hit": n, "miss": n, "invalidate": n}
+        self._stats = {}
+
+    def set_ttl(self, name, ttl):
+        with self._lock:
+            self._ttls[name] = ttl
+            self._drop(name)
+
+    def lookup(self, name, key=()):
+        """Return (True, value) on hit, (False, generation) on miss."""
+        with self._lock:
+            if name not in self._ttls:
+                return False, None
+
+            stats = self._stats.setdefault(
+                name, {"hit": 0, "miss": 0, "invalidate": 0})
+
+            entry = self._entries.get(name, {}).get(key)
+            if entry is not None and (
+                    entry[0] is None or entry[0] > monotonic()):
+                stats["hit"] += 1
+                return True, entry[1]
+
+            stats["miss"] += 1
+            return False, self._generations.get(name, 0)
+
+    def peek(self, name, key=()):
+        """
+        Return (True, value) on hit, (False, None) on miss, without
+        counting either.
+        """
+        with self._lock:
+            entry = self._entries.get(name, {}).get(key)
+            if entry is not None and (
+                    entry[0] is None or entry[0] > monotonic()):
+                return True, entry[1]
+            return False, None
+
+    def store(self, name, key, value, generation):
+        """Store value unless name is invalidated since lookup()."""
+        with self._lock:
+            if name not in self._ttls:
+                return
+            if self._generations.get(name, 0) != generation:
+                return
+
+            ttl = self._ttls[name]
+            self._entries.setdefault(name, {})[key] = (
+                None if ttl is None else monotonic() + ttl, value)
+
+    def get(self, name, key, loader):
+        """Return cached value, or call loader() and cache its result."""
+        if name not in self._ttls:
+            return loader()
+
+        hit, value = self.lookup(name, key)
+        if hit:
+            return value
+
+        generation = value
+        value = loader()
+        self.store(name, key, value, generation)
+        return value
+
+    def invalidate(self, *names):
+        """Drop entries of names, all entries if no name given."""
+        with self._lock:
+            if len(names) == 0:
+                names = set(self._ttls.keys()) | set(self._entries.keys())
+            for name in names:
+                self._drop(name)
+                self._stats.setdefault(
+                    name, {"hit": 0, "miss": 0, "invalidate": 0})[
+                        "invalidate"] += 1
+
+    def clear(self):
+        """Drop all entries and counters."""
+        with self._lock:
+            for name in list(self._entries.keys()):
+                self._drop(name)
+            self._stats = {}
+
+    def stats(self):
+        """Return dict like {"m_info": {"hit": 3, "miss": 1, ...}}."""
+        with self._lock:
+            return dict(
+                [(name, dict(stats)) for name, stats in self._stats.items()])
+
+    def _drop(self, name):
+        self._entries.pop(name, None)
+        self._generations[name] = self._generations.get(name, 0) + 1
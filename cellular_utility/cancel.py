@@ -0,0 +1,108 @@
+"""
+Per-thread cancel token honored by every CellMgmt layer, next to the
+deadline.
+
+    token = CancelToken()
+    with cancel_scope(token):
+        cell_mgmt.start(apn="internet")   # token.cancel() from elsewhere
+
+Queued commands, lock waiting and retries give up with Cancelled,
+running subprocesses are killed.
+"""
+
+from contextlib import contextmanager
+import logging
+from threading import Event, Lock, local
+from time import sleep as _sleep
+from traceback import format_exc
+
+_logger = logging.getLogger("sanji.cellular")
+
+_local = local()
+
+
+class Cancelled(Exception):
+    """Cancelled"""
+    pass
+
+
+class CancelToken(object):
+    """Cancelled once and for all by cancel(), from any thread."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._event = Event()
+        self._callbacks = []
+
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """Cancel and call the callbacks."""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                _logger.warning(format_exc())
+
+    def add_callback(self, callback):
+        """Call callback() on cancel, right now if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def remove_callback(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout=None):
+        """Return True if cancelled within timeout seconds."""
+        return self._event.wait(timeout)
+
+
+@contextmanager
+def cancel_scope(token):
+    """Run the block with token, None for none, also to hand the token
+    of a caller over to another thread."""
+    outer = current()
+    _local.token = token
+    try:
+        yield
+    finally:
+        _local.token = outer
+
+
+def current():
+    """Return the cancel token of this thread, or None."""
+    return getattr(_local, "token", None)
+
+
+def cancelled():
+    token = current()
+    return token is not None and token.cancelled()
+
+
+def check():
+    """Raise Cancelled if the token of this thread is cancelled."""
+    if cancelled():
+        raise Cancelled
+
+
+def sleep(sec):
+    """Sleep sec seconds, raise Cancelled once the token is cancelled."""
+    token = current()
+    if token is None:
+        _sleep(sec)
+        return
+
+    if token.wait(sec):
+        raise Cancelled
@@ -2,12 +2,14 @@
 cell_mgmt utility wrapper
 """
 
+from copy import deepcopy
 from decorator import decorator
 from enum import Enum
 import os
 import logging
+from math import ceil
+from pipes import quote
 import re
-import sh
 from sh import (
     ErrorReturnCode,
     ErrorReturnCode_1,
@@ -20,12 +22,23 @@ from sh import (
     TimeoutException
 )
 from subprocess import CalledProcessError
-import thread
-from threading import RLock
 from time import sleep
 from traceback import format_exc
 from retrying import retry as retrying
 
+from cellular_utility.cache import TtlCache
+from cellular_utility.cancel import Cancelled, cancel_scope
+from cellular_utility.deadline import (
+    DeadlineExceeded, expired as deadline_expired,
+    remaining as deadline_remaining
+)
+from cellular_utility.lock import ModemLock, ModemLockTimeout
+from cellular_utility.metrics import registry as metrics
+from cellular_utility.parser import KeyValueParser
+from cellular_utility.retry import RetryPolicy
+from cellular_utility.runner import Command
+from cellular_utility.value import Value
+
 _logger = logging.getLogger("sanji.cellular")
 
 tool_path = os.path.dirname(os.path.realpath(__file__))
@@ -41,11 +54,34 @@ class CellAllModuleNotSupportError(CellMgmtError):
     pass
 
 
+class CellMgmtLockTimeout(CellMgmtError):
+    """CellMgmtLockTimeout"""
+    pass
+
+
+class CellMgmtDeadlineExceeded(CellMgmtError):
+    """CellMgmtDeadlineExceeded"""
+    pass
+
+
+class CellMgmtCancelled(CellMgmtError):
+    """CellMgmtCancelled"""
+    pass
+
+
 @decorator
 def handle_error_return_code(func, *args, **kwargs):
     try:
         return func(*args, **kwargs)
 
+    except DeadlineExceeded:
+        _logger.warning("deadline exceeded")
+        raise CellMgmtDeadlineExceeded
+
+    except Cancelled as exc:
+        _logger.info("cancelled: {}".format(exc))
+        raise CellMgmtCancelled(str(exc))
+
     except ErrorReturnCode_2:
         _logger.warning("profile not found")
     except ErrorReturnCode_3:
@@ -60,81 +96,124 @@ def handle_error_return_code(func, *args, **kwargs):
     except ErrorReturnCode:
         _logger.warning(format_exc())
     except TimeoutException:
+        if deadline_expired():
+            _logger.warning("deadline exceeded")
+            raise CellMgmtDeadlineExceeded
         _logger.warning("TimeoutException")
         _logger.warning(format_exc())
 
     raise CellMgmtError
 
 
-BUSY_RETRY_COUNT = 10
+def _is_busy(exc):
+    """cell_mgmt exits 60 if the module is used by someone else."""
+    if isinstance(exc, CalledProcessError):
+        return exc.returncode == 60
+    return isinstance(exc, ErrorReturnCode) and exc.exit_code == 60
 
 
 @decorator
 def retry_on_busy(func, *args, **kwargs):
-    for retry in xrange(0, BUSY_RETRY_COUNT + 1):
-        try:
-            return func(*args, **kwargs)
+    """
+    Retry while cell_mgmt is busy, see CellMgmt.BUSY_RETRY_POLICY.
+    """
+    try:
+        return CellMgmt.BUSY_RETRY_POLICY.call(
+            _is_busy, func, *args, **kwargs)
 
-        except CalledProcessError as exc:
-            if (exc.returncode == 60 and
-                    retry < BUSY_RETRY_COUNT):
+    except (CalledProcessError, ErrorReturnCode_60):
+        _logger.warning(format_exc())
+        raise
 
-                _logger.debug("cell_mgmt busy retry: " + str(retry))
 
-                sleep(10)
-                continue
+def _is_retryable(exc):
+    """
+    Failures worth another try, like unexpected output. Busy has its own
+    retries, and a timed out, cancelled or out of budget command would
+    hold the modem lock again just as long.
+    """
+    return not (_is_busy(exc) or
+                isinstance(exc, (TimeoutException, DeadlineExceeded,
+                                 Cancelled)))
 
-            else:
-                _logger.warning(format_exc())
-                raise
 
-        except ErrorReturnCode_60 as exc:
-            if retry < BUSY_RETRY_COUNT:
-                _logger.debug("cell_mgmt busy retry: {}".format(str(retry)))
+@decorator
+def retry_on_error(func, *args, **kwargs):
+    """
+    Retry on failures other than busy and timeouts, see
+    CellMgmt.AT_RETRY_POLICY.
+    """
+    return CellMgmt.AT_RETRY_POLICY.call(
+        _is_retryable, func, *args, **kwargs)
 
-                sleep(10)
-                continue
 
-            else:
-                _logger.warning(format_exc())
-                raise
+@decorator
+def critical_section(func, *args, **kwargs):
+    try:
+        with metrics.timer("lock_wait", func.__name__):
+            CellMgmt._lock.acquire(
+                func.__name__, deadline_remaining(CellMgmt.LOCK_TIMEOUT_SEC))
+    except ModemLockTimeout as exc:
+        _logger.warning("cell_mgmt timeout: {}".format(exc))
+        if deadline_expired():
+            raise CellMgmtDeadlineExceeded(str(exc))
+        raise CellMgmtLockTimeout(str(exc))
+    except Cancelled as exc:
+        _logger.info("cancelled: {}".format(exc))
+        raise CellMgmtCancelled(str(exc))
 
-        except ErrorReturnCode:
-            raise
+    try:
+        return func(*args, **kwargs)
+    finally:
+        CellMgmt._lock.release()
 
 
-@decorator
-def critical_section(func, *args, **kwargs):
-    if CellMgmt._lock._RLock__owner == thread.get_ident() \
-            or CellMgmt._lock._RLock__owner is None:
-        with CellMgmt._lock:
-            return func(*args, **kwargs)
+def cached(name):
+    """
+    Serve the result from CellMgmt._cache, see CellMgmt.CACHE_TTL.
+    """
+    @decorator
+    def _cached(func, *args, **kwargs):
+        return CellMgmt._cache.get(
+            name,
+            args[1:] + tuple(sorted(kwargs.items())),
+            lambda: func(*args, **kwargs))
+    return _cached
 
-    # lock by process
-    timeout = 120
-    while timeout > 0:
-        if CellMgmt._lock.acquire(blocking=False) is True:
-            try:
-                return func(*args, **kwargs)
-            finally:
-                CellMgmt._lock.release()
-        else:
-            timeout = timeout - 1
-            sleep(1)
-            continue
 
-    _logger.warning("cell_mgmt timeout")
+def invalidate_cache(*names):
+    """
+    Drop cached results of names, or all of them if no name given,
+    once the function returns or raises.
+    """
+    @decorator
+    def _invalidate_cache(func, *args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            CellMgmt._cache.invalidate(*names)
+    return _invalidate_cache
 
 
 def sh_default_timeout(func, timeout):
+    """
+    Add default timeout, cut short to the remaining time of the deadline.
+    """
     def _sh_default_timeout(*args, **kwargs):
         if kwargs.get("_timeout", None) is None:
             kwargs.update({"_timeout": timeout})
+
+        # sh treats _timeout=0 as no timeout, never hand it over
+        kwargs["_timeout"] = deadline_remaining(kwargs["_timeout"])
+        if kwargs["_timeout"] <= 0:
+            raise DeadlineExceeded
         return func(*args, **kwargs)
     return _sh_default_timeout
 
 
-class NetworkInformation(object):
+class NetworkInformation(Value):
+    __slots__ = ["_status", "_ip", "_netmask", "_gateway", "_dns_list"]
+
     def __init__(
             self,
             status,
@@ -159,7 +238,7 @@ class NetworkInformation(object):
         self._ip = ip
         self._netmask = netmask
         self._gateway = gateway
-        self._dns_list = dns_list
+        self._dns_list = tuple(dns_list)
 
     @property
     def status(self):
@@ -179,10 +258,14 @@ class NetworkInformation(object):
 
     @property
     def dns_list(self):
-        return self._dns_list
+        """Return a new list, the value itself cannot change."""
+        return list(self._dns_list)
+
 
+class MInfo(Value):
+    __slots__ = ["_module", "_wwan_node", "_lac", "_cell_id", "_icc_id",
+                 "_imei", "_qmi_port", "_at_port"]
 
-class MInfo(object):
     def __init__(
             self,
             module,
@@ -191,7 +274,8 @@ class MInfo(object):
             cell_id=None,
             icc_id=None,
             imei=None,
-            qmi_port=None):
+            qmi_port=None,
+            at_port=None):
         self._module = module
         self._wwan_node = wwan_node
         self._lac = "" if lac is None else lac
@@ -200,6 +284,7 @@ class MInfo(object):
         self._imei = "" if imei is None else imei
 
         self._qmi_port = qmi_port
+        self._at_port = at_port
 
     @property
     def module(self):
@@ -229,6 +314,10 @@ class MInfo(object):
     def qmi_port(self):
         return self._qmi_port
 
+    @property
+    def at_port(self):
+        return self._at_port
+
 
 class SimStatus(Enum):
     nosim = 0
@@ -236,16 +325,19 @@ class SimStatus(Enum):
     ready = 2
 
 
-class Signal(object):
+class Signal(Value):
+    __slots__ = ["_mode", "_rssi_dbm", "_ecio_dbm", "_csq"]
+
     def __init__(
             self,
             mode=None,
             rssi_dbm=None,
-            ecio_dbm=None,
+            ecio_dbm=0.0,
             csq=None):
         self._mode = "none" if mode is None else mode
         self._rssi_dbm = 0 if rssi_dbm is None else rssi_dbm
-        self._ecio_dbm = 0.0 if ecio_dbm is None else ecio_dbm
+        # None if the module does not report it
+        self._ecio_dbm = ecio_dbm
         self._csq = 0 if csq is None else csq
 
     @property
@@ -265,7 +357,9 @@ class Signal(object):
         return self._ecio_dbm
 
 
-class CellularModuleIds(object):
+class CellularModuleIds(Value):
+    __slots__ = ["_imei", "_esn"]
+
     def __init__(
             self,
             imei="",
@@ -286,7 +380,9 @@ class CellularModuleIds(object):
         return self._esn
 
 
-class CellularSimInfo(object):
+class CellularSimInfo(Value):
+    __slots__ = ["_iccid", "_imsi"]
+
     def __init__(
             self,
             iccid="",
@@ -307,7 +403,9 @@ class CellularSimInfo(object):
         return self._imsi
 
 
-class CellularLocation(object):
+class CellularLocation(Value):
+    __slots__ = ["_cell_id", "_lac", "_tac", "_bid", "_nid"]
+
     def __init__(
             self,
             cell_id="",
@@ -362,12 +460,15 @@ class CellMgmt(object):
         r"Gateway=([0-9]+\.[0-9]+\.[0-9]+\.[0-9]+)\n")
     _start_dns_regex = re.compile(
         r"DNS=([0-9\. ]*)\n")
+    # `Key: value` outputs with optional keys, a per-key search of the
+    # short outputs above is faster
+    _kv_parser = KeyValueParser()
     _signal_regex = re.compile(
         r"^([\S]+) (-[0-9]+) dbm\n$")
     _signal_adv_regex = re.compile(
         r"^CSQ: ([0-9]+)\n"
         r"RSSI: ([\S]+) (-[0-9]+) dBm\n"
-        r"EcIo: ([\S]+) (-[0-9.]+) dBm\n")
+        r"(?:EcIo: ([\S]+) (-?[0-9.]+) dBm\n)?")
     _m_info_regex = re.compile(
         r"^Module=([\S ]+)\n"
         r"WWAN_node=([\S]+)\n"
@@ -378,6 +479,8 @@ class CellMgmt(object):
         r"ICC-ID=([\S]*)\n"
         r"IMEI=([\S]*)\n"
         r"QMI_port=([\S]*)\n")
+    _m_info_at_port_regex = re.compile(
+        r"AT_port=([\S]*)\n")
     _operator_regex = re.compile(
         r"^([\S ]*)\n$")
     _sim_status_ready_regex = re.compile(
@@ -401,29 +504,6 @@ class CellMgmt(object):
         r"ESN: ([\S]*)\n"
     )
 
-    _sim_info_iccid_regex = re.compile(
-        r"ICC-ID: ([\S]*)\n"
-    )
-    _sim_info_imsi_regex = re.compile(
-        r"IMSI: ([\S]*)\n"
-    )
-
-    _location_info_lac_regex = re.compile(
-        r"LAC: ([\S]*)\n"
-    )
-    _location_info_tac_regex = re.compile(
-        r"TAC: ([\S]*)\n"
-    )
-    _location_info_cellid_regex = re.compile(
-        r"CellID: ([\S]*)\n"
-    )
-    _location_info_nid_regex = re.compile(
-        r"NID: ([\S]*)\n"
-    )
-    _location_info_bid_regex = re.compile(
-        r"BID: ([\S]*)\n"
-    )
-
     _at_response_ok_regex = re.compile(
         r"^[\r\n]*([+\S\s :]*)[\r\n]+OK[\r\n]*$")
     _at_response_err_regex = re.compile(
@@ -434,24 +514,128 @@ class CellMgmt(object):
     _split_param_by_comma_regex = re.compile(
         r",{0,1}\"{0,1}([^\s\",]*)\"{0,1},{0,1}")
 
-    _lock = RLock()
+    _fw_version_regex = re.compile(
+        r"SWI9X15C_(.*?) r")
+
+    _batch_section_regex = re.compile(
+        r"@@cell_mgmt ([0-9]+)\n([\s\S]*?)\n@@rc ([0-9]+)\n")
+
+    # query: ([cell_mgmt subcommand, ...], parser)
+    _batch_queries = {
+        "signal_adv": (["signal_adv"], "_parse_signal_adv"),
+        "operator": (["operator"], "_parse_operator"),
+        "location_info": (["location_info"], "_parse_location_info"),
+        "sim_info": (["iccid", "imsi"], "_parse_sim_info"),
+    }
+
+    # shared with other processes using the module, like
+    # `flock /var/lock/cell_mgmt.lock cell_mgmt ...`
+    LOCK_FILE = "/var/lock/cell_mgmt.lock"
+    LOCK_TIMEOUT_SEC = 120
+
+    # timeout of a cell_mgmt call, also of each one in a batch
+    CELL_MGMT_TIMEOUT_SEC = 70
+    _lock = ModemLock(LOCK_FILE)
+
+    # retry while cell_mgmt exits 60 (busy)
+    BUSY_RETRY_POLICY = RetryPolicy(
+        max_attempts=11, initial_delay_sec=0.1, max_delay_sec=5.0,
+        deadline_sec=60)
+    # retry at() on other failures, like unexpected output
+    AT_RETRY_POLICY = RetryPolicy(
+        max_attempts=3, initial_delay_sec=0.2, max_delay_sec=1.0)
+
+    # shared by all instances, see set_backend()
+    _backend = None
+
+    # cache TTL in seconds of read commands,
+    # None lives until power cycle, SIM change or related set commands
+    CACHE_TTL = {
+        "m_info": None,
+        "module_ids": None,
+        "sim_info": None,
+        "pin_retry_remain": None,
+        "pdp_context_list": None,
+        "cellular_fw": None,
+        "operator": 30,
+        "signal": 5,
+        "signal_adv": 5,
+        "location_info": 5,
+    }
+    _cache = TtlCache(CACHE_TTL)
+
+    # cached results which depend on the inserted SIM card
+    _sim_dependent_cache = (
+        "m_info", "sim_info", "pin_retry_remain", "pdp_context_list",
+        "operator")
+    _last_sim_status = None
 
     def __init__(self):
         self._exe_path = "/sbin/cell_mgmt"
 
         # Add default timeout to cell_mgmt
         # will raise TimeoutException
-        self._cell_mgmt = sh_default_timeout(sh.cell_mgmt, 70)
+        self._sh_cell_mgmt = sh_default_timeout(
+            Command("cell_mgmt"), self.CELL_MGMT_TIMEOUT_SEC)
+        self._cell_mgmt = self._invoke
+        self._shell = sh_default_timeout(
+            Command("sh"), self.CELL_MGMT_TIMEOUT_SEC)
 
         self._invoke_period_sec = 0
 
         self._use_shell = False
 
+    @classmethod
+    def set_backend(cls, backend):
+        """
+        Serve cell_mgmt subcommands by backend, like AtSessionBackend,
+        instead of spawning /sbin/cell_mgmt for each of them.
+        Set None to go back to /sbin/cell_mgmt.
+        """
+        with cls._lock:
+            if cls._backend is not None:
+                cls._backend.close()
+            cls._backend = backend
+
+    @classmethod
+    def lock_stats(cls):
+        """
+        Return per-command lock wait and hold time, see ModemLock.stats().
+        """
+        return cls._lock.stats()
+
+    @classmethod
+    def retry_stats(cls):
+        """
+        Return retry counters of each policy, see RetryPolicy.stats().
+        """
+        return {
+            "busy": cls.BUSY_RETRY_POLICY.stats(),
+            "at": cls.AT_RETRY_POLICY.stats()
+        }
+
+    @classmethod
+    def cache_stats(cls):
+        """
+        Return cache hit/miss counters like:
+            {
+                "m_info": {"hit": 12, "miss": 1, "invalidate": 0}
+            }
+        """
+        return cls._cache.stats()
+
+    def _invoke(self, *args, **kwargs):
+        with metrics.timer("cell_mgmt", args[0] if args else ""):
+            backend = CellMgmt._backend
+            if backend is None:
+                return self._sh_cell_mgmt(*args, **kwargs)
+
+            return backend.execute(self._sh_cell_mgmt, *args, **kwargs)
+
     @critical_section
     @handle_error_return_code
     @retry_on_busy
-    @retrying(
-        stop_max_attempt_number=10, wait_random_min=500, wait_random_max=1500)
+    @retry_on_error
     def at(self, cmd, timeout=None):
         """
         Send AT command.
@@ -466,8 +650,59 @@ class CellMgmt(object):
             output = self._cell_mgmt("at", cmd)
         else:
             output = self._cell_mgmt("at", cmd, timeout)
-        output = str(output)
 
+        return self._parse_at(str(output))
+
+    def at_batch(self, cmds, stop_on_error=False):
+        """
+        Send several AT commands under one lock acquisition, in order.
+
+        With the at backend they all go over the open AT port, no process
+        is spawned. With /sbin/cell_mgmt one shell still runs a
+        `cell_mgmt at` per command, which saves only the lock and
+        decorator round trips of calling at() for each, not the process
+        per command.
+
+        cmds is a list of commands, or (command, timeout) for the ones
+        that need a timeout, like
+            ["ATE0", "AT+CGMR", ("AT!priid?", 3)]
+        Return a list of at() responses in the same order. An unexpected
+        output or a failing cell_mgmt counts as {"status": "err"}.
+        With stop_on_error, the commands after the first one that does
+        not answer OK are not sent and the list is shorter.
+        """
+        commands = []
+        for cmd in cmds:
+            if isinstance(cmd, basestring):
+                commands.append(["at", cmd])
+            else:
+                commands.append(["at"] + list(cmd))
+
+        return self._at_batch(commands, stop_on_error)
+
+    @critical_section
+    @handle_error_return_code
+    @retry_on_busy
+    def _at_batch(self, commands, stop_on_error):
+        _logger.debug("cell_mgmt at batch {}".format(
+            ", ".join([str(args[1]) for args in commands])))
+
+        results = []
+        for returncode, output in self._run_batch(
+                commands, stop_on_error=stop_on_error):
+            at_obj = {"status": "err", "info": ""}
+            if returncode != 0:
+                _logger.warning("cell_mgmt at exit {}".format(returncode))
+            else:
+                try:
+                    at_obj = self._parse_at(output)
+                except CellMgmtError:
+                    pass
+            results.append(at_obj)
+
+        return results
+
+    def _parse_at(self, output):
         match = self._at_response_ok_regex.match(output)
         if match:
             return {"status": "ok", "info": match.group(1).rstrip("\r\n")}
@@ -587,6 +822,7 @@ class CellMgmt(object):
             gateway="",
             dns_list=[])
 
+    @cached("signal")
     @critical_section
     @handle_error_return_code
     @retry_on_busy
@@ -611,6 +847,7 @@ class CellMgmt(object):
         # signal out of range
         return Signal()
 
+    @cached("signal_adv")
     @critical_section
     @handle_error_return_code
     @retry_on_busy
@@ -625,13 +862,17 @@ class CellMgmt(object):
         if self._invoke_period_sec != 0:
             sleep(self._invoke_period_sec)
 
+        return self._parse_signal_adv(output)
+
+    def _parse_signal_adv(self, output):
         match = CellMgmt._signal_adv_regex.match(output)
         if match:
             return Signal(
                 csq=int(match.group(1)),
                 mode=match.group(2),
                 rssi_dbm=int(match.group(3)),
-                ecio_dbm=float(match.group(5)))
+                ecio_dbm=None if match.group(5) is None
+                else float(match.group(5)))
 
         _logger.warning("unexpected output: " + output)
         # signal out of range
@@ -685,6 +926,7 @@ class CellMgmt(object):
         if self._invoke_period_sec != 0:
             sleep(self._invoke_period_sec)
 
+    @invalidate_cache()
     @critical_section
     @handle_error_return_code
     @retry_on_busy
@@ -692,10 +934,13 @@ class CellMgmt(object):
         """
         Power cycle Cellular module.
         """
-        self._power_off(force)
-        sleep(1)
-        self._power_on(force, timeout_sec)
+        # not cancellable, the module must not be left powered off
+        with cancel_scope(None):
+            self._power_off(force)
+            sleep(1)
+            self._power_on(force, timeout_sec)
 
+    @cached("m_info")
     @critical_section
     @handle_error_return_code
     @retry_on_busy
@@ -719,6 +964,11 @@ class CellMgmt(object):
         if qmi_port == "":
             qmi_port = None
 
+        at_port = None
+        found = self._m_info_at_port_regex.search(output)
+        if found and found.group(1) != "":
+            at_port = found.group(1)
+
         return MInfo(
             module=match.group(1),
             wwan_node=match.group(2),
@@ -726,8 +976,10 @@ class CellMgmt(object):
             cell_id=match.group(4),
             icc_id=match.group(5),
             imei=match.group(6),
-            qmi_port=qmi_port)
+            qmi_port=qmi_port,
+            at_port=at_port)
 
+    @cached("operator")
     @critical_section
     @handle_error_return_code
     @retry_on_busy
@@ -744,6 +996,9 @@ class CellMgmt(object):
         if self._invoke_period_sec != 0:
             sleep(self._invoke_period_sec)
 
+        return self._parse_operator(output)
+
+    def _parse_operator(self, output):
         match = self._operator_regex.match(output)
         if not match:
             _logger.warning("unexpected output: {}".format(output))
@@ -751,12 +1006,21 @@ class CellMgmt(object):
 
         return match.group(1)
 
-    @critical_section
-    @handle_error_return_code
     def pdp_context_list(self):
         """
-        Return PDP context list.
+        Return PDP context list, like:
+            [{"id": 1, "type": "ipv4", "apn": "internet"}]
 
+        Cached until set_pdp_context(), power cycle or SIM change.
+        """
+        # callers may modify the result
+        return deepcopy(self._query_pdp_context_list())
+
+    @cached("pdp_context_list")
+    @critical_section
+    @handle_error_return_code
+    def _query_pdp_context_list(self):
+        """
         Response of "get_profiles"
             <id>,<apn>,<type>
         Example:
@@ -782,6 +1046,7 @@ class CellMgmt(object):
         except ErrorReturnCode_60:
             raise
 
+    @invalidate_cache("pdp_context_list")
     @critical_section
     @handle_error_return_code
     @retrying(
@@ -800,6 +1065,7 @@ class CellMgmt(object):
         except ErrorReturnCode_60:
             raise
 
+    @invalidate_cache("sim_info", "pin_retry_remain")
     @critical_section
     @handle_error_return_code
     def set_pin(self, pin):
@@ -832,15 +1098,27 @@ class CellMgmt(object):
             output = str(output)
 
             if self._sim_status_ready_regex.match(output):
-                return SimStatus.ready
+                sim_status = SimStatus.ready
             elif self._sim_status_sim_pin_regex.match(output):
-                return SimStatus.pin
+                sim_status = SimStatus.pin
             else:
-                return SimStatus.nosim
+                sim_status = SimStatus.nosim
+
+        except ErrorReturnCode_60:
+            # busy, not a missing SIM
+            raise
 
         except ErrorReturnCode:
-            return SimStatus.nosim
+            sim_status = SimStatus.nosim
+
+        if sim_status != CellMgmt._last_sim_status:
+            # SIM inserted, removed or unlocked
+            CellMgmt._cache.invalidate(*self._sim_dependent_cache)
+            CellMgmt._last_sim_status = sim_status
 
+        return sim_status
+
+    @cached("pin_retry_remain")
     @critical_section
     @handle_error_return_code
     def get_pin_retry_remain(self):
@@ -852,6 +1130,7 @@ class CellMgmt(object):
         output = self._cell_mgmt("pin_retries")
         return int(output)
 
+    @cached("module_ids")
     @critical_section
     @handle_error_return_code
     def get_cellular_module_ids(self):
@@ -879,50 +1158,43 @@ class CellMgmt(object):
             imei=imei,
             esn=esn)
 
-    @critical_section
-    @handle_error_return_code
     def get_cellular_sim_info(self):
         """
         Return CellularSimInfo instance.
         """
-        iccid = ""
-        imsi = ""
+        sim_info = self.batch(["sim_info"])["sim_info"]
+        if sim_info is None:
+            raise CellMgmtError
 
-        _logger.debug("cell_mgmt iccid")
-        _logger.debug("cell_mgmt imsi")
+        return sim_info
 
+    def _parse_sim_info(self, iccid_output, imsi_output):
         # `cell_mgmt iccid`
-        # ICCID: xxx
-        output = str(self._cell_mgmt("iccid"))
-        found = self._sim_info_iccid_regex.search(output)
-        if found:
-            iccid = found.group(1)
-
+        # ICC-ID: xxx
+        #
         # `cell_mgmt imsi`
         # IMSI: xxx
-        output = str(self._cell_mgmt("imsi"))
-        found = self._sim_info_imsi_regex.search(output)
-        if found:
-            imsi = found.group(1)
-
         return CellularSimInfo(
-            iccid=iccid,
-            imsi=imsi)
+            iccid=self._kv_parser.parse(iccid_output).get("ICC-ID", ""),
+            imsi=self._kv_parser.parse(imsi_output).get("IMSI", ""))
 
+    @cached("location_info")
     @critical_section
     @handle_error_return_code
     def get_cellular_location(self):
         """
         Return CellularLocation instance.
         """
-        cellid = ""
-        lac = ""
-        tac = ""
-        nid = ""
-        bid = ""
-
         _logger.debug("cell_mgmt location_info")
 
+        return self._parse_location_info(
+            str(self._cell_mgmt("location_info")))
+
+    def _answered_ok(self, returncode, output):
+        return returncode == 0 and \
+            self._at_response_ok_regex.match(output) is not None
+
+    def _parse_location_info(self, output):
         # [umts]
         # LAC: xxx
         # CellID: xxx
@@ -934,64 +1206,223 @@ class CellMgmt(object):
         # [cdma]
         # NID: xxx
         # BID: xxx
-        output = str(self._cell_mgmt("location_info"))
-        found = self._location_info_lac_regex.search(output)
-        if found:
-            lac = found.group(1)
+        info = self._kv_parser.parse(output)
 
-        found = self._location_info_cellid_regex.search(output)
-        if found:
-            cellid = found.group(1)
+        return CellularLocation(
+            cell_id=info.get("CellID", ""),
+            lac=info.get("LAC", ""),
+            tac=info.get("TAC", ""),
+            bid=info.get("BID", ""),
+            nid=info.get("NID", ""))
 
-        found = self._location_info_tac_regex.search(output)
-        if found:
-            tac = found.group(1)
+    def batch(self, queries):
+        """
+        Run several read-only queries under one lock acquisition.
+        Backends with execute_many(), like QmiBackend, keep all of them in
+        flight at once; /sbin/cell_mgmt runs them one after another from a
+        single shell.
 
-        found = self._location_info_nid_regex.search(output)
-        if found:
-            nid = found.group(1)
+        queries is a list of names in CellMgmt._batch_queries, like
+            ["signal_adv", "operator", "location_info", "sim_info"]
+        Return dict like:
+            {
+                "signal_adv": Signal,
+                "operator": "Chunghwa Telecom",
+                "location_info": CellularLocation,
+                "sim_info": CellularSimInfo
+            }
+        The value is None if that query failed.
+        Cached results are returned without touching the module.
+        """
+        results = {}
+        pending = []
+        generations = {}
+        for query in queries:
+            hit, value = CellMgmt._cache.lookup(query)
+            if hit:
+                results[query] = value
+            else:
+                pending.append(query)
+                generations[query] = value
 
-        found = self._location_info_bid_regex.search(output)
-        if found:
-            bid = found.group(1)
+        if pending:
+            for query, value in self._batch(pending).items():
+                results[query] = value
+                if value is not None:
+                    CellMgmt._cache.store(
+                        query, (), value, generations[query])
 
-        return CellularLocation(
-            cell_id=cellid,
-            lac=lac,
-            tac=tac,
-            bid=bid,
-            nid=nid)
+        return results
 
     @critical_section
     @handle_error_return_code
+    @retry_on_busy
+    def _batch(self, queries):
+        subcommands = []
+        for query in queries:
+            for subcommand in self._batch_queries[query][0]:
+                if subcommand not in subcommands:
+                    subcommands.append(subcommand)
+
+        _logger.debug("cell_mgmt batch {}".format(" ".join(subcommands)))
+
+        sections = dict(zip(
+            subcommands, self._run_batch([[cmd] for cmd in subcommands])))
+
+        results = {}
+        for query in queries:
+            names, parser = self._batch_queries[query]
+            outputs = []
+            for name in names:
+                returncode, output = sections[name]
+                if returncode != 0:
+                    _logger.warning("cell_mgmt {} exit {}".format(
+                        name, returncode))
+                    break
+                outputs.append(output)
+
+            results[query] = None
+            if len(outputs) != len(names):
+                continue
+            try:
+                results[query] = getattr(self, parser)(*outputs)
+            except CellMgmtError:
+                _logger.warning(format_exc())
+
+        return results
+
+    def _run_batch(self, commands, stop_on_error=False):
+        """
+        Run cell_mgmt with each argument list in commands,
+        return a list of (returncode, output) in the same order.
+
+        stop_on_error is meant for `cell_mgmt at` commands: the ones after
+        the first that exits non-zero or does not answer OK are not run
+        and left out of the list.
+        """
+        backend = CellMgmt._backend
+        if (backend is not None and hasattr(backend, "execute_many") and
+                not stop_on_error):
+            # the backend keeps all of them in flight at once
+            with metrics.timer("cell_mgmt", "batch"):
+                results = backend.execute_many(self._sh_cell_mgmt, commands)
+        elif backend is not None:
+            results = []
+            for args in commands:
+                try:
+                    results.append((0, str(self._cell_mgmt(*args))))
+                except ErrorReturnCode as exc:
+                    results.append((exc.exit_code, exc.stdout))
+                if stop_on_error and not self._answered_ok(*results[-1]):
+                    break
+        else:
+            # one shell runs all of them one after another, sections are
+            # framed by markers; each one has the timeout of a single call,
+            # a timed out one exits 124 and fails its section only
+            timeout = deadline_remaining(self.CELL_MGMT_TIMEOUT_SEC)
+            if timeout <= 0:
+                raise DeadlineExceeded
+            run = "timeout --foreground {} cell_mgmt".format(
+                int(ceil(timeout)))
+            if stop_on_error:
+                script = "cr=$(printf '\\r'); " + "".join([
+                    "printf '@@cell_mgmt %d\\n' {}; o=$({} {}); "
+                    "rc=$?; printf '%s\\n@@rc %d\\n' \"$o\" $rc; "
+                    "[ $rc -eq 0 ] || exit 0; "
+                    "case \"$o\" in *OK|*OK\"$cr\") ;; *) exit 0;; esac; "
+                    .format(index, run,
+                            " ".join([quote(str(arg)) for arg in args]))
+                    for index, args in enumerate(commands)])
+            else:
+                script = "".join([
+                    "printf '@@cell_mgmt %d\\n' {}; {} {}; "
+                    "printf '\\n@@rc %d\\n' $?; ".format(
+                        index, run,
+                        " ".join([quote(str(arg)) for arg in args]))
+                    for index, args in enumerate(commands)])
+            with metrics.timer("cell_mgmt", "batch"):
+                output = str(self._shell(
+                    "-c", script, _timeout=timeout * len(commands)))
+
+            sections = {}
+            for match in self._batch_section_regex.finditer(output):
+                sections[int(match.group(1))] = (
+                    int(match.group(3)), match.group(2))
+            count = len(commands)
+            if stop_on_error and sections and \
+                    not self._answered_ok(*sections[max(sections)]):
+                count = max(sections) + 1
+            if sorted(sections) != range(count):
+                _logger.warning("unexpected output: " + output)
+                raise CellMgmtError
+            results = [sections[index] for index in xrange(count)]
+
+        for returncode, output in results:
+            if returncode == 60:
+                raise ErrorReturnCode_60("cell_mgmt", output, "")
+
+        return results
+
     def get_cellular_fw(self):
         """
-        Return Cellular FW information.
+        Return Cellular FW information, None if the module does not tell.
         Example entry: 9999999_9902266_SWI9X15C_05.05.58.01_00_VZW_005.029_001
+
+        Cached per module and IMEI until set_cellular_fw() or power cycle.
         """
-        self.at("ATE0")
-        self.at("AT!ENTERCND=\"A710\"")
+        minfo = self.m_info()
+        key = (minfo.module, minfo.imei)
+
+        hit, value = CellMgmt._cache.lookup("cellular_fw", key)
+        if not hit:
+            generation = value
+            value = self._query_cellular_fw()
+            if value is not None:
+                CellMgmt._cache.store("cellular_fw", key, value, generation)
+
+        # callers may modify the result
+        return deepcopy(value)
+
+    @staticmethod
+    def cached_cellular_fw():
+        """
+        Return get_cellular_fw() of the current module if it is cached,
+        None otherwise, without touching the module.
+        """
+        hit, minfo = CellMgmt._cache.peek("m_info")
+        if not hit:
+            return None
+
+        hit, value = CellMgmt._cache.peek(
+            "cellular_fw", (minfo.module, minfo.imei))
+        return deepcopy(value) if hit else None
+
+    @critical_section
+    @handle_error_return_code
+    def _query_cellular_fw(self):
+        _, _, current_fw, priid, pref = self.at_batch([
+            "ATE0",
+            "AT!ENTERCND=\"A710\"",
+            # current fw version
+            "AT+CGMR",
+            # all carrier profiles
+            ("AT!priid?", 3),
+            "AT!GOBIIMPREF?"])
 
-        # get current fw version
-        current_fw = self.at("AT+CGMR")
         _logger.debug("{}".format(current_fw))
-        fw_regex = r"SWI9X15C_(.*?) r"
-        fw_matches = re.finditer(fw_regex, current_fw["info"])
-        for _, match in enumerate(fw_matches):
+        match = self._fw_version_regex.search(current_fw["info"])
+        if match:
             current_fw = match.group(1)
-            break
 
-        # get all carrier profiles
-        at_obj = self.at("AT!priid?", 3)
+        at_obj = priid
         _logger.debug(at_obj)
         if at_obj["status"] != "ok":
             return None
 
-        regex = r"^Carrier PRI: (.*?)$"
-        matches = re.finditer(regex, at_obj["info"], re.MULTILINE)
         pri_list = [
-            (lambda match: match.group(1))(match)
-            for _, match in enumerate(matches)
+            value
+            for key, value in self._kv_parser.parse_all(at_obj["info"])
+            if key == "Carrier PRI"
         ]
 
         result = {
@@ -1011,19 +1442,14 @@ class CellMgmt(object):
             })
         _logger.debug("{}".format(result))
 
-        regex = r"^(.*?):\s+(\S*)$"
-        at_obj = self.at("AT!GOBIIMPREF?")
+        at_obj = pref
         _logger.debug(at_obj)
         if at_obj["status"] != "ok":
             return None
-        matches = re.finditer(regex, at_obj["info"], re.MULTILINE)
-        status_lines = [
-            (lambda match: (match.group(1), match.group(2)))(match)
-            for _, match in enumerate(matches)
-        ]
+        status_lines = self._kv_parser.parse_all(at_obj["info"])
 
         for entry in status_lines:
-            key = entry[0].strip()
+            key = entry[0]
             if key == "preferred fw version":
                 # FIXME: Use fixed fwver now
                 result["preferred"]["fwver"] = current_fw
@@ -1045,18 +1471,41 @@ class CellMgmt(object):
 
     @critical_section
     @handle_error_return_code
-    def set_cellular_fw(self, fwver, config, carrier):
+    def enter_engineering_mode(self):
+        """
+        Unlock the firmware management AT commands.
+        Raise CellMgmtError if the module refuses.
         """
-        Return Cellular FW information.
+        _logger.debug("cell_mgmt ATE0, AT!ENTERCND=A710")
+        _, at_obj = self.at_batch(["ATE0", "AT!ENTERCND=\"A710\""])
+        if at_obj["status"] != "ok":
+            raise CellMgmtError(
+                "AT!ENTERCND: {} {}".format(at_obj["status"], at_obj["info"]))
+
+    @invalidate_cache("cellular_fw")
+    @critical_section
+    @handle_error_return_code
+    def set_fw_preference(self, fwver, config, carrier):
+        """
+        Prefer the firmware, applied by the next power cycle.
+        Needs enter_engineering_mode() first.
+        Return the AT command response, see at().
         """
         atcmd = "AT!GOBIIMPREF=\"{}\",\"{}\",\"{}\"".format(
             fwver, carrier, config)
-        _logger.debug("cell_mgmt ATE0")
-        self.at("ATE0")
-        _logger.debug("cell_mgmt AT!ENTERCND=A710")
-        self.at("AT!ENTERCND=\"A710\"")
         _logger.debug("cell_mgmt {}".format(atcmd))
-        self.at(atcmd)
+        return self.at(atcmd)
+
+    @invalidate_cache()
+    @critical_section
+    @handle_error_return_code
+    def set_cellular_fw(self, fwver, config, carrier):
+        """
+        Switch Cellular FW in one go, see FirmwareJob for the steps
+        without holding the modem in between.
+        """
+        self.enter_engineering_mode()
+        self.set_fw_preference(fwver, config, carrier)
         self.power_cycle()
 
 
@@ -0,0 +1,75 @@
+"""
+Per-thread deadline honored by every CellMgmt layer.
+
+    with deadline(5):
+        cell_mgmt.pdp_context_list()
+
+Lock waiting, retries and subprocess timeouts are cut short once the
+budget runs out, nested deadlines never extend an outer one.
+"""
+
+from contextlib import contextmanager
+from monotonic import monotonic
+from threading import local
+
+_local = local()
+
+
+class DeadlineExceeded(Exception):
+    """DeadlineExceeded"""
+    pass
+
+
+@contextmanager
+def deadline(budget_sec):
+    """Run the block within budget_sec seconds, None for no limit."""
+    outer = current()
+    until = outer
+    if budget_sec is not None:
+        until = monotonic() + budget_sec
+        if outer is not None:
+            until = min(until, outer)
+
+    with deadline_at(until):
+        yield
+
+
+@contextmanager
+def deadline_at(until):
+    """Run the block until monotonic() reaches until, to hand a deadline
+    over to another thread."""
+    outer = current()
+    _local.until = until
+    try:
+        yield
+    finally:
+        _local.until = outer
+
+
+def current():
+    """Return the deadline in monotonic() time of this thread, or None."""
+    return getattr(_local, "until", None)
+
+
+def remaining(default=None):
+    """
+    Return seconds left, at most default.
+    Return default if there is no deadline.
+    """
+    until = current()
+    if until is None:
+        return default
+
+    left = max(0.0, until - monotonic())
+    return left if default is None else min(default, left)
+
+
+def expired():
+    until = current()
+    return until is not None and monotonic() >= until
+
+
+def check():
+    """Raise DeadlineExceeded if the deadline has passed."""
+    if expired():
+        raise DeadlineExceeded
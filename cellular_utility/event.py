@@ -124,6 +124,38 @@ class Log(object):
         """
         self._log("no-pdp-context")
 
+    def log_event_connect_trace(
+            self,
+            trace):
+        """
+        Connect trace ended.
+        trace should be an instance of
+          cellular_utility.profiler.ConnectTrace
+        """
+        trace = trace.to_dict()
+
+        # seconds per phase over all attempts, in order of appearance
+        names = []
+        totals = {}
+        for phase in trace["phases"]:
+            if phase["name"] not in totals:
+                names.append(phase["name"])
+                totals[phase["name"]] = 0
+            totals[phase["name"]] += phase["sec"]
+
+        log = "connect-trace {}, {} {}, {} in {:.1f}s, {} attempts".format(
+            trace["id"], trace["trigger"], trace["result"],
+            ", ".join(["{} {}".format(key, trace["labels"][key])
+                       for key in sorted(trace["labels"])]) or "no label",
+            trace["elapsed"], trace["attempts"])
+        if trace["reason"] is not None:
+            log += ", last failure {}".format(trace["reason"])
+        if names:
+            log += ", " + ", ".join(
+                ["{} {:.1f}s".format(name, totals[name]) for name in names])
+
+        self._log(log)
+
     def _log(self, msg):
         """
         Do actual logging.
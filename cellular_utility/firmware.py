@@ -0,0 +1,263 @@
+"""
+Firmware and carrier switching as a background job.
+
+    jobs = FirmwareJobs(cell_mgmt, callback=publish, pause=pause_manager)
+    job = jobs.start(fwver="05.05.58.01", config="005.029_001",
+                     carrier="VZW")
+    jobs.get(job.id).to_dict()
+
+Every step is a separate CellMgmt call, so other modem queries are
+served in between and only the power cycle keeps the module away.
+Whatever would power cycle or reconnect the module on its own, like the
+Manager, is paused for the whole job.
+"""
+
+from collections import OrderedDict
+from contextlib import contextmanager
+from enum import Enum
+from itertools import count
+import logging
+from monotonic import monotonic
+from threading import Lock, Thread
+from time import sleep, time
+from traceback import format_exc
+
+from cellular_utility.cell_mgmt import CellMgmtError
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class FirmwareJobBusy(Exception):
+    """FirmwareJobBusy"""
+    pass
+
+
+class FirmwareJob(object):
+
+    class State(Enum):
+        pending = 0
+        entering_engineering_mode = 1
+        setting_preference = 2
+        power_cycling = 3
+        module_back = 4
+        verified = 5
+        failed = 6
+
+    FINAL_STATES = (State.verified, State.failed)
+
+    # the module re-enumerates within a minute after a power cycle,
+    # longer when it has to load another carrier image
+    MODULE_BACK_TIMEOUT_SEC = 180
+    MODULE_BACK_POLL_SEC = 3
+
+    def __init__(self, id_, cell_mgmt, fwver, config, carrier, callback=None,
+                 pause=None):
+        """
+        callback(job) is called on every state transition, from the job
+        thread.
+        pause() returns a context manager held by the job thread around
+        all of the steps.
+        """
+        self._id = id_
+        self._cell_mgmt = cell_mgmt
+        self._fwver = fwver
+        self._config = config
+        self._carrier = carrier
+        self._callback = callback
+        self._pause = _no_pause if pause is None else pause
+
+        self._lock = Lock()
+        self._state = FirmwareJob.State.pending
+        self._error = None
+        self._history = [(self._state, time())]
+        self._thread = None
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def state(self):
+        return self._state
+
+    @property
+    def error(self):
+        return self._error
+
+    def done(self):
+        return self._state in FirmwareJob.FINAL_STATES
+
+    def start(self):
+        self._thread = Thread(
+            name="sanji.cellular.firmware.{}".format(self._id),
+            target=self._main_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def to_dict(self):
+        """
+        Return dict like:
+            {
+                "id": 1,
+                "fwver": "05.05.58.01",
+                "config": "005.029_001",
+                "carrier": "VZW",
+                "state": "power_cycling",
+                "error": None,
+                "history": [
+                    {"state": "pending", "time": 1467012345.1},
+                    ...
+                ]
+            }
+        """
+        with self._lock:
+            return {
+                "id": self._id,
+                "fwver": self._fwver,
+                "config": self._config,
+                "carrier": self._carrier,
+                "state": self._state.name,
+                "error": self._error,
+                "history": [
+                    {"state": state.name, "time": at}
+                    for state, at in self._history]
+            }
+
+    def _set_state(self, state, error=None):
+        with self._lock:
+            self._state = state
+            self._error = error
+            self._history.append((state, time()))
+
+        _logger.info("firmware job {}: {}{}".format(
+            self._id, state.name, "" if error is None else ", " + error))
+        if self._callback is not None:
+            try:
+                self._callback(self)
+            except Exception:
+                _logger.warning(format_exc())
+
+    def _main_thread(self):
+        try:
+            with self._pause():
+                self._switch()
+
+        except CellMgmtError as e:
+            _logger.warning(format_exc())
+            self._set_state(FirmwareJob.State.failed, error=str(e) or repr(e))
+
+        except Exception as e:
+            _logger.error("should not reach here")
+            _logger.warning(format_exc())
+            self._set_state(FirmwareJob.State.failed, error=repr(e))
+
+    def _switch(self):
+        self._set_state(FirmwareJob.State.entering_engineering_mode)
+        self._cell_mgmt.enter_engineering_mode()
+
+        self._set_state(FirmwareJob.State.setting_preference)
+        at_obj = self._cell_mgmt.set_fw_preference(
+            fwver=self._fwver, config=self._config, carrier=self._carrier)
+        if at_obj is None or at_obj["status"] != "ok":
+            self._set_state(
+                FirmwareJob.State.failed,
+                error="preference rejected: {}".format(
+                    None if at_obj is None else at_obj["info"]))
+            return
+
+        self._set_state(FirmwareJob.State.power_cycling)
+        self._cell_mgmt.power_cycle(timeout_sec=self.MODULE_BACK_TIMEOUT_SEC)
+
+        if not self._wait_module_back():
+            self._set_state(
+                FirmwareJob.State.failed, error="module did not come back")
+            return
+        self._set_state(FirmwareJob.State.module_back)
+
+        fw_info = self._cell_mgmt.get_cellular_fw()
+        current = {} if fw_info is None else fw_info["current"]
+        if (current.get("carrier") != self._carrier or
+                current.get("config") != self._config):
+            self._set_state(
+                FirmwareJob.State.failed,
+                error="current firmware: {}".format(current))
+            return
+        self._set_state(FirmwareJob.State.verified)
+
+    def _wait_module_back(self):
+        until = monotonic() + self.MODULE_BACK_TIMEOUT_SEC
+        while True:
+            try:
+                self._cell_mgmt.m_info()
+                return True
+
+            except CellMgmtError:
+                _logger.debug("module not back yet")
+
+            if monotonic() + self.MODULE_BACK_POLL_SEC > until:
+                return False
+            sleep(self.MODULE_BACK_POLL_SEC)
+
+
+class FirmwareJobs(object):
+    """
+    Run firmware jobs one at a time and keep the last few for lookup.
+    """
+
+    KEEP = 10
+
+    def __init__(self, cell_mgmt, callback=None, pause=None):
+        """See FirmwareJob for callback and pause."""
+        self._cell_mgmt = cell_mgmt
+        self._callback = callback
+        self._pause = pause
+
+        self._lock = Lock()
+        self._ids = count(1)
+        self._jobs = OrderedDict()
+
+    def start(self, fwver, config, carrier):
+        """
+        Start switching to the firmware, return the FirmwareJob.
+        Raise FirmwareJobBusy if a job is still running.
+        """
+        with self._lock:
+            running = self._running()
+            if running is not None:
+                raise FirmwareJobBusy(running.id)
+
+            job = FirmwareJob(
+                next(self._ids), self._cell_mgmt,
+                fwver=fwver, config=config, carrier=carrier,
+                callback=self._callback, pause=self._pause)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.KEEP:
+                self._jobs.popitem(last=False)
+
+        job.start()
+        return job
+
+    def get(self, id_):
+        """Return the FirmwareJob of id_, or None."""
+        with self._lock:
+            return self._jobs.get(id_)
+
+    def running(self):
+        """Return the FirmwareJob not done yet, or None."""
+        with self._lock:
+            return self._running()
+
+    def _running(self):
+        for job in self._jobs.values():
+            if not job.done():
+                return job
+        return None
+
+
+@contextmanager
+def _no_pause():
+    yield
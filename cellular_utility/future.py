@@ -0,0 +1,153 @@
+"""
+Result of a command run on another thread, see CommandScheduler and
+WorkerPool.
+
+    cell_mgmt = scheduler.proxy(Priority.user)
+    futures = [cell_mgmt.submit("pdp_context_list"), pool.submit(usage)]
+    wait_all(futures, 5)
+"""
+
+from copy import deepcopy
+from monotonic import monotonic
+import sys
+from threading import Event, Lock
+
+from cellular_utility.deadline import remaining as deadline_remaining
+
+
+class FutureTimeout(Exception):
+    """FutureTimeout"""
+    pass
+
+
+class FutureCancelled(Exception):
+    """FutureCancelled"""
+    pass
+
+
+class Future(object):
+    """
+    Result of a command, shared by all callers coalesced to it. Each of
+    them gets a copy of the result then, callers may modify it.
+    """
+
+    _PENDING = 0
+    _RUNNING = 1
+    _DONE = 2
+    _CANCELLED = 3
+
+    def __init__(self, name, priority=None):
+        self.name = name
+        self.priority = priority
+
+        self._lock = Lock()
+        self._event = Event()
+        self._state = Future._PENDING
+        self._result = None
+        self._exc_info = None
+        self._waiters = 1
+        self._shared = False
+
+    def done(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        """
+        Stop waiting for the command if it has not started yet, it is
+        dropped once no coalesced caller waits for it.
+        Return True if the caller gets no result.
+        """
+        with self._lock:
+            if self._state != Future._PENDING:
+                return self._state == Future._CANCELLED
+
+            self._waiters -= 1
+            if self._waiters > 0:
+                return True
+
+            self._state = Future._CANCELLED
+            self._exc_info = (
+                FutureCancelled,
+                FutureCancelled("{} cancelled".format(self.name)),
+                None)
+            self._event.set()
+            return True
+
+    def wait(self, timeout=None):
+        """Return True if the command is done within timeout seconds."""
+        return self._event.wait(timeout)
+
+    def result(self, timeout=None):
+        """
+        Return the result of the command or raise its exception,
+        raise FutureTimeout if it is not done in timeout seconds.
+        """
+        if not self._event.wait(timeout):
+            raise FutureTimeout(
+                "{} not done in {}s".format(self.name, timeout))
+
+        if self._exc_info is not None:
+            raise self._exc_info[0], self._exc_info[1], self._exc_info[2]
+        if self._shared:
+            return deepcopy(self._result)
+        return self._result
+
+    def exception(self, timeout=None):
+        """Return the exception raised by the command, or None."""
+        if not self._event.wait(timeout):
+            raise FutureTimeout(
+                "{} not done in {}s".format(self.name, timeout))
+
+        return None if self._exc_info is None else self._exc_info[1]
+
+    def _join(self):
+        """Add a coalesced caller, return False if it is too late."""
+        with self._lock:
+            if self._state not in (Future._PENDING, Future._RUNNING):
+                return False
+            self._waiters += 1
+            self._shared = True
+            return True
+
+    def _start(self):
+        with self._lock:
+            if self._state != Future._PENDING:
+                return False
+            self._state = Future._RUNNING
+            return True
+
+    def _call(self, func, args, kwargs):
+        """Run func, keep its result or exception."""
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._set_exc_info(sys.exc_info())
+        else:
+            self._set_result(result)
+
+    def _set_result(self, result):
+        with self._lock:
+            self._state = Future._DONE
+            self._result = result
+            self._event.set()
+
+    def _set_exc_info(self, exc_info):
+        with self._lock:
+            self._state = Future._DONE
+            self._exc_info = exc_info
+            self._event.set()
+
+
+def wait_all(futures, timeout=None):
+    """
+    Wait until all futures are done, at most timeout seconds, cut short to
+    the remaining time of the deadline.
+    Return True if all of them are done.
+    """
+    timeout = deadline_remaining(timeout)
+    until = None if timeout is None else monotonic() + timeout
+    for future in futures:
+        left = None if until is None else max(0.0, until - monotonic())
+        if not future.wait(left):
+            return False
+    return True
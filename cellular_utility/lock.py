@@ -0,0 +1,265 @@
+"""
+Modem lock with a FIFO wait queue and per-command contention metrics.
+"""
+
+from collections import deque
+import errno
+import fcntl
+import logging
+from monotonic import monotonic
+import os
+from thread import get_ident
+from threading import Condition, Lock
+from time import sleep
+
+from cellular_utility.cancel import (
+    Cancelled, check as check_cancel, current as current_token
+)
+from cellular_utility.timer import timer
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class ModemLockTimeout(Exception):
+    """ModemLockTimeout"""
+    pass
+
+
+class ModemLock(object):
+    """
+    Reentrant lock, waiters are served first come first served.
+
+    Each outermost acquisition is accounted to a command name, stats()
+    reports how long commands waited for and held the lock.
+
+    If path is given, the outermost acquisition also takes flock() on it,
+    so other processes which flock the same file (helper scripts via
+    `flock <path> cell_mgmt ...`) are serialized with this process.
+    """
+
+    # flock() polling interval while waiting with a timeout
+    FLOCK_POLL_MIN_SEC = 0.001
+    FLOCK_POLL_MAX_SEC = 0.05
+
+    def __init__(self, path=None):
+        self._cond = Condition(Lock())
+        self._queue = deque()
+
+        self._path = path
+        self._fd = None
+
+        self._owner = None
+        self._depth = 0
+        self._name = None
+        self._acquired_at = 0
+
+        self._stats = {}
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def acquire(self, name="", timeout=None):
+        """
+        Block until the lock is acquired,
+        raise ModemLockTimeout if it takes more than timeout seconds,
+        or Cancelled once the cancel token of this thread is cancelled.
+        """
+        token = current_token()
+        if token is None:
+            self._acquire(name, timeout, None)
+            return
+
+        token.add_callback(self._notify_all)
+        try:
+            self._acquire(name, timeout, token)
+        finally:
+            token.remove_callback(self._notify_all)
+
+    def _acquire(self, name, timeout, token):
+        me = get_ident()
+        begin = monotonic()
+        with self._cond:
+            if self._owner == me:
+                self._depth += 1
+                return
+
+            stats = self._command_stats(name)
+
+            ticket = object()
+            self._queue.append(ticket)
+            stats["max_waiters"] = max(
+                stats["max_waiters"], len(self._queue))
+
+            # untimed, a timed wait polls; the timer wakes us up on timeout
+            task = None
+            try:
+                while self._owner is not None or self._queue[0] is not ticket:
+                    if token is not None and token.cancelled():
+                        raise Cancelled(
+                            "{} waiting for {}".format(name, self._name))
+                    if timeout is not None:
+                        remain = begin + timeout - monotonic()
+                        if remain <= 0:
+                            stats["timeouts"] += 1
+                            raise ModemLockTimeout(
+                                "{} waited {}s for {}".format(
+                                    name, timeout, self._name))
+                        if task is None:
+                            task = timer.notify_later(remain, self._cond)
+                    self._cond.wait()
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+            finally:
+                if task is not None:
+                    task.cancel()
+
+            self._queue.popleft()
+            self._owner = me
+            self._depth = 1
+            self._name = name
+
+        # other threads keep queueing up while waiting for other processes
+        try:
+            locked_at = monotonic()
+            self._flock(name, None if timeout is None else begin + timeout)
+        except BaseException:
+            with self._cond:
+                stats["timeouts"] += 1
+                self._owner = None
+                self._name = None
+                self._cond.notify_all()
+            raise
+
+        with self._cond:
+            self._acquired_at = monotonic()
+
+            wait = self._acquired_at - begin
+            stats["count"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+
+            ipc_wait = self._acquired_at - locked_at
+            stats["ipc_wait_total"] += ipc_wait
+            stats["ipc_wait_max"] = max(stats["ipc_wait_max"], ipc_wait)
+
+    def release(self):
+        with self._cond:
+            if self._owner != get_ident():
+                raise RuntimeError("cannot release un-acquired lock")
+
+            self._depth -= 1
+            if self._depth > 0:
+                return
+
+            hold = monotonic() - self._acquired_at
+            stats = self._command_stats(self._name)
+            stats["hold_total"] += hold
+            stats["hold_max"] = max(stats["hold_max"], hold)
+
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+            self._owner = None
+            self._name = None
+            self._cond.notify_all()
+
+    def _notify_all(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def owner(self):
+        """Return the command name holding the lock, or None."""
+        return self._name if self._owner is not None else None
+
+    def waiters(self):
+        return len(self._queue)
+
+    def stats(self):
+        """
+        Return dict of command name to stats like:
+            {
+                "start": {
+                    "count": 2,
+                    "wait_total": 0.01, "wait_max": 0.01,
+                    "hold_total": 31.2, "hold_max": 20.5,
+                    "ipc_wait_total": 0.0, "ipc_wait_max": 0.0,
+                    "max_waiters": 2,
+                    "timeouts": 0
+                }
+            }
+        Times are in seconds, wait includes ipc_wait, the time spent
+        waiting for other processes.
+        """
+        with self._cond:
+            return dict(
+                [(name, dict(stats)) for name, stats in self._stats.items()])
+
+    def _command_stats(self, name):
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = {
+                "count": 0,
+                "wait_total": 0.0,
+                "wait_max": 0.0,
+                "hold_total": 0.0,
+                "hold_max": 0.0,
+                "ipc_wait_total": 0.0,
+                "ipc_wait_max": 0.0,
+                "max_waiters": 0,
+                "timeouts": 0
+            }
+            self._stats[name] = stats
+        return stats
+
+    def _open(self):
+        if self._fd is not None or self._path is None:
+            return self._fd
+
+        try:
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o666)
+        except OSError as exc:
+            _logger.warning("cannot open lock file {}: {}, "
+                            "lock within process only".format(
+                                self._path, exc))
+            self._path = None
+            return None
+
+        # child processes must not keep the lock
+        fcntl.fcntl(
+            fd, fcntl.F_SETFD, fcntl.fcntl(fd, fcntl.F_GETFD) |
+            fcntl.FD_CLOEXEC)
+        self._fd = fd
+        return fd
+
+    def _flock(self, name, until):
+        fd = self._open()
+        if fd is None:
+            return
+
+        if until is None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            return
+
+        delay = self.FLOCK_POLL_MIN_SEC
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return
+            except IOError as exc:
+                if exc.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+
+            check_cancel()
+            remain = until - monotonic()
+            if remain <= 0:
+                raise ModemLockTimeout(
+                    "{} waited for {} held by another process".format(
+                        name, self._path))
+            sleep(min(delay, remain))
+            delay = min(delay * 2, self.FLOCK_POLL_MAX_SEC)
@@ -2,21 +2,30 @@
 Helper library.
 """
 
+from contextlib import contextmanager
 from enum import Enum
+from hashlib import sha1
 import logging
 from monotonic import monotonic
-import sh
 from sh import ErrorReturnCode, TimeoutException
 import sys
 import netifaces
-from threading import Thread
+from threading import Condition, Thread
 from time import sleep
 from traceback import format_exc
 
+from cellular_utility.cancel import CancelToken, Cancelled, cancel_scope
 from cellular_utility.cell_mgmt import (
     CellMgmt, CellMgmtError, SimStatus, CellularLocation, Signal
 )
+from cellular_utility.deadline import deadline
 from cellular_utility.event import Log
+from cellular_utility.metrics import registry as metrics
+from cellular_utility.profiler import ConnectProfiler, ConnectTrace
+from cellular_utility.runner import Command
+from cellular_utility.scheduler import CommandScheduler, Priority
+from cellular_utility.timer import timer
+from cellular_utility.value import Value
 
 _logger = logging.getLogger("sanji.cellular")
 
@@ -25,7 +34,10 @@ class StopException(Exception):
     pass
 
 
-class CellularInformation(object):
+class CellularInformation(Value):
+    __slots__ = ["_mode", "_signal_csq", "_signal_rssi_dbm",
+                 "_signal_ecio_dbm", "_operator", "_lac", "_tac", "_nid",
+                 "_cell_id", "_bid"]
 
     def __init__(
             self,
@@ -43,7 +55,8 @@ class CellularInformation(object):
         if (not isinstance(mode, basestring) or
                 not isinstance(signal_csq, int) or
                 not isinstance(signal_rssi_dbm, int) or
-                not isinstance(signal_ecio_dbm, float) or
+                not (isinstance(signal_ecio_dbm, float) or
+                     signal_ecio_dbm is None) or
                 not isinstance(operator, basestring) or
                 not isinstance(lac, basestring) or
                 not isinstance(tac, basestring) or
@@ -107,25 +120,27 @@ class CellularInformation(object):
         return self._bid
 
     @staticmethod
-    def get():
-        cell_mgmt = CellMgmt()
+    def get(cell_mgmt=None):
+        if cell_mgmt is None:
+            cell_mgmt = CellMgmt()
 
         try:
-            signal = cell_mgmt.signal_adv()
+            results = cell_mgmt.batch(
+                ["signal_adv", "operator", "location_info"])
 
         except CellMgmtError:
-            signal = Signal(mode="n/a", rssi_dbm=0, ecio_dbm=0.0, csq=0)
+            results = {}
 
-        try:
-            operator = cell_mgmt.operator()
+        signal = results.get("signal_adv")
+        if signal is None:
+            signal = Signal(mode="n/a", rssi_dbm=0, ecio_dbm=0.0, csq=0)
 
-        except CellMgmtError:
+        operator = results.get("operator")
+        if operator is None:
             operator = "n/a"
 
-        try:
-            cellular_location = cell_mgmt.get_cellular_location()
-
-        except CellMgmtError:
+        cellular_location = results.get("location_info")
+        if cellular_location is None:
             cellular_location = CellularLocation(
                 lac="n/a",
                 cell_id="n/a")
@@ -144,50 +159,57 @@ class CellularInformation(object):
 
 
 class CellularObserver(object):
+    # wake() samples at most this often
+    MIN_PERIOD_SEC = 5
+
     def __init__(
             self,
-            period_sec):
+            period_sec,
+            cell_mgmt=None):
         self._period_sec = period_sec
 
-        self._cell_mgmt = CellMgmt()
+        self._cell_mgmt = CellMgmt() if cell_mgmt is None else cell_mgmt
 
-        self._stop = True
-        self._thread = None
+        self._task = None
+        self._last_check = None
 
         self._cellular_information = None
 
     def cellular_information(self):
         return self._cellular_information
 
-    def start(self):
-        self._stop = False
+    def wake(self):
+        """Sample before the period ends, like on a signal change."""
+        task = self._task
+        if task is not None:
+            task.wake()
 
-        self._thread = Thread(target=self._main_thread)
-        self._thread.daemon = True
-        self._thread.start()
+    def start(self):
+        self._task = timer.call_every(self._period_sec, self._observe)
 
     def stop(self):
-        self._stop = True
-        self._thread.join()
+        self._task.cancel()
+        self._task = None
 
-    def _main_thread(self):
-        next_check = monotonic()
-        while not self._stop:
-
-            now = monotonic()
-            if now < next_check:
-                sleep(1)
-                continue
+    def _observe(self):
+        now = monotonic()
+        if (self._last_check is not None and
+                now - self._last_check < self.MIN_PERIOD_SEC):
+            # woken up too soon after the last sample
+            return self._last_check + self.MIN_PERIOD_SEC - now
 
-            next_check = now + self._period_sec
+        self._last_check = now
 
-            try:
-                cellular_information = CellularInformation.get()
-                if cellular_information is not None:
-                    self._cellular_information = cellular_information
-            except Exception as e:
-                _logger.error("should not reach here")
-                _logger.warning(e)
+        try:
+            # the timer workers are shared, do not hold one for long
+            with deadline(self._period_sec):
+                cellular_information = CellularInformation.get(
+                    self._cell_mgmt)
+            if cellular_information is not None:
+                self._cellular_information = cellular_information
+        except Exception as e:
+            _logger.error("should not reach here")
+            _logger.warning(e)
 
 
 class CellularLogger(object):
@@ -196,55 +218,55 @@ class CellularLogger(object):
             period_sec):
         self._period_sec = period_sec
 
-        self._stop = True
-        self._thread = None
+        self._task = None
 
         self._mgr = None
         self._log = Log()
 
+        # cellular information is logged when it changes
+        self._last_logged = None
+
     def start(
             self,
             manager):
         self._mgr = manager
 
-        self._stop = False
-
-        self._thread = Thread(target=self._main_thread)
-        self._thread.daemon = True
-        self._thread.start()
+        self._task = timer.call_every(self._period_sec, self._log_once)
 
     def stop(self):
-        self._stop = True
-        self._thread.join()
+        self._task.cancel()
+        self._task = None
 
         self._mgr = None
 
-    def _main_thread(self):
-        next_check = monotonic()
-        while not self._stop:
-
-            now = monotonic()
-            if now < next_check:
-                sleep(1)
-                continue
+    def _log_once(self):
+        mgr = self._mgr
+        if mgr is None:
+            return
 
-            next_check = now + self._period_sec
-
-            try:
-                cinfo = self._mgr.cellular_information()
-                if cinfo is not None:
-                    self._log.log_cellular_information(cinfo)
-                else:
-                    next_check = now + 10
-            except Exception as e:
-                _logger.error("should not reach here")
-                _logger.warning(e)
+        try:
+            cinfo = mgr.cellular_information()
+            if cinfo is None:
+                return 10
+            elif cinfo != self._last_logged:
+                self._log.log_cellular_information(cinfo)
+                self._last_logged = cinfo
+        except Exception as e:
+            _logger.error("should not reach here")
+            _logger.warning(e)
 
 
 class Manager(object):
     PING_REQUEST_COUNT = 3
     PING_TIMEOUT_SEC = 20
 
+    # how long _attach() waits for PS attach
+    ATTACH_TIMEOUT_SEC = 180
+    # attach_status polling
+    ATTACH_POLL_SEC = 1
+    # attach_status polling while reported not registered, a safety net
+    ATTACH_URC_POLL_SEC = 10
+
     class Status(Enum):
         initializing = 0
         nosim = 1
@@ -258,7 +280,9 @@ class Manager(object):
         service_attached = 9
         pin_error = 10
 
-    class ModuleInformation(object):
+    class ModuleInformation(Value):
+        __slots__ = ["_imei", "_esn", "_mac"]
+
         def __init__(
                 self,
                 imei=None,
@@ -286,7 +310,9 @@ class Manager(object):
         def mac(self):
             return self._mac
 
-    class StaticInformation(object):
+    class StaticInformation(Value):
+        __slots__ = ["_pin_retry_remain", "_iccid", "_imsi", "_imei"]
+
         def __init__(
                 self,
                 pin_retry_remain=None,
@@ -342,7 +368,10 @@ class Manager(object):
             keepalive_enabled=None,
             keepalive_host=None,
             keepalive_period_sec=None,
-            log_period_sec=None):
+            log_period_sec=None,
+            scheduler=None,
+            urc_listener=None,
+            profiler=None):
 
         if (not isinstance(dev_name, basestring) or
                 not isinstance(enabled, bool) or
@@ -405,9 +434,25 @@ class Manager(object):
         self._module_information = None
         self._static_information = None
 
-        self._cell_mgmt = CellMgmt()
+        # modem commands go through the scheduler shared with Index,
+        # or one of our own
+        self._own_scheduler = scheduler is None
+        if self._own_scheduler:
+            scheduler = CommandScheduler(CellMgmt())
+            scheduler.start()
+        self._scheduler = scheduler
+        self._cell_mgmt = scheduler.proxy(Priority.control)
         self._stop = True
 
+        # _sleep() waits on it for stop(), its timer and, if available,
+        # registration reports of the modem
+        self._cond = Condition()
+        self._urc_listener = urc_listener
+        self._woken = False
+
+        # cancelled by stop(), kills the modem command or ping in flight
+        self._cancel = None
+
         self._thread = None
 
         self._cellular_logger = None
@@ -419,7 +464,20 @@ class Manager(object):
         # instance of NetworkInformation
         self._network_information = None
 
+        # known from earlier _connect() attempts, see _forget_connect_state()
+        # NetworkInformation of the last cell_mgmt stop, None once started
+        self._stopped_information = None
+        # (apn, pdp context) found ready for apn
+        self._known_pdp_context = None
+
         self._update_network_information_callback = None
+        self._published_network_information = None
+
+        # connect traces go to the profiler shared with Index, or our own
+        self._profiler = ConnectProfiler() if profiler is None else profiler
+        self._trace = None
+        # labels of the traces, see _connect_labels()
+        self._labels = {"config": self._config_digest()}
 
         self._log = Log()
 
@@ -499,6 +557,10 @@ class Manager(object):
 
     def start(self):
         self._stop = False
+        self._cancel = CancelToken()
+
+        if self._urc_listener is not None:
+            self._urc_listener.subscribe(self._on_urc)
 
         self._thread = Thread(target=self._main_thread)
         self._thread.daemon = True
@@ -508,44 +570,70 @@ class Manager(object):
         self._cellular_logger.start(self)
 
     def stop(self):
-        self._stop = True
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        self._cancel.cancel()
         self._thread.join()
 
+        if self._urc_listener is not None:
+            self._urc_listener.unsubscribe(self._on_urc)
+
         self._cellular_logger.stop()
 
+        if self._own_scheduler:
+            self._scheduler.stop()
+
+    def _on_urc(self, event):
+        observer = self._observer
+        if observer is not None:
+            observer.wake()
+
+        if event.is_registration():
+            with self._cond:
+                self._woken = True
+                self._cond.notify_all()
+
     def _main_thread(self):
         while True:
             try:
-                self._loop()
+                # the clean up below must not be cancelled
+                with cancel_scope(self._cancel):
+                    self._loop()
 
             except StopException:
+                self._end_trace(ConnectTrace.Result.stopped)
                 if self._observer is not None:
                     self._observer.stop()
                     self._observer = None
 
                 self._log.log_event_cellular_disconnect()
                 self._network_information = self._cell_mgmt.stop()
-                # update nwk_info
-                if self._update_network_information_callback is not None:
-                    self._update_network_information_callback(
-                        self._network_information)
+                self._publish_network_information(self._network_information)
                 break
 
             except Exception:
                 _logger.error("should not reach here")
                 _logger.warning(format_exc())
+                self._end_trace(ConnectTrace.Result.failed, "error")
                 self._power_cycle(force=True)
 
     def _loop(self):
+        if self._enabled:
+            self._begin_trace("initialize")
+
         try:
             if not self._initialize():
+                self._end_trace(ConnectTrace.Result.failed, "nosim")
                 if self._enabled:
                     self._power_cycle()
 
                 return
 
             # start observation
-            self._observer = CellularObserver(period_sec=30)
+            self._observer = CellularObserver(
+                period_sec=30,
+                cell_mgmt=self._scheduler.proxy(Priority.background))
             self._observer.start()
 
             if self._enabled:
@@ -558,10 +646,12 @@ class Manager(object):
             self._observer.stop()
             self._observer = None
 
+            self._end_trace(ConnectTrace.Result.failed)
             self._power_cycle()
 
         except CellMgmtError:
             _logger.warning(format_exc())
+            self._end_trace(ConnectTrace.Result.failed, "cell_mgmt_error")
             self._power_cycle()
 
     def _interrupt_point(self):
@@ -575,8 +665,10 @@ class Manager(object):
         self._static_information = None
         self._cellular_information = None
         self._network_information = None
+        self._forget_connect_state()
 
-        self._initialize_module_information()
+        with self._phase("module_information"):
+            self._initialize_module_information()
 
         retry = 0
         max_retry = 10
@@ -585,18 +677,26 @@ class Manager(object):
 
             self._status = Manager.Status.initializing
 
-            sim_status = self.verify_sim()
+            with self._phase("verify_sim"):
+                sim_status = self.verify_sim()
             if sim_status == SimStatus.nosim:
                 self._sleep(10)
                 retry += 1
                 continue
 
-            self._initialize_static_information()
-            self._cellular_information = CellularInformation.get()
+            with self._phase("static_information"):
+                self._initialize_static_information()
+            with self._phase("cellular_information"):
+                self._cellular_information = CellularInformation.get(
+                    self._cell_mgmt)
 
             if sim_status != SimStatus.ready:
                 raise StopException
 
+            if self._trace is not None:
+                self._labels = self._connect_labels()
+                self._trace.set_labels(self._labels)
+
             self._status = Manager.Status.ready
             return True
 
@@ -677,31 +777,43 @@ class Manager(object):
                     break
 
             self._status = Manager.Status.connected
+            self._end_trace(ConnectTrace.Result.connected)
 
             while True:
                 self._interrupt_point()
+                self._woken = False
 
-                connected = self._cell_mgmt.status()
-                if not connected:
+                # a dead link is told by status at once, pings take long
+                if not self._cell_mgmt.status():
                     self._log.log_event_cellular_disconnect()
+                    self._begin_trace("disconnected")
                     break
 
-                if self._keepalive_enabled:
-                    if not self._checkalive_ping():
-                        self._log.log_event_checkalive_failure()
-                        break
+                if self._keepalive_enabled and not self._checkalive_ping():
+                    self._log.log_event_checkalive_failure()
+                    self._begin_trace("checkalive_failure")
+                    break
 
+                # registration changes cut the wait short
                 self._sleep(
                     self._keepalive_period_sec
                     if self._keepalive_enabled
-                    else 60)
+                    else 60,
+                    wake_on_urc=True)
 
     def _attach(self):
         """Return True on success, False on failure.
+
+        Wait up to ATTACH_TIMEOUT_SEC for PS attach, querying every
+        ATTACH_POLL_SEC. While a URC listener reports the module not
+        registered, it is queried as soon as it reports registration, and
+        every ATTACH_URC_POLL_SEC anyway in case a report is missed.
         """
         _logger.debug("check if module attached with service")
 
-        retry = 0
+        until = monotonic() + self.ATTACH_TIMEOUT_SEC
+        # when attach_status was queried last
+        queried = None
         while True:
             if self._status == Manager.Status.power_cycle:
                 self._sleep(1)
@@ -709,13 +821,27 @@ class Manager(object):
 
             self._status = Manager.Status.service_searching
 
-            if not self._cell_mgmt.attach():
-                retry += 1
-                if retry > 180:
-                    return False
-                self._sleep(1)
-                continue
-            break
+            # reports from now on wake the wait below
+            self._woken = False
+            registered = None if self._urc_listener is None \
+                else self._urc_listener.registered()
+
+            # the reported state may be stale, query it now and then
+            if (registered is not False or queried is None or
+                    monotonic() - queried >= self.ATTACH_URC_POLL_SEC):
+                queried = monotonic()
+                if self._cell_mgmt.attach():
+                    break
+
+            remain = until - monotonic()
+            if remain <= 0:
+                return False
+
+            wait = self.ATTACH_POLL_SEC
+            if registered is False:
+                wait = max(
+                    0, queried + self.ATTACH_URC_POLL_SEC - monotonic())
+            self._sleep(min(remain, wait), wake_on_urc=True)
 
         self._status = Manager.Status.service_attached
         return True
@@ -746,73 +872,215 @@ class Manager(object):
 
     def _connect(self, apn, type, auth, username, password):
         """Return True on success, False on failure.
+
+        The stop and PDP context round trips are skipped if an earlier
+        attempt already made sure of them. The attempt and the time of
+        each phase go to the connect trace, which is begun and ended here
+        if none is in progress.
         """
+        own_trace = self._trace is None
+        if own_trace:
+            self._begin_trace("connect")
+        trace = self._trace
+        attempt = trace.attempt()
+
         self._network_information = None
+        connected = False
 
         try:
             self._log.log_event_connect_begin()
 
-            self._network_information = self._cell_mgmt.stop()
-            # update nwk_info
-            if self._update_network_information_callback is not None:
-                self._update_network_information_callback(
-                    self._network_information)
+            if self._stopped_information is None:
+                with self._phase("stop"):
+                    self._stopped_information = self._cell_mgmt.stop()
+            self._network_information = self._stopped_information
+            self._publish_network_information(self._network_information)
 
             try:
-                pdpc = (item for item in self.pdp_context_list()
-                        if item["id"] == self._pdp_context_id).next()
-
-                if self._pdp_context_static is True and pdpc["apn"] != apn:
-                    self._cell_mgmt.set_pdp_context(
-                        self._pdp_context_id, apn, type)
-                    if self.verify_sim() != SimStatus.ready:
-                        raise StopException
-
-                pdpc = (item for item in self.pdp_context_list()
-                        if item["id"] == self._pdp_context_id).next()
+                with self._phase("pdp_context"):
+                    pdpc = self._pdp_context(apn, type)
             except:
+                trace.fail("no_pdp_context")
                 self._log.log_event_no_pdp_context()
                 return False
             if pdpc["apn"] == "":
+                trace.fail("no_apn")
                 self._log.log_event_no_apn()
                 return False
 
             # try to attach before connect
-            if not self._attach():
+            with self._phase("attach"):
+                attached = self._attach()
+            if not attached:
+                trace.fail("attach_timeout")
                 return False
 
-            nwk_info = self._cell_mgmt.start(
-                apn=pdpc["apn"],
-                auth=auth,
-                username=username,
-                password=password)
+            self._stopped_information = None
+            with self._phase("start"):
+                nwk_info = self._cell_mgmt.start(
+                    apn=pdpc["apn"],
+                    auth=auth,
+                    username=username,
+                    password=password)
 
             self._log.log_event_connect_success(nwk_info)
 
-            connected = self._cell_mgmt.status()
-            if not connected:
+            with self._phase("status"):
+                status = self._cell_mgmt.status()
+            if not status:
+                trace.fail("disconnected")
                 self._log.log_event_cellular_disconnect()
                 return False
 
+            if self._keepalive_enabled:
+                with self._phase("ping"):
+                    alive = self._checkalive_ping()
+                if not alive:
+                    trace.fail("checkalive_failure")
+                    self._log.log_event_checkalive_failure()
+                    return False
+
+            connected = True
+
         except CellMgmtError:
             _logger.warning(format_exc())
 
+            # named after the phase it failed in, like start_error
+            phases = trace.phases(attempt)
+            trace.fail("{}_error".format(phases[-1]["name"]) if phases
+                       else "error")
             self._log.log_event_connect_failure()
             return False
 
-        if self._keepalive_enabled:
-            if not self._checkalive_ping():
-                self._log.log_event_checkalive_failure()
-                return False
+        finally:
+            self._log_phases(trace.phases(attempt), connected)
+            if own_trace:
+                self._end_trace(
+                    ConnectTrace.Result.connected if connected
+                    else ConnectTrace.Result.failed)
 
         self._network_information = nwk_info
-        # update nwk_info
-        if self._update_network_information_callback is not None:
-            self._update_network_information_callback(nwk_info)
+        self._publish_network_information(nwk_info)
 
         return True
 
+    def _pdp_context(self, apn, type):
+        """
+        Return the PDP context to connect with, set to apn first if
+        static. A context found ready for apn before is not queried again.
+        """
+        if self._known_pdp_context is not None and \
+                self._known_pdp_context[0] == apn:
+            return self._known_pdp_context[1]
+
+        pdpc = (item for item in self.pdp_context_list()
+                if item["id"] == self._pdp_context_id).next()
+
+        if self._pdp_context_static is True and pdpc["apn"] != apn:
+            self._cell_mgmt.set_pdp_context(
+                self._pdp_context_id, apn, type)
+            if self.verify_sim() != SimStatus.ready:
+                raise StopException
+
+            pdpc = (item for item in self.pdp_context_list()
+                    if item["id"] == self._pdp_context_id).next()
+
+        if pdpc["apn"] != "":
+            self._known_pdp_context = (apn, pdpc)
+        return pdpc
+
+    def _forget_connect_state(self):
+        """The module may have changed, query everything again."""
+        self._stopped_information = None
+        self._known_pdp_context = None
+
+    def _config_digest(self):
+        """Return a short digest of the settings, passwords left out."""
+        settings = (
+            self._enabled, self._pin is not None,
+            self._pdp_context_static, self._pdp_context_id,
+            self._pdp_context_primary_apn, self._pdp_context_primary_type,
+            self._pdp_context_primary_auth,
+            self._pdp_context_primary_username,
+            self._pdp_context_secondary_apn,
+            self._pdp_context_secondary_type,
+            self._pdp_context_secondary_auth,
+            self._pdp_context_secondary_username,
+            self._pdp_context_retry_timeout, self._keepalive_enabled,
+            self._keepalive_host, self._keepalive_period_sec)
+        return sha1(repr(settings)).hexdigest()[:8]
+
+    def _connect_labels(self):
+        """
+        Return the labels of connect traces: the current firmware and
+        carrier as switched by the firmware API, the network operator if
+        the module cannot switch, and the config digest.
+        The firmware is labelled only if it is cached already, tracing
+        does not query the module.
+        """
+        labels = {"config": self._labels["config"], "firmware": None,
+                  "carrier": None}
+
+        current = (CellMgmt.cached_cellular_fw() or {}).get("current", {})
+        labels["firmware"] = current.get("fwver")
+        labels["carrier"] = current.get("carrier")
+
+        cinfo = self._cellular_information
+        if labels["carrier"] is None and cinfo is not None and \
+                cinfo.operator != "n/a":
+            labels["carrier"] = cinfo.operator
+
+        return labels
+
+    def _begin_trace(self, trigger):
+        """Begin a connect trace, ending the one in progress if any."""
+        self._end_trace(ConnectTrace.Result.stopped)
+        self._trace = self._profiler.begin(trigger, self._labels)
+
+    def _end_trace(self, result, reason=None):
+        """End the connect trace in progress, if any, and log it."""
+        trace = self._trace
+        if trace is None:
+            return
+
+        self._trace = None
+        if reason is not None:
+            trace.fail(reason)
+        trace.finish(result)
+        self._log.log_event_connect_trace(trace)
+
+    @contextmanager
+    def _phase(self, name):
+        """Time the block as phase name of the connect trace, if any."""
+        trace = self._trace
+        if trace is None:
+            yield
+            return
+
+        with trace.phase(name):
+            yield
+
+    def _log_phases(self, phases, connected):
+        _logger.info("connect {}: {}".format(
+            "succeeded" if connected else "failed",
+            ", ".join(["{} {:.3f}s".format(phase["name"], phase["sec"])
+                       for phase in phases]) or "no phase"))
+
+    def _publish_network_information(self, nwk_info):
+        """Update nwk_info, unless it is the same as the last one."""
+        if nwk_info == self._published_network_information:
+            return
+
+        self._published_network_information = nwk_info
+        if self._update_network_information_callback is not None:
+            self._update_network_information_callback(nwk_info)
+
     def _power_cycle(self, force=False):
+        if self._stop:
+            # failed because of stop(), nothing wrong with the module
+            return
+
+        self._forget_connect_state()
         try:
             self._log.log_event_power_cycle()
             self._status = Manager.Status.power_cycle
@@ -821,27 +1089,45 @@ class Manager(object):
         except CellMgmtError:
             _logger.warning(format_exc())
 
-    def _sleep(self, sec, critical_section=False):
+    def _sleep(self, sec, critical_section=False, wake_on_urc=False):
+        """
+        Sleep sec seconds, or until stop() unless in critical_section.
+        With wake_on_urc, return early when the modem reports a
+        registration change, since self._woken was cleared.
+        """
         until = monotonic() + sec
-
-        while monotonic() < until:
-            if not critical_section:
-                self._interrupt_point()
-            sleep(1)
+        task = timer.notify_later(sec, self._cond)
+        try:
+            with self._cond:
+                while True:
+                    if not critical_section:
+                        self._interrupt_point()
+                    if wake_on_urc and self._woken:
+                        return
+                    if until - monotonic() <= 0:
+                        return
+                    # untimed, a timed wait polls; the timer thread
+                    # notifies on time
+                    self._cond.wait()
+        finally:
+            task.cancel()
 
     def _checkalive_ping(self):
         """Return True on ping success, False on failure."""
         for _ in xrange(0, self.PING_REQUEST_COUNT):
             try:
-                sh.ping(
-                    "-c", "1",
-                    "-I", self._dev_name,
-                    "-W", str(self.PING_TIMEOUT_SEC),
-                    self._keepalive_host,
-                    _timeout=self.PING_TIMEOUT_SEC + 5
-                )
+                with metrics.timer("ping", self._keepalive_host):
+                    Command("ping")(
+                        "-c", "1",
+                        "-I", self._dev_name,
+                        "-W", str(self.PING_TIMEOUT_SEC),
+                        self._keepalive_host,
+                        _timeout=self.PING_TIMEOUT_SEC + 5
+                    )
 
                 return True
+            except Cancelled:
+                raise StopException
             except (ErrorReturnCode, TimeoutException):
                 _logger.warning(format_exc())
 
@@ -0,0 +1,209 @@
+"""
+Per-operation latency histograms and error counters, plus plain counters
+and gauges, exported in the Prometheus text exposition format.
+
+    with registry.timer("cell_mgmt", "signal_adv"):
+        ...
+    registry.count("scheduler_coalesced", "signal_adv")
+    registry.gauge("scheduler_depth", None, 3)
+
+Recording is a bisect and a few additions under a lock, cheap enough to
+stay on.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from monotonic import monotonic
+from threading import Lock
+
+
+class _Operation(object):
+    __slots__ = ["buckets", "sum", "count", "errors"]
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+
+
+class MetricsRegistry(object):
+    """
+    Latency histograms of operations, grouped in families like
+    "cell_mgmt" (operation: subcommand) or "ping".
+    """
+
+    PREFIX = "sanji_cellular_"
+
+    # upper bounds in seconds, +Inf is implied
+    DEFAULT_BUCKETS = (
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+        60.0)
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self._bounds = tuple(sorted(buckets))
+        self._lock = Lock()
+        self._families = {}
+        self._counters = {}
+        self._gauges = {}
+        self._help = {}
+
+    def describe(self, family, text):
+        """Set the HELP text of family."""
+        self._help[family] = text
+
+    def observe(self, family, operation, seconds, error=False):
+        """Record one call of operation which took seconds."""
+        index = bisect_left(self._bounds, seconds)
+        with self._lock:
+            operations = self._families.get(family)
+            if operations is None:
+                operations = self._families[family] = {}
+            stats = operations.get(operation)
+            if stats is None:
+                stats = operations[operation] = _Operation(
+                    len(self._bounds) + 1)
+
+            stats.buckets[index] += 1
+            stats.sum += seconds
+            stats.count += 1
+            if error:
+                stats.errors += 1
+
+    def count(self, family, operation, n=1):
+        """Add n to the counter of operation, None for no op label."""
+        with self._lock:
+            counters = self._counters.setdefault(family, {})
+            counters[operation] = counters.get(operation, 0) + n
+
+    def gauge(self, family, operation, value):
+        """Set the gauge of operation to value, None for no op label."""
+        with self._lock:
+            self._gauges.setdefault(family, {})[operation] = value
+
+    @contextmanager
+    def timer(self, family, operation, errors=(Exception,)):
+        """
+        Record the time taken by the block, an exception in errors counts
+        as an error.
+        """
+        begin = monotonic()
+        try:
+            yield
+        except errors:
+            self.observe(family, operation, monotonic() - begin, error=True)
+            raise
+        self.observe(family, operation, monotonic() - begin)
+
+    def clear(self):
+        with self._lock:
+            self._families = {}
+            self._counters = {}
+            self._gauges = {}
+
+    def counters(self):
+        """Return dict like {"scheduler_coalesced": {"signal": 2}}."""
+        with self._lock:
+            return dict([
+                (family, dict(values))
+                for family, values in self._counters.items()])
+
+    def gauges(self):
+        """Return dict like {"scheduler_depth": {None: 3}}."""
+        with self._lock:
+            return dict([
+                (family, dict(values))
+                for family, values in self._gauges.items()])
+
+    def snapshot(self):
+        """
+        Return dict like:
+            {
+                "cell_mgmt": {
+                    "signal_adv": {
+                        "buckets": [[0.005, 0], [0.01, 2], ..., ["+Inf", 3]],
+                        "sum": 0.03,
+                        "count": 3,
+                        "errors": 0
+                    }
+                }
+            }
+        Bucket counts are cumulative.
+        """
+        bounds = list(self._bounds) + ["+Inf"]
+        result = {}
+        with self._lock:
+            for family, operations in self._families.items():
+                result[family] = {}
+                for operation, stats in operations.items():
+                    cumulative = []
+                    total = 0
+                    for bound, count in zip(bounds, stats.buckets):
+                        total += count
+                        cumulative.append([bound, total])
+                    result[family][operation] = {
+                        "buckets": cumulative,
+                        "sum": stats.sum,
+                        "count": stats.count,
+                        "errors": stats.errors
+                    }
+        return result
+
+    def exposition(self):
+        """Return all metrics in the Prometheus text format."""
+        lines = []
+        for family, operations in sorted(self.snapshot().items()):
+            name = self.PREFIX + family + "_seconds"
+            lines.append("# HELP {} {}".format(
+                name, self._help.get(family, family + " latency")))
+            lines.append("# TYPE {} histogram".format(name))
+            for operation, stats in sorted(operations.items()):
+                label = "op=\"{}\"".format(_escape(operation))
+                for bound, count in stats["buckets"]:
+                    lines.append("{}_bucket{{{},le=\"{}\"}} {}".format(
+                        name, label, bound, count))
+                lines.append("{}_sum{{{}}} {:.6f}".format(
+                    name, label, stats["sum"]))
+                lines.append("{}_count{{{}}} {}".format(
+                    name, label, stats["count"]))
+
+            name = self.PREFIX + family + "_errors_total"
+            lines.append("# TYPE {} counter".format(name))
+            for operation, stats in sorted(operations.items()):
+                lines.append("{}{{op=\"{}\"}} {}".format(
+                    name, _escape(operation), stats["errors"]))
+
+        for type_, suffix, families in [
+                ("counter", "_total", self.counters()),
+                ("gauge", "", self.gauges())]:
+            for family, values in sorted(families.items()):
+                name = self.PREFIX + family + suffix
+                lines.append("# HELP {} {}".format(
+                    name, self._help.get(family, family)))
+                lines.append("# TYPE {} {}".format(name, type_))
+                for operation, value in sorted(values.items()):
+                    lines.append("{}{} {}".format(
+                        name, "" if operation is None
+                        else "{{op=\"{}\"}}".format(_escape(operation)),
+                        value))
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace(
+        "\n", "\\n")
+
+
+# shared by CellMgmt, CommandScheduler, VnStat and Manager
+registry = MetricsRegistry()
+registry.describe("cell_mgmt", "cell_mgmt subcommand latency")
+registry.describe("lock_wait", "modem lock wait per CellMgmt command")
+registry.describe("scheduler_wait",
+                  "modem command queueing time per priority")
+registry.describe("connect", "Manager connect attempt phase latency")
+registry.describe("ping", "keepalive ping latency")
+registry.describe("vnstat", "vnstat invocation latency")
+registry.describe("scheduler_coalesced",
+                  "modem round trips saved by coalescing read commands")
+registry.describe("scheduler_depth", "modem commands queued")
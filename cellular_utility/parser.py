@@ -0,0 +1,50 @@
+"""
+Single-pass parser of `Key: value` and `Key=value` text outputs.
+"""
+
+import re
+
+
+class KeyValueParser(object):
+    """
+    Turn lines like
+        IP=10.24.42.11
+        CellID: 01073AEE
+    into {"IP": "10.24.42.11", "CellID": "01073AEE"} with one scan of the
+    text. A key ends at the first separator, keys and values are stripped
+    of blanks, lines without a separator are skipped.
+    """
+
+    def __init__(self, separators=":="):
+        separators = re.escape(separators)
+        self._regex = re.compile(
+            r"^([^\r\n{0}]*)[{0}]([^\r\n]*)".format(separators),
+            re.MULTILINE)
+
+    def parse(self, text, keys=None):
+        """
+        Return dict of key to value, the first occurrence wins.
+        If keys is given, only those are returned and the scan stops once
+        all of them are found.
+        """
+        result = {}
+        if keys is None:
+            for key, value in self._regex.findall(text):
+                key = key.strip()
+                if key not in result:
+                    result[key] = value.strip()
+            return result
+
+        for match in self._regex.finditer(text):
+            key = match.group(1).strip()
+            if key in keys and key not in result:
+                result[key] = match.group(2).strip()
+                if len(result) == len(keys):
+                    break
+        return result
+
+    def parse_all(self, text):
+        """Return a list of (key, value) in order, keys may repeat."""
+        return [
+            (key.strip(), value.strip())
+            for key, value in self._regex.findall(text)]
@@ -0,0 +1,139 @@
+"""
+Bounded pool of worker threads running functions in the background.
+
+    pool = WorkerPool(2)
+    future = pool.submit(vnstat.get_usage)
+    future.result(5)
+"""
+
+from collections import deque
+from monotonic import monotonic
+from threading import Condition, Lock, Thread
+
+from cellular_utility.cancel import (
+    cancel_scope, current as current_token
+)
+from cellular_utility.deadline import (
+    current as current_deadline, deadline_at
+)
+from cellular_utility.future import Future
+
+
+class WorkerPoolStopped(Exception):
+    """WorkerPoolStopped"""
+    pass
+
+
+class WorkerPool(object):
+    """
+    Run submitted functions on at most max_workers threads, started on
+    demand, further submissions queue up.
+    """
+
+    def __init__(self, max_workers, name="sanji.cellular.pool"):
+        if max_workers < 1:
+            raise ValueError
+
+        self._max_workers = max_workers
+        self._name = name
+
+        self._cond = Condition(Lock())
+        self._queue = deque()
+        self._workers = []
+        self._idle = 0
+        self._stop = False
+
+        self._max_depth = 0
+        self._count = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) on a worker, return its Future.
+        The deadline and cancel token of the caller, if any, apply to
+        func.
+        """
+        future = Future(getattr(func, "__name__", repr(func)))
+
+        with self._cond:
+            if self._stop:
+                raise WorkerPoolStopped(future.name)
+
+            self._queue.append((
+                future, func, args, kwargs, current_deadline(),
+                current_token(), monotonic()))
+            self._max_depth = max(self._max_depth, len(self._queue))
+
+            if (self._idle < len(self._queue) and
+                    len(self._workers) < self._max_workers):
+                worker = Thread(
+                    name="{}.{}".format(self._name, len(self._workers)),
+                    target=self._main_thread)
+                worker.daemon = True
+                self._workers.append(worker)
+                worker.start()
+
+            self._cond.notify()
+
+        return future
+
+    def stop(self):
+        """Finish queued functions and stop the workers."""
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+            workers, self._workers = self._workers, []
+
+        for worker in workers:
+            worker.join()
+
+    def stats(self):
+        """
+        Return dict like:
+            {
+                "workers": 2,
+                "max_workers": 4,
+                "depth": 0,
+                "max_depth": 3,
+                "count": 12,
+                "wait_total": 0.2,
+                "wait_max": 0.1
+            }
+        Wait is the time from submit() until a worker picks it up.
+        """
+        with self._cond:
+            return {
+                "workers": len(self._workers),
+                "max_workers": self._max_workers,
+                "depth": len(self._queue),
+                "max_depth": self._max_depth,
+                "count": self._count,
+                "wait_total": self._wait_total,
+                "wait_max": self._wait_max
+            }
+
+    def _main_thread(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                self._idle -= 1
+
+                if not self._queue:
+                    return
+
+                future, func, args, kwargs, until, token, queued_at = \
+                    self._queue.popleft()
+
+                wait = monotonic() - queued_at
+                self._count += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+            if not future._start():
+                continue
+
+            with deadline_at(until), cancel_scope(token):
+                future._call(func, args, kwargs)
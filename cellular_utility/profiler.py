@@ -0,0 +1,268 @@
+"""
+Phase traces of Manager connections, kept in memory for time-to-connect
+statistics.
+
+    trace = profiler.begin("drop", {"firmware": "05.05.58.01",
+                                    "carrier": "VZW", "config": "3f2a9c1b"})
+    trace.attempt()
+    with trace.phase("attach"):
+        ...
+    trace.fail("attach_timeout")
+    trace.finish(ConnectTrace.Result.connected)
+
+    profiler.stats(group_by="carrier")
+
+A trace runs from the moment the Manager starts to (re)connect, at start
+up or after a drop, until it is connected, gives up or is stopped. Each
+_connect() try within it is an attempt.
+"""
+
+from collections import deque
+from contextlib import contextmanager
+from enum import Enum
+from itertools import count
+from monotonic import monotonic
+from threading import Lock
+from time import time
+
+from cellular_utility.metrics import registry as metrics
+
+
+class ConnectTrace(object):
+
+    class Result(Enum):
+        connected = 0
+        failed = 1
+        stopped = 2
+
+    def __init__(self, id_, trigger, labels):
+        self._id = id_
+        self._trigger = trigger
+        self._labels = dict(labels)
+
+        self._lock = Lock()
+        self._time = time()
+        self._begin = monotonic()
+        self._attempts = 0
+        self._phases = []
+        self._failures = {}
+        self._reason = None
+        self._result = None
+        self._elapsed = None
+
+    @property
+    def id(self):
+        return self._id
+
+    @property
+    def labels(self):
+        with self._lock:
+            return dict(self._labels)
+
+    def set_labels(self, labels):
+        """Add or change labels, once they are known."""
+        with self._lock:
+            self._labels.update(labels)
+
+    @property
+    def attempts(self):
+        return self._attempts
+
+    @property
+    def result(self):
+        return self._result
+
+    @property
+    def reason(self):
+        """Reason of the last failure, or None."""
+        return self._reason
+
+    def done(self):
+        return self._result is not None
+
+    def time_to_connect(self):
+        """Return seconds until connected, None if not connected."""
+        if self._result != ConnectTrace.Result.connected:
+            return None
+        return self._elapsed
+
+    def attempt(self):
+        """Start the next connect attempt, return its number."""
+        with self._lock:
+            self._attempts += 1
+            return self._attempts
+
+    @contextmanager
+    def phase(self, name):
+        """Time the block as phase name of the current attempt."""
+        begin = monotonic()
+        error = None
+        try:
+            yield
+        except BaseException as exc:
+            error = type(exc).__name__
+            raise
+        finally:
+            sec = monotonic() - begin
+            metrics.observe("connect", name, sec, error=error is not None)
+            with self._lock:
+                self._phases.append({
+                    "name": name,
+                    "attempt": self._attempts,
+                    "at": begin - self._begin,
+                    "sec": sec,
+                    "error": error
+                })
+
+    def phases(self, attempt=None):
+        """Return the phases, of attempt only if given."""
+        with self._lock:
+            return [dict(phase) for phase in self._phases
+                    if attempt is None or phase["attempt"] == attempt]
+
+    def fail(self, reason):
+        """Count a failure of the current attempt."""
+        with self._lock:
+            self._reason = reason
+            self._failures[reason] = self._failures.get(reason, 0) + 1
+
+    def finish(self, result):
+        """End the trace with a ConnectTrace.Result."""
+        with self._lock:
+            if self._result is not None:
+                return
+            self._result = result
+            self._elapsed = monotonic() - self._begin
+
+    def to_dict(self):
+        """
+        Return dict like:
+            {
+                "id": 3,
+                "trigger": "drop",
+                "labels": {"firmware": "05.05.58.01", "carrier": "VZW",
+                           "config": "3f2a9c1b"},
+                "time": 1467012345.1,
+                "result": "connected",
+                "elapsed": 14.2,
+                "attempts": 2,
+                "reason": "attach_timeout",
+                "failures": {"attach_timeout": 1},
+                "phases": [
+                    {"name": "stop", "attempt": 1, "at": 0.01,
+                     "sec": 0.52, "error": None},
+                    ...
+                ]
+            }
+        Result and elapsed are None while in progress, at is the start of
+        a phase in seconds since the trace began.
+        """
+        with self._lock:
+            elapsed = self._elapsed
+            if elapsed is None:
+                elapsed = monotonic() - self._begin
+            return {
+                "id": self._id,
+                "trigger": self._trigger,
+                "labels": dict(self._labels),
+                "time": self._time,
+                "result": None if self._result is None
+                else self._result.name,
+                "elapsed": elapsed,
+                "attempts": self._attempts,
+                "reason": self._reason,
+                "failures": dict(self._failures),
+                "phases": [dict(phase) for phase in self._phases]
+            }
+
+
+class ConnectProfiler(object):
+    """
+    Keep the last KEEP connection traces, shared by the Manager instances
+    of the bundle so configurations can be compared.
+    """
+
+    KEEP = 100
+
+    # time-to-connect percentiles in stats()
+    PERCENTILES = (50, 90, 99)
+
+    def __init__(self, keep=KEEP):
+        self._lock = Lock()
+        self._ids = count(1)
+        self._traces = deque(maxlen=keep)
+
+    def begin(self, trigger, labels=None):
+        """Start and return a ConnectTrace."""
+        with self._lock:
+            trace = ConnectTrace(next(self._ids), trigger, labels or {})
+            self._traces.append(trace)
+        return trace
+
+    def get(self, id_):
+        """Return the ConnectTrace of id_, or None."""
+        with self._lock:
+            for trace in self._traces:
+                if trace.id == id_:
+                    return trace
+        return None
+
+    def traces(self):
+        """Return the kept traces, oldest first."""
+        with self._lock:
+            return list(self._traces)
+
+    def stats(self, group_by=None):
+        """
+        Return dict of the finished traces like:
+            {
+                "traces": 12,
+                "connected": 10,
+                "attempts": 15,
+                "failures": {"attach_timeout": 4, "start_error": 1},
+                "timeToConnect": {"p50": 8.1, "p90": 21.5, "p99": 40.2,
+                                  "max": 40.2}
+            }
+        or, with group_by a label name, a dict of label value to such
+        dicts, traces without the label under None.
+        """
+        traces = [trace for trace in self.traces() if trace.done()]
+        if group_by is None:
+            return _stats(traces, self.PERCENTILES)
+
+        groups = {}
+        for trace in traces:
+            groups.setdefault(trace.labels.get(group_by), []).append(trace)
+        return dict([
+            (value, _stats(group, self.PERCENTILES))
+            for value, group in groups.items()])
+
+
+def _stats(traces, percentiles):
+    failures = {}
+    for trace in traces:
+        for reason, times in trace.to_dict()["failures"].items():
+            failures[reason] = failures.get(reason, 0) + times
+
+    times = sorted([trace.time_to_connect() for trace in traces
+                    if trace.time_to_connect() is not None])
+    time_to_connect = dict([
+        ("p{}".format(percentile), _percentile(times, percentile))
+        for percentile in percentiles])
+    time_to_connect["max"] = times[-1] if times else None
+
+    return {
+        "traces": len(traces),
+        "connected": len(times),
+        "attempts": sum([trace.attempts for trace in traces]),
+        "failures": failures,
+        "timeToConnect": time_to_connect
+    }
+
+
+def _percentile(values, percentile):
+    """Nearest-rank percentile of sorted values, None if empty."""
+    if not values:
+        return None
+    rank = max(1, int(-(-percentile * len(values) // 100)))
+    return values[rank - 1]
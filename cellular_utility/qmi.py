@@ -0,0 +1,627 @@
+"""
+QMI (QMUX) client over the modem QMI character device,
+an alternative backend for CellMgmt.
+"""
+
+import errno
+import logging
+from monotonic import monotonic
+import os
+import select
+from sh import ErrorReturnCode
+import struct
+from threading import Event, Lock, Thread
+
+from cellular_utility.at_session import error_return_code
+from cellular_utility.deadline import (
+    check as check_deadline, remaining as deadline_remaining
+)
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class QmiError(Exception):
+    """QmiError"""
+    pass
+
+
+class QmiResultError(QmiError):
+    """The service answered with a failure result."""
+    def __init__(self, message_id, error):
+        super(QmiResultError, self).__init__(
+            "message 0x{:04x} error 0x{:04x}".format(message_id, error))
+        self.message_id = message_id
+        self.error = error
+
+
+def encode_tlvs(tlvs):
+    """tlvs is a dict like {0x01: "\\x03"}, return the packed bytes."""
+    return "".join([
+        struct.pack("<BH", type_, len(value)) + value
+        for type_, value in sorted(tlvs.items())])
+
+
+def decode_tlvs(data):
+    """Return a dict like {0x01: "\\x03"} of the packed bytes."""
+    tlvs = {}
+    offset = 0
+    while offset + 3 <= len(data):
+        type_, length = struct.unpack_from("<BH", data, offset)
+        tlvs[type_] = data[offset + 3:offset + 3 + length]
+        offset += 3 + length
+    return tlvs
+
+
+class QmiRequest(object):
+    """An in-flight request, wait() returns the response TLVs."""
+
+    def __init__(self, service, message_id):
+        self.service = service
+        self.message_id = message_id
+
+        self._event = Event()
+        self._tlvs = None
+        self._error = None
+
+    def done(self, tlvs=None, error=None):
+        self._tlvs = tlvs
+        self._error = error
+        self._event.set()
+
+    def wait(self, timeout=None):
+        """
+        Return response TLVs, raise QmiResultError on failure result,
+        QmiError on timeout or when the device is closed.
+        """
+        if not self._event.wait(timeout):
+            raise QmiError(
+                "message 0x{:04x} timeout".format(self.message_id))
+
+        if self._error is not None:
+            raise self._error
+
+        result = self._tlvs.get(0x02)
+        if result is not None and len(result) >= 4:
+            code, error = struct.unpack_from("<HH", result)
+            if code != 0:
+                raise QmiResultError(self.message_id, error)
+
+        return self._tlvs
+
+
+class QmiClient(object):
+    """
+    QMUX client. Requests are multiplexed by transaction ID, so several
+    of them can be in flight at once.
+    """
+
+    CTL = 0x00
+    WDS = 0x01
+    DMS = 0x02
+    NAS = 0x03
+
+    CTL_GET_CLIENT_ID = 0x0022
+    CTL_RELEASE_CLIENT_ID = 0x0023
+
+    # indication bit of the SDU flags, CTL has its own flag layout
+    CTL_INDICATION = 0x02
+    SERVICE_INDICATION = 0x04
+
+    DEFAULT_TIMEOUT_SEC = 5
+    # client IDs are released on close, best-effort
+    RELEASE_TIMEOUT_SEC = 0.5
+
+    _qmux_header = struct.Struct("<BHBBB")
+    _ctl_header = struct.Struct("<BBHH")
+    _service_header = struct.Struct("<BHHH")
+
+    def __init__(self, device):
+        """device is the path of the QMI device, or an opened fd."""
+        self._device = device
+        self._fd = None
+
+        self._lock = Lock()
+        self._write_lock = Lock()
+        self._clients = {}
+        self._transaction = {}
+        self._pending = {}
+
+        self._thread = None
+        self._stop = False
+        # written by close() to wake the reader out of select()
+        self._wakeup = None
+
+    @property
+    def device(self):
+        return self._device
+
+    def is_open(self):
+        return self._fd is not None
+
+    def open(self):
+        with self._lock:
+            if self._fd is not None:
+                return
+
+            if isinstance(self._device, int):
+                self._fd = self._device
+            else:
+                try:
+                    self._fd = os.open(self._device, os.O_RDWR)
+                except OSError as exc:
+                    raise QmiError(
+                        "cannot open {}: {}".format(self._device, exc))
+
+            self._stop = False
+            self._wakeup = os.pipe()
+            self._thread = Thread(
+                target=self._main_thread, args=(self._fd, self._wakeup[0]),
+                name="sanji.cellular.qmi")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def close(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            clients, self._clients = self._clients, {}
+
+        # the modem has a small pool of client IDs per service, give them
+        # back or every reopen leaks them until the module power cycles
+        self._release(clients)
+
+        with self._lock:
+            if self._fd is None:
+                return
+
+            fd = self._fd
+            self._fd = None
+            self._stop = True
+            self._clients = {}
+            self._fail_all(QmiError("device closed"))
+            wakeup, self._wakeup = self._wakeup, None
+
+        os.write(wakeup[1], "x")
+        self._thread.join()
+        os.close(wakeup[0])
+        os.close(wakeup[1])
+        if not isinstance(self._device, int):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _release(self, clients):
+        """Send CTL Release Client ID for clients, a dict of service to
+        client ID, and wait shortly for the answers."""
+        if not clients or not self._thread.is_alive():
+            return
+
+        requests = []
+        try:
+            for service, client_id in sorted(clients.items()):
+                requests.append(self.send(
+                    self.CTL, self.CTL_RELEASE_CLIENT_ID,
+                    {0x01: struct.pack("<BB", service, client_id)}))
+        except QmiError as exc:
+            _logger.warning("qmi: release client ID: {}".format(exc))
+            return
+
+        timeout = self.RELEASE_TIMEOUT_SEC
+        begin = monotonic()
+        for request in requests:
+            try:
+                request.wait(max(0, timeout - (monotonic() - begin)))
+            except QmiError as exc:
+                _logger.warning("qmi: release client ID: {}".format(exc))
+
+    def client_id(self, service):
+        """Return the client ID of service, allocate one if needed."""
+        with self._lock:
+            client_id = self._clients.get(service)
+        if client_id is not None:
+            return client_id
+
+        tlvs = self.send(
+            self.CTL, self.CTL_GET_CLIENT_ID,
+            {0x01: struct.pack("<B", service)}).wait(
+                self.DEFAULT_TIMEOUT_SEC)
+        _, client_id = struct.unpack_from("<BB", tlvs[0x01])
+
+        with self._lock:
+            self._clients[service] = client_id
+        return client_id
+
+    def send(self, service, message_id, tlvs=None):
+        """Send a request without waiting, return a QmiRequest."""
+        self.open()
+        client_id = 0 if service == self.CTL else self.client_id(service)
+        payload = encode_tlvs(tlvs or {})
+
+        request = QmiRequest(service, message_id)
+        with self._lock:
+            key = (service, client_id)
+            transaction = self._transaction.get(key, 0) % (
+                0xff if service == self.CTL else 0xffff) + 1
+            self._transaction[key] = transaction
+            self._pending[(service, client_id, transaction)] = request
+
+        if service == self.CTL:
+            sdu = self._ctl_header.pack(
+                0x00, transaction, message_id, len(payload))
+        else:
+            sdu = self._service_header.pack(
+                0x00, transaction, message_id, len(payload))
+        sdu += payload
+
+        frame = self._qmux_header.pack(
+            0x01, self._qmux_header.size - 1 + len(sdu), 0x00, service,
+            client_id) + sdu
+        try:
+            with self._write_lock:
+                os.write(self._fd, frame)
+        except (OSError, TypeError) as exc:
+            with self._lock:
+                self._pending.pop((service, client_id, transaction), None)
+            self.close()
+            raise QmiError("write: {}".format(exc))
+
+        return request
+
+    def request(self, service, message_id, tlvs=None, timeout=None):
+        """Send a request and return the response TLVs."""
+        return self.send(service, message_id, tlvs).wait(
+            self.wait_timeout(timeout))
+
+    def wait_timeout(self, timeout=None):
+        """Return the wait timeout honoring the caller deadline."""
+        check_deadline()
+        return deadline_remaining(
+            self.DEFAULT_TIMEOUT_SEC if timeout is None else timeout)
+
+    def _fail_all(self, error):
+        pending = self._pending
+        self._pending = {}
+        for request in pending.values():
+            request.done(error=error)
+
+    def _main_thread(self, fd, wakeup):
+        buf = ""
+        while not self._stop:
+            try:
+                # no timeout, close() wakes it up
+                readable, _, _ = select.select([fd, wakeup], [], [])
+                if fd not in readable:
+                    continue
+                data = os.read(fd, 4096)
+            except (OSError, select.error) as exc:
+                if exc.args[0] == errno.EINTR:
+                    continue
+                data = ""
+
+            if data == "":
+                _logger.warning("qmi device hang up")
+                with self._lock:
+                    self._fail_all(QmiError("device hang up"))
+                return
+
+            buf += data
+            while len(buf) >= 3:
+                length = struct.unpack_from("<H", buf, 1)[0]
+                if len(buf) < length + 1:
+                    break
+                frame, buf = buf[:length + 1], buf[length + 1:]
+                try:
+                    self._dispatch(frame)
+                except struct.error as exc:
+                    _logger.warning(
+                        "qmi: drop malformed frame: {}".format(exc))
+
+    def _dispatch(self, frame):
+        _, _, _, service, client_id = self._qmux_header.unpack_from(frame)
+        sdu = frame[self._qmux_header.size:]
+        if service == self.CTL:
+            flags, transaction, message_id, length = \
+                self._ctl_header.unpack_from(sdu)
+            payload = sdu[self._ctl_header.size:]
+        else:
+            flags, transaction, message_id, length = \
+                self._service_header.unpack_from(sdu)
+            payload = sdu[self._service_header.size:]
+
+        # indications are not requested by anyone
+        if flags & (self.CTL_INDICATION if service == self.CTL
+                    else self.SERVICE_INDICATION):
+            return
+
+        with self._lock:
+            request = self._pending.pop(
+                (service, client_id, transaction), None)
+        if request is None:
+            _logger.debug("qmi: unexpected message 0x{:04x}".format(
+                message_id))
+            return
+
+        request.done(tlvs=decode_tlvs(payload[:length]))
+
+
+class QmiBackend(object):
+    """
+    Serve `cell_mgmt` subcommands with QMI requests on the QMI_port of
+    m_info, the output is formatted the same way as `cell_mgmt` does.
+
+    Other subcommands are forwarded to the `cell_mgmt` binary.
+    """
+
+    NAS_GET_SIGNAL_STRENGTH = 0x0020
+    NAS_GET_SERVING_SYSTEM = 0x0024
+    DMS_GET_DEVICE_SERIAL_NUMBERS = 0x0025
+    DMS_UIM_GET_PIN_STATUS = 0x002B
+    DMS_UIM_GET_ICCID = 0x003C
+    DMS_UIM_GET_IMSI = 0x0043
+    WDS_GET_PROFILE_LIST = 0x002A
+    WDS_GET_PROFILE_SETTINGS = 0x002B
+
+    # NAS radio interface to cell_mgmt mode
+    _radio_mode = {
+        0x01: "cdma", 0x02: "hdr", 0x04: "gsm", 0x05: "umts", 0x08: "lte"
+    }
+
+    # WDS PDP type to cell_mgmt get_profiles type
+    _pdp_type = {0: "IP", 1: "PPP", 2: "IPV6", 3: "IPV4V6"}
+
+    def __init__(self, device):
+        self._client = QmiClient(device)
+
+        # subcommand: (requests, formatter)
+        self._plans = {
+            "signal": (
+                [(QmiClient.NAS, self.NAS_GET_SIGNAL_STRENGTH)],
+                self._signal),
+            "signal_adv": (
+                [(QmiClient.NAS, self.NAS_GET_SIGNAL_STRENGTH)],
+                self._signal_adv),
+            "operator": (
+                [(QmiClient.NAS, self.NAS_GET_SERVING_SYSTEM)],
+                self._operator),
+            "attach_status": (
+                [(QmiClient.NAS, self.NAS_GET_SERVING_SYSTEM)],
+                self._attach_status),
+            "location_info": (
+                [(QmiClient.NAS, self.NAS_GET_SERVING_SYSTEM)],
+                self._location_info),
+            "sim_status": (
+                [(QmiClient.DMS, self.DMS_UIM_GET_PIN_STATUS)],
+                self._sim_status),
+            "pin_retries": (
+                [(QmiClient.DMS, self.DMS_UIM_GET_PIN_STATUS)],
+                self._pin_retries),
+            "iccid": (
+                [(QmiClient.DMS, self.DMS_UIM_GET_ICCID)],
+                self._iccid),
+            "imsi": (
+                [(QmiClient.DMS, self.DMS_UIM_GET_IMSI)],
+                self._imsi),
+            "module_ids": (
+                [(QmiClient.DMS, self.DMS_GET_DEVICE_SERIAL_NUMBERS)],
+                self._module_ids),
+            "get_profiles": (
+                [(QmiClient.WDS, self.WDS_GET_PROFILE_LIST,
+                  {0x10: "\x00"})],
+                self._get_profiles),
+        }
+
+    @property
+    def client(self):
+        return self._client
+
+    def close(self):
+        self._client.close()
+
+    def execute(self, fallback, *args, **kwargs):
+        """
+        Run `cell_mgmt <args>` with QMI requests if possible,
+        otherwise call `fallback(*args, **kwargs)`.
+        """
+        if args and args[0] in self._plans:
+            result = self._query_many([args])[0]
+            if result is not None:
+                returncode, output = result
+                if returncode != 0:
+                    raise error_return_code(returncode, args, output)
+                return output
+
+        if args and args[0].startswith("power_"):
+            # module goes away, the device has to be reopened afterwards
+            self.close()
+        return fallback(*args, **kwargs)
+
+    def execute_many(self, fallback, commands):
+        """
+        Run several `cell_mgmt` argument lists with all of their QMI
+        requests in flight at once, return a list of (returncode, output)
+        in the same order.
+        """
+        results = self._query_many(commands)
+        for index, args in enumerate(commands):
+            if results[index] is not None:
+                continue
+            try:
+                results[index] = (0, str(fallback(*args)))
+            except ErrorReturnCode as exc:
+                results[index] = (exc.exit_code, exc.stdout)
+        return results
+
+    def _query_many(self, commands):
+        """
+        Return a list of (returncode, output), or None for commands which
+        are not served by QMI.
+        """
+        plans = [
+            (index, self._plans[args[0]])
+            for index, args in enumerate(commands)
+            if args and args[0] in self._plans]
+
+        inflight = []
+        try:
+            # allocate client IDs first, they must not split the burst
+            for _, (requests, _) in plans:
+                for request in requests:
+                    self._client.client_id(request[0])
+
+            for index, (requests, formatter) in plans:
+                inflight.append((index, formatter, [
+                    self._client.send(*request) for request in requests]))
+
+            results = [None] * len(commands)
+            for index, formatter, requests in inflight:
+                responses = []
+                for request in requests:
+                    try:
+                        responses.append(request.wait(
+                            self._client.wait_timeout()))
+                    except QmiResultError as exc:
+                        responses.append(exc)
+                results[index] = self._format(formatter, responses)
+            return results
+
+        except QmiError as exc:
+            _logger.warning("qmi: {}, fallback to cell_mgmt".format(exc))
+            self.close()
+            return [None] * len(commands)
+
+    def _format(self, formatter, responses):
+        """Return (returncode, output), or None to fallback to cell_mgmt
+        if a response lacks a TLV or is truncated."""
+        try:
+            return 0, formatter(*responses)
+        except QmiResultError as exc:
+            return 1, str(exc)
+        except ErrorReturnCode as exc:
+            return exc.exit_code, exc.stdout
+        except (KeyError, struct.error) as exc:
+            _logger.warning("qmi: malformed response {!r}, "
+                            "fallback to cell_mgmt".format(exc))
+            return None
+
+    @staticmethod
+    def _result(tlvs):
+        if isinstance(tlvs, QmiResultError):
+            raise tlvs
+        return tlvs
+
+    def _signal_strength(self, tlvs):
+        tlvs = self._result(tlvs)
+        rssi, radio = struct.unpack_from("<bB", tlvs[0x01])
+        mode = self._radio_mode.get(radio, "none")
+
+        ecio = None
+        if 0x12 in tlvs:
+            count = struct.unpack_from("<B", tlvs[0x12])[0]
+            for index in xrange(count):
+                value, ecio_radio = struct.unpack_from(
+                    "<BB", tlvs[0x12], 1 + index * 2)
+                if ecio_radio == radio:
+                    ecio = -0.5 * value
+        return mode, rssi, ecio
+
+    def _signal(self, tlvs):
+        mode, rssi, _ = self._signal_strength(tlvs)
+        return "{} {} dbm\n".format(mode, rssi)
+
+    def _signal_adv(self, tlvs):
+        mode, rssi, ecio = self._signal_strength(tlvs)
+        csq = min(31, max(0, (rssi + 113) // 2))
+        output = "CSQ: {}\nRSSI: {} {} dBm\n".format(csq, mode, rssi)
+        if ecio is not None:
+            output += "EcIo: {} {:.1f} dBm\n".format(mode, ecio)
+        return output
+
+    def _operator(self, tlvs):
+        tlvs = self._result(tlvs)
+        if 0x12 not in tlvs:
+            return "\n"
+        length = struct.unpack_from("<B", tlvs[0x12], 4)[0]
+        return tlvs[0x12][5:5 + length] + "\n"
+
+    def _attach_status(self, tlvs):
+        tlvs = self._result(tlvs)
+        _, cs_attach, ps_attach = struct.unpack_from("<BBB", tlvs[0x01])
+        return "CS: {}\nPS: {}\n".format(
+            "attached" if cs_attach == 1 else "detached",
+            "attached" if ps_attach == 1 else "detached")
+
+    def _location_info(self, tlvs):
+        tlvs = self._result(tlvs)
+        count = struct.unpack_from("<B", tlvs[0x01], 4)[0]
+        radios = struct.unpack_from("<{}B".format(count), tlvs[0x01], 5)
+
+        output = ""
+        if 0x08 in radios and 0x25 in tlvs:
+            output += "TAC: {:04X}\n".format(
+                struct.unpack_from("<H", tlvs[0x25])[0])
+        elif 0x1D in tlvs:
+            output += "LAC: {:04X}\n".format(
+                struct.unpack_from("<H", tlvs[0x1D])[0])
+        if 0x1E in tlvs:
+            output += "CellID: {:08X}\n".format(
+                struct.unpack_from("<I", tlvs[0x1E])[0])
+        return output
+
+    def _pin1(self, tlvs):
+        if isinstance(tlvs, QmiResultError) or 0x11 not in tlvs:
+            # SIM not inserted or not initialized
+            raise error_return_code(1, ["sim_status"])
+        return struct.unpack_from("<BBB", tlvs[0x11])
+
+    def _sim_status(self, tlvs):
+        status, _, _ = self._pin1(tlvs)
+        # 2: enabled and verified, 3: disabled
+        if status in (2, 3):
+            return "+CPIN: READY\n"
+        if status == 1:
+            return "+CPIN: SIM PIN\n"
+        return "+CPIN: SIM PUK\n"
+
+    def _pin_retries(self, tlvs):
+        _, retries, _ = self._pin1(tlvs)
+        return "{}\n".format(retries)
+
+    def _iccid(self, tlvs):
+        return "ICC-ID: {}\n".format(self._result(tlvs)[0x01])
+
+    def _imsi(self, tlvs):
+        return "IMSI: {}\n".format(self._result(tlvs)[0x01])
+
+    def _module_ids(self, tlvs):
+        tlvs = self._result(tlvs)
+        return "IMEI: {}\nESN: {}\n".format(
+            tlvs.get(0x11, ""), tlvs.get(0x10, ""))
+
+    def _get_profiles(self, tlvs):
+        tlvs = self._result(tlvs)
+        count = struct.unpack_from("<B", tlvs[0x01])[0]
+        offset = 1
+        indexes = []
+        for _ in xrange(count):
+            type_, index, name_length = struct.unpack_from(
+                "<BBB", tlvs[0x01], offset)
+            indexes.append((type_, index))
+            offset += 3 + name_length
+
+        # query settings of all profiles at once
+        requests = [
+            (profile[1], self._client.send(
+                QmiClient.WDS, self.WDS_GET_PROFILE_SETTINGS,
+                {0x01: struct.pack("<BB", *profile)}))
+            for profile in indexes]
+
+        output = ""
+        for index, request in requests:
+            settings = request.wait(self._client.wait_timeout())
+            pdp_type = struct.unpack_from(
+                "<B", settings.get(0x11, "\x00"))[0]
+            output += "{},{},{}\n".format(
+                index, settings.get(0x14, ""),
+                self._pdp_type.get(pdp_type, "IP"))
+        return output
@@ -0,0 +1,136 @@
+"""
+Retry policy with exponential backoff and jitter.
+"""
+
+import logging
+from monotonic import monotonic
+import random
+from threading import Lock
+
+from cellular_utility.cancel import Cancelled, sleep
+from cellular_utility.deadline import (
+    DeadlineExceeded, remaining as deadline_remaining
+)
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class RetryPolicy(object):
+    """
+    Retry a call up to max_attempts times, the n-th retry waits
+        min(initial_delay_sec * multiplier ** (n - 1), max_delay_sec)
+    shortened randomly by up to jitter (0.0 ~ 1.0) of it.
+
+    No more retry is made if it would end after deadline_sec since the
+    first attempt. If it would end after the deadline of the caller,
+    DeadlineExceeded is raised instead. Cancel of the caller ends the
+    wait, Cancelled is never retried.
+    """
+
+    def __init__(
+            self,
+            max_attempts=10,
+            initial_delay_sec=0.1,
+            max_delay_sec=5.0,
+            multiplier=2.0,
+            jitter=0.5,
+            deadline_sec=None):
+        if max_attempts < 1 or initial_delay_sec < 0 or \
+                max_delay_sec < initial_delay_sec or multiplier < 1 or \
+                not 0 <= jitter <= 1:
+            raise ValueError
+
+        self.max_attempts = max_attempts
+        self.initial_delay_sec = initial_delay_sec
+        self.max_delay_sec = max_delay_sec
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline_sec = deadline_sec
+
+        self._lock = Lock()
+        self._stats = {
+            "calls": 0,
+            "retried_calls": 0,
+            "retries": 0,
+            "max_retries": 0,
+            "gave_up": 0,
+            "wait_total": 0.0
+        }
+
+    def delay(self, retry):
+        """Return the wait before the retry-th (1, 2, ...) retry."""
+        delay = min(
+            self.initial_delay_sec * self.multiplier ** (retry - 1),
+            self.max_delay_sec)
+        return delay * (1 - self.jitter * random.random())
+
+    def call(self, should_retry, func, *args, **kwargs):
+        """
+        Return func(*args, **kwargs), retry while it raises an exception
+        that should_retry(exc) returns True for.
+        """
+        begin = monotonic()
+        retry = 0
+        waited = 0.0
+        while True:
+            try:
+                result = func(*args, **kwargs)
+            except Exception as exc:
+                if isinstance(exc, Cancelled) or not should_retry(exc) or \
+                        retry + 1 >= self.max_attempts:
+                    self._record(retry, waited, gave_up=retry > 0)
+                    raise
+
+                delay = self.delay(retry + 1)
+                if self.deadline_sec is not None and \
+                        monotonic() + delay - begin > self.deadline_sec:
+                    self._record(retry, waited, gave_up=True)
+                    raise
+
+                if deadline_remaining(delay) < delay:
+                    self._record(retry, waited, gave_up=True)
+                    raise DeadlineExceeded(
+                        "{} after {} retries".format(
+                            type(exc).__name__, retry))
+
+                retry += 1
+                _logger.debug("{} retry {} in {:.3f}s: {}".format(
+                    getattr(func, "__name__", func), retry, delay,
+                    type(exc).__name__))
+                try:
+                    sleep(delay)
+                except Cancelled:
+                    self._record(retry, waited, gave_up=True)
+                    raise
+                waited += delay
+                continue
+
+            self._record(retry, waited)
+            return result
+
+    def stats(self):
+        """
+        Return dict like:
+            {
+                "calls": 120,        # calls made through the policy
+                "retried_calls": 3,  # calls which needed a retry
+                "retries": 5,        # retries of all calls
+                "max_retries": 2,    # most retries of a single call
+                "gave_up": 0,        # calls failed after retrying
+                "wait_total": 0.7    # seconds slept between attempts
+            }
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _record(self, retry, waited, gave_up=False):
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["retries"] += retry
+            self._stats["wait_total"] += waited
+            if retry:
+                self._stats["retried_calls"] += 1
+            self._stats["max_retries"] = max(
+                self._stats["max_retries"], retry)
+            if gave_up:
+                self._stats["gave_up"] += 1
@@ -0,0 +1,142 @@
+"""
+Minimal command runner for the hot path, a drop-in for the `sh` calls
+of cell_mgmt, vnstat and ping.
+
+    output = Command("cell_mgmt")("signal", _timeout=70)
+
+The command runs with plain pipes, no pty and no helper threads, its
+output is collected by select() in the calling thread. Failures raise
+the same exceptions as `sh`: ErrorReturnCode_N, SignalException_N and
+TimeoutException. A command is killed once the cancel token of the
+calling thread is cancelled, it raises Cancelled then. It runs in a
+process group of its own, a kill takes the processes it started along,
+like the cell_mgmt calls of a `sh -c` batch.
+"""
+
+import errno
+import os
+import select
+import sh
+from sh import TimeoutException
+import signal
+from monotonic import monotonic
+from subprocess import Popen, PIPE
+
+from cellular_utility.cancel import (
+    Cancelled, check as check_cancel, current as current_token
+)
+
+# how often an exited command is checked for while its output pipes are
+# kept open by a daemon it left behind, and for cancel
+EXIT_POLL_SEC = 0.1
+
+_READ_SIZE = 4096
+
+
+def error_return_code(returncode, full_cmd, stdout="", stderr=""):
+    """
+    Build the `sh` exception of returncode, ErrorReturnCode_N or
+    SignalException_N for a negative returncode.
+    """
+    if returncode < 0:
+        exc = getattr(sh, "SignalException_{}".format(-returncode))
+    else:
+        exc = getattr(sh, "ErrorReturnCode_{}".format(returncode))
+    return exc(full_cmd, stdout, stderr)
+
+
+def _kill(proc):
+    """Kill the process group of proc and reap proc."""
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except OSError as exc:
+        if exc.errno != errno.ESRCH:
+            raise
+    proc.wait()
+
+
+def run(argv, timeout=None):
+    """
+    Run argv and return its stdout.
+    Raise ErrorReturnCode_N if it exits with N, or TimeoutException if
+    it does not finish in timeout seconds, it is killed then.
+    Raise Cancelled, after killing it, once the cancel token of this
+    thread is cancelled.
+    A command which cannot be executed exits with 127 like in a shell.
+    """
+    check_cancel()
+    token = current_token()
+    full_cmd = " ".join([str(arg) for arg in argv])
+    try:
+        with open(os.devnull, "rb") as devnull:
+            proc = Popen(
+                [str(arg) for arg in argv],
+                stdin=devnull, stdout=PIPE, stderr=PIPE, close_fds=True,
+                preexec_fn=os.setsid)
+    except OSError as exc:
+        if exc.errno in (errno.ENOENT, errno.EACCES):
+            raise error_return_code(127, full_cmd, "", str(exc))
+        raise
+
+    until = None if timeout is None else monotonic() + timeout
+    stdout_fd = proc.stdout.fileno()
+    stderr_fd = proc.stderr.fileno()
+    outputs = {stdout_fd: [], stderr_fd: []}
+    pending = [stdout_fd, stderr_fd]
+    try:
+        while pending:
+            wait = EXIT_POLL_SEC
+            if until is not None:
+                wait = min(wait, until - monotonic())
+                if wait <= 0:
+                    _kill(proc)
+                    raise TimeoutException(-signal.SIGKILL)
+            if token is not None and token.cancelled():
+                _kill(proc)
+                raise Cancelled(full_cmd)
+
+            try:
+                readable = select.select(pending, [], [], wait)[0]
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:
+                    raise
+                continue
+            for fd in readable:
+                data = os.read(fd, _READ_SIZE)
+                if data:
+                    outputs[fd].append(data)
+                else:
+                    pending.remove(fd)
+
+            if not readable and proc.poll() is not None:
+                break
+    finally:
+        proc.stdout.close()
+        proc.stderr.close()
+
+    returncode = proc.wait()
+    stdout = "".join(outputs[stdout_fd])
+    if returncode != 0:
+        stderr = "".join(outputs[stderr_fd])
+        raise error_return_code(returncode, full_cmd, stdout, stderr)
+    return stdout
+
+
+class Command(object):
+    """
+    `sh.Command` look-alike, call it with the arguments and optionally
+    _timeout in seconds, None for no limit.
+    """
+
+    def __init__(self, name):
+        self._name = name
+
+    def __call__(self, *args, **kwargs):
+        timeout = kwargs.pop("_timeout", None)
+        if kwargs:
+            raise TypeError("unexpected arguments: {}".format(
+                ", ".join(kwargs.keys())))
+        return run([self._name] + list(args), timeout)
+
+    def __repr__(self):
+        return "Command({!r})".format(self._name)
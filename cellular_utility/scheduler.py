@@ -0,0 +1,352 @@
+"""
+Modem command scheduler, one thread owns the modem and runs the
+CellMgmt commands queued by the other threads.
+
+    scheduler = CommandScheduler(CellMgmt())
+    scheduler.start()
+    cell_mgmt = scheduler.proxy(Priority.user)
+    cell_mgmt.pdp_context_list()
+
+Requests are served by priority, then short commands before long ones,
+then first come first served. Waiting requests age so background ones
+are served eventually. Identical read commands already queued or running
+are coalesced, their callers share one modem round trip and each gets a
+copy of the result. The deadline and cancel token of the caller are handed
+over to its command, each coalesced caller waits within its own deadline.
+"""
+
+from enum import Enum
+from itertools import count
+import logging
+from monotonic import monotonic
+from threading import Condition, Lock, Thread, current_thread
+
+from cellular_utility.cancel import (
+    cancel_scope, current as current_token
+)
+from cellular_utility.cell_mgmt import (
+    CellMgmtCancelled, CellMgmtError, CellMgmtDeadlineExceeded
+)
+from cellular_utility.deadline import (
+    current as current_deadline, deadline_at, remaining as deadline_remaining
+)
+from cellular_utility.future import Future, FutureCancelled, FutureTimeout
+from cellular_utility.metrics import registry as metrics
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class CommandSchedulerStopped(CellMgmtError):
+    """CommandSchedulerStopped"""
+    pass
+
+
+class Priority(Enum):
+    """Lower value is served first."""
+    # Sanji request handlers
+    user = 0
+    # Manager state machine
+    control = 1
+    # CellularObserver
+    background = 2
+
+
+class _Command(object):
+    __slots__ = ["seq", "future", "func", "args", "kwargs", "until", "token",
+                 "rank", "queued_at", "key"]
+
+    def __init__(
+            self, seq, future, func, args, kwargs, until, token, rank, key):
+        self.seq = seq
+        self.future = future
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.until = until
+        self.token = token
+        self.rank = rank
+        self.queued_at = monotonic()
+        self.key = key
+
+
+class _Proxy(object):
+    """CellMgmt look-alike, each method call waits for the scheduler."""
+
+    def __init__(self, scheduler, priority):
+        self._scheduler = scheduler
+        self._priority = priority
+
+    def __getattr__(self, name):
+        def _call(*args, **kwargs):
+            return self._scheduler.call(
+                self._priority, name, *args, **kwargs)
+        _call.__name__ = name
+        return _call
+
+    def submit(self, name, *args, **kwargs):
+        """
+        Queue command name at the priority of this proxy, return its
+        Future, see CommandScheduler.submit().
+        """
+        return self._scheduler.submit(self._priority, name, *args, **kwargs)
+
+
+class CommandScheduler(object):
+    """
+    Run commands of target, a CellMgmt, one at a time on its own thread.
+    """
+
+    # commands holding the modem for seconds,
+    # they yield to short commands of the same priority
+    LONG_COMMANDS = frozenset([
+        "start", "stop", "power_cycle", "set_pdp_context", "set_pin",
+        "get_cellular_fw", "set_cellular_fw"])
+
+    # a queued command moves up one rank every AGING_SEC
+    AGING_SEC = 10.0
+
+    # a caller waits this long past its deadline for a running command to
+    # give up on the handed over deadline, then leaves it running
+    DEADLINE_GRACE_SEC = 1.0
+
+    # commands without side effects, identical ones in flight are coalesced
+    READ_COMMANDS = frozenset([
+        "signal", "signal_adv", "status", "attach", "m_info", "operator",
+        "pdp_context_list", "sim_status", "get_pin_retry_remain",
+        "get_cellular_module_ids", "get_cellular_sim_info",
+        "get_cellular_location", "get_cellular_fw", "batch"])
+
+    def __init__(self, target):
+        self._target = target
+
+        self._cond = Condition(Lock())
+        self._queue = []
+        self._seq = count()
+        self._thread = None
+        self._stop = True
+
+        # key: queued or running command of READ_COMMANDS
+        self._inflight = {}
+
+        self._running = None
+        self._max_depth = 0
+        self._stats = {}
+        self._coalesced = {}
+
+    def start(self):
+        self._stop = False
+
+        self._thread = Thread(
+            name="sanji.cellular.scheduler", target=self._main_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Finish the running command, fail the queued ones with
+        CommandSchedulerStopped.
+        """
+        with self._cond:
+            self._stop = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def proxy(self, priority):
+        """Return a CellMgmt look-alike calling through this scheduler."""
+        return _Proxy(self, priority)
+
+    def submit(self, priority, name, *args, **kwargs):
+        """
+        Queue command name of target, return its Future.
+        The deadline and cancel token of the caller, if any, apply to the
+        command.
+
+        An identical read command in flight with the same cancel token is
+        shared instead, it takes the higher priority and runs until the
+        latest deadline of its callers. Each caller still waits within its
+        own deadline only, see call().
+        """
+        func = getattr(self._target, name)
+        rank = priority.value * 2 + (1 if name in self.LONG_COMMANDS else 0)
+        until = current_deadline()
+        token = current_token()
+        key = _key(name, args, kwargs) \
+            if name in self.READ_COMMANDS else None
+
+        with self._cond:
+            if self._stop:
+                raise CommandSchedulerStopped(name)
+
+            command = self._inflight.get(key) if key is not None else None
+            # cancelling one caller must not fail the others
+            if command is not None and command.token is token and \
+                    command.future._join():
+                self._coalesced[name] = self._coalesced.get(name, 0) + 1
+                metrics.count("scheduler_coalesced", name)
+                if rank < command.rank:
+                    command.rank = rank
+                    command.future.priority = priority
+                # the command serves the most patient caller, the others
+                # stop waiting on their own deadline in call()
+                if command.until is not None:
+                    command.until = None if until is None \
+                        else max(command.until, until)
+                return command.future
+
+            command = _Command(
+                next(self._seq), Future(name, priority), func, args, kwargs,
+                until, token, rank, key)
+            if key is not None:
+                self._inflight[key] = command
+            self._queue.append(command)
+            self._max_depth = max(self._max_depth, len(self._queue))
+            metrics.gauge("scheduler_depth", None, len(self._queue))
+            self._cond.notify()
+
+        return command.future
+
+    def call(self, priority, name, *args, **kwargs):
+        """
+        Run command name of target and return its result,
+        within the deadline of the caller plus DEADLINE_GRACE_SEC, a
+        running command is left to finish on its own then. Once the cancel
+        token of the caller is cancelled, a queued command is dropped and a
+        running one is killed, CellMgmtCancelled is raised.
+        """
+        # a command calling back must not wait for itself
+        if current_thread() is self._thread:
+            return getattr(self._target, name)(*args, **kwargs)
+
+        future = self.submit(priority, name, *args, **kwargs)
+        token = current_token()
+        if token is not None:
+            token.add_callback(future.cancel)
+        try:
+            return future.result(deadline_remaining())
+        except FutureTimeout:
+            if not future.done() and future.cancel():
+                raise CellMgmtDeadlineExceeded(
+                    "{} still queued".format(name))
+            # started, it gives up on the handed over deadline by itself
+            try:
+                return future.result(self.DEADLINE_GRACE_SEC)
+            except FutureTimeout:
+                raise CellMgmtDeadlineExceeded(
+                    "{} still running".format(name))
+        except FutureCancelled:
+            raise CellMgmtCancelled("{} still queued".format(name))
+        finally:
+            if token is not None:
+                token.remove_callback(future.cancel)
+
+    def depth(self):
+        """Return the number of queued commands."""
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        """
+        Return dict like:
+            {
+                "depth": 1,
+                "max_depth": 4,
+                "running": "start",
+                "priorities": {
+                    "user": {"count": 3, "wait_total": 0.8, "wait_max": 0.5}
+                },
+                "coalesced": {"pdp_context_list": 2}
+            }
+        Wait is the time from submit() until the command starts,
+        coalesced counts the modem round trips saved. Waits, coalesced and
+        depth are exported to the metrics registry as well.
+        """
+        with self._cond:
+            return {
+                "depth": len(self._queue),
+                "max_depth": self._max_depth,
+                "running": self._running,
+                "priorities": dict([
+                    (name, dict(stats))
+                    for name, stats in self._stats.items()]),
+                "coalesced": dict(self._coalesced)
+            }
+
+    def _main_thread(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+
+                if self._stop:
+                    queue, self._queue = self._queue, []
+                    self._inflight = {}
+                    metrics.gauge("scheduler_depth", None, 0)
+                    break
+
+                command = self._pop()
+
+            self._run(command)
+
+        for command in queue:
+            _logger.warning("scheduler stopped, drop {}".format(
+                command.future.name))
+            command.future._set_exc_info((
+                CommandSchedulerStopped,
+                CommandSchedulerStopped(command.future.name),
+                None))
+
+    def _pop(self):
+        now = monotonic()
+        command = min(self._queue, key=lambda command: (
+            command.rank - int((now - command.queued_at) / self.AGING_SEC),
+            command.seq))
+        self._queue.remove(command)
+        metrics.gauge("scheduler_depth", None, len(self._queue))
+        return command
+
+    def _run(self, command):
+        future = command.future
+        if not future._start():
+            self._forget(command)
+            return
+
+        wait = monotonic() - command.queued_at
+        metrics.observe("scheduler_wait", future.priority.name, wait)
+        with self._cond:
+            self._running = future.name
+            stats = self._stats.get(future.priority.name)
+            if stats is None:
+                stats = self._stats[future.priority.name] = {
+                    "count": 0, "wait_total": 0.0, "wait_max": 0.0}
+            stats["count"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+
+        try:
+            with deadline_at(command.until), cancel_scope(command.token):
+                future._call(command.func, command.args, command.kwargs)
+        finally:
+            with self._cond:
+                self._running = None
+            self._forget(command)
+
+    def _forget(self, command):
+        with self._cond:
+            if self._inflight.get(command.key) is command:
+                del self._inflight[command.key]
+
+
+def _key(name, args, kwargs):
+    """Return a hashable key of the call, lists like batch() queries
+    become tuples. Return None if the arguments are not hashable."""
+    key = (name,
+           tuple([tuple(arg) if isinstance(arg, list) else arg
+                  for arg in args]),
+           tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
@@ -0,0 +1,76 @@
+"""
+pty based fake modem which answers AT commands, for tests.
+"""
+
+import os
+import select
+import tty
+from threading import Lock, Thread
+
+
+class FakeModem(object):
+    """
+    Answer AT commands written to `port` from `responses`, a dict like
+        {"AT+CSQ": ["+CSQ: 20,99"], "AT+CPIN?": "+CME ERROR: SIM failure"}
+    A list is sent as info lines followed by OK, a string is sent as the
+    final result code. Unknown commands are answered with ERROR.
+    """
+
+    def __init__(self, responses=None, echo=False):
+        self.responses = {} if responses is None else responses
+        self.echo = echo
+        self.received = []
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._master)
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self._write_lock = Lock()
+        self._stop = False
+        self._thread = Thread(target=self._main_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        os.close(self._master)
+        os.close(self._slave)
+
+    def send_urc(self, line):
+        self._write("\r\n{}\r\n".format(line))
+
+    def _write(self, data):
+        with self._write_lock:
+            os.write(self._master, data)
+
+    def _answer(self, cmd):
+        self.received.append(cmd)
+        response = self.responses.get(cmd, "ERROR")
+        if callable(response):
+            response = response(cmd)
+
+        data = cmd + "\r" if self.echo else ""
+        if isinstance(response, list):
+            for line in response:
+                data += "\r\n{}\r\n".format(line)
+            response = "OK"
+        data += "\r\n{}\r\n".format(response)
+        self._write(data)
+
+    def _main_thread(self):
+        buf = ""
+        while not self._stop:
+            readable, _, _ = select.select([self._master], [], [], 0.05)
+            if not readable:
+                continue
+            try:
+                buf += os.read(self._master, 4096)
+            except OSError:
+                return
+            while "\r" in buf:
+                cmd, buf = buf.split("\r", 1)
+                cmd = cmd.strip()
+                if cmd:
+                    self._answer(cmd)
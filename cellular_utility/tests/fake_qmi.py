@@ -0,0 +1,118 @@
+"""
+socketpair based fake QMI device which replays recorded TLVs, for tests.
+"""
+
+import os
+import select
+import socket
+import struct
+from threading import Thread
+
+from cellular_utility.qmi import decode_tlvs, encode_tlvs
+
+
+class FakeQmi(object):
+    """
+    Answer QMI requests written to `fd` from `responses`, a dict like
+        {(0x03, 0x0020): {0x01: "\\xb5\\x08"}}
+    of (service, message ID) to response TLVs, either a dict or the
+    recorded bytes. A success result TLV is added if there is none.
+    A callable is called with the request TLVs. Unknown messages are
+    answered with QMI_ERR_NOT_SUPPORTED.
+
+    Requests arriving together are answered in reverse order, like a
+    modem answering a slow query last.
+    """
+
+    QUIET_SEC = 0.02
+
+    def __init__(self, responses=None):
+        self.responses = {} if responses is None else responses
+        self.received = []
+        self.released = []
+        self.max_inflight = 0
+
+        self._sock, self._peer = socket.socketpair()
+        self.fd = self._peer.fileno()
+
+        self._clients = 0
+        self._stop = False
+        self._thread = Thread(target=self._main_thread)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def close(self):
+        self._stop = True
+        self._thread.join()
+        self._sock.close()
+        self._peer.close()
+
+    def hang_up(self):
+        self._stop = True
+        self._thread.join()
+        self._sock.close()
+
+    def _answer(self, frame):
+        _, _, _, service, client_id = struct.unpack_from("<BHBBB", frame)
+        if service == 0x00:
+            _, transaction, message_id, _ = struct.unpack_from(
+                "<BBHH", frame, 6)
+            request = decode_tlvs(frame[12:])
+        else:
+            _, transaction, message_id, _ = struct.unpack_from(
+                "<BHHH", frame, 6)
+            request = decode_tlvs(frame[13:])
+        self.received.append((service, message_id, request))
+
+        if service == 0x00 and message_id == 0x0022:
+            self._clients += 1
+            tlvs = {0x01: request[0x01] + struct.pack("<B", self._clients)}
+        elif service == 0x00 and message_id == 0x0023:
+            self.released.append(struct.unpack("<BB", request[0x01]))
+            tlvs = {0x01: request[0x01]}
+        else:
+            tlvs = self.responses.get((service, message_id))
+            if callable(tlvs):
+                tlvs = tlvs(request)
+            if tlvs is None:
+                tlvs = {0x02: struct.pack("<HH", 1, 0x005E)}
+            elif not isinstance(tlvs, dict):
+                tlvs = decode_tlvs(tlvs)
+
+        tlvs = dict(tlvs)
+        tlvs.setdefault(0x02, struct.pack("<HH", 0, 0))
+        payload = encode_tlvs(tlvs)
+
+        if service == 0x00:
+            sdu = struct.pack("<BBHH", 0x01, transaction, message_id,
+                              len(payload))
+        else:
+            sdu = struct.pack("<BHHH", 0x02, transaction, message_id,
+                              len(payload))
+        sdu += payload
+        return struct.pack(
+            "<BHBBB", 0x01, 5 + len(sdu), 0x80, service, client_id) + sdu
+
+    def _main_thread(self):
+        buf = ""
+        frames = []
+        while not self._stop:
+            readable, _, _ = select.select([self._sock], [], [],
+                                           self.QUIET_SEC)
+            if not readable:
+                self.max_inflight = max(self.max_inflight, len(frames))
+                for frame in reversed(frames):
+                    os.write(self._sock.fileno(), self._answer(frame))
+                frames = []
+                continue
+
+            data = self._sock.recv(4096)
+            if data == "":
+                return
+            buf += data
+            while len(buf) >= 3:
+                length = struct.unpack_from("<H", buf, 1)[0]
+                if len(buf) < length + 1:
+                    break
+                frames.append(buf[:length + 1])
+                buf = buf[length + 1:]
@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import Mock, patch
+from sh import ErrorReturnCode_1
+from Queue import Queue
+from threading import Thread
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    patch('cellular_utility.cell_mgmt.retrying', lambda x: x).start()
+    from cellular_utility.at_session import (
+        AtSession, AtSessionBackend, AtSessionError
+    )
+    from cellular_utility.cell_mgmt import CellMgmt, SimStatus
+    from cellular_utility.tests.fake_modem import FakeModem
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+RESPONSES = {
+    "ATE0": [],
+    "AT+CMEE=2": [],
+    "AT+COPS=3,0": [],
+    "AT+CFUN?": ["+CFUN: 1"],
+    "AT+CPIN?": ["+CPIN: READY"],
+    "AT+CGATT?": ["+CGATT: 1"],
+    "AT+COPS?": ["+COPS: 0,0,\"Chunghwa Telecom\",2"],
+    "AT+CSQ": ["+CSQ: 21,99"],
+    "AT+CGDCONT?": [
+        "+CGDCONT: 1,\"IP\",\"internet\",\"0.0.0.0\",0,0",
+        "+CGDCONT: 2,\"IPV4V6\",\"TPC\",\"0.0.0.0\",0,0"],
+}
+
+
+class TestAtSession(unittest.TestCase):
+    def setUp(self):
+        self.modem = FakeModem(dict(RESPONSES), echo=True)
+        self.session = AtSession(self.modem.port)
+
+    def tearDown(self):
+        self.session.close()
+        self.modem.close()
+
+    def test_command_should_keep_port_open(self):
+        # act
+        self.session.command("AT+CFUN?")
+        res = self.session.command("AT+CFUN?")
+
+        # assert
+        self.assertTrue(self.session.is_open())
+        self.assertEqual("\r\n+CFUN: 1\r\n\r\nOK\r\n", res)
+        self.assertEqual(["AT+CFUN?", "AT+CFUN?"], self.modem.received)
+
+    def test_command_with_urc_should_dispatch_urc(self):
+        # arrange
+        urc = Mock()
+        self.session.set_urc_callback(urc)
+
+        def cgatt(cmd):
+            self.modem.send_urc("+CEREG: 1")
+            return ["+CGATT: 1"]
+        self.modem.responses["AT+CGATT?"] = cgatt
+
+        # act
+        res = self.session.command("AT+CGATT?")
+
+        # assert
+        self.assertEqual("\r\n+CGATT: 1\r\n\r\nOK\r\n", res)
+        urc.assert_called_once_with("+CEREG: 1")
+
+    def test_read_urcs_should_dispatch_pending_urcs(self):
+        # arrange
+        urc = Mock()
+        self.session.set_urc_callback(urc)
+        self.session.open()
+        self.modem.send_urc("+CEREG: 1")
+        sleep(0.1)
+
+        # act
+        res = self.session.read_urcs()
+
+        # assert
+        self.assertTrue(res)
+        urc.assert_called_once_with("+CEREG: 1")
+
+    def test_read_urcs_while_port_in_use_should_return_false(self):
+        # arrange
+        urc = Mock()
+        self.session.set_urc_callback(urc)
+        self.session.open()
+        self.modem.send_urc("+CEREG: 1")
+        sleep(0.1)
+
+        # act
+        with self.session.lock:
+            res = Queue()
+            thread = Thread(target=lambda: res.put(self.session.read_urcs()))
+            thread.start()
+            thread.join()
+
+        # assert
+        self.assertFalse(res.get())
+        self.assertFalse(urc.called)
+
+    def test_command_without_response_should_raise_fail(self):
+        # arrange
+        self.modem.responses["AT+COPS=?"] = lambda cmd: ""
+
+        # act and assert
+        with self.assertRaises(AtSessionError):
+            self.session.command("AT+COPS=?", timeout=0.2)
+
+
+class TestAtSessionBackend(unittest.TestCase):
+    @patch("cellular_utility.cell_mgmt.Command")
+    def setUp(self, mock_command):
+        CellMgmt._cache.clear()
+        self.modem = FakeModem(dict(RESPONSES))
+        self.fallback = Mock(return_value="")
+        self.cell_mgmt = CellMgmt()
+        self.cell_mgmt._sh_cell_mgmt = self.fallback
+        CellMgmt.set_backend(AtSessionBackend(self.modem.port))
+
+    def tearDown(self):
+        CellMgmt.set_backend(None)
+        self.modem.close()
+
+    def test_at_should_not_spawn_cell_mgmt(self):
+        # act
+        res = self.cell_mgmt.at("AT+CFUN?")
+
+        # assert
+        self.assertEqual({"status": "ok", "info": "+CFUN: 1"}, res)
+        self.assertFalse(self.fallback.called)
+
+    def test_queries_should_be_parsed_by_cell_mgmt(self):
+        # act
+        signal = self.cell_mgmt.signal_adv()
+
+        # assert
+        self.assertEqual(SimStatus.ready, self.cell_mgmt.sim_status())
+        self.assertTrue(self.cell_mgmt.attach())
+        self.assertEqual("Chunghwa Telecom", self.cell_mgmt.operator())
+        self.assertEqual(21, signal.csq)
+        self.assertEqual(-71, signal.rssi_dbm)
+        self.assertEqual("umts", signal.mode)
+        self.assertIsNone(signal.ecio_dbm)
+        self.assertEqual(
+            [{"id": 1, "type": "ipv4", "apn": "internet"},
+             {"id": 2, "type": "ipv4v6", "apn": "TPC"}],
+            self.cell_mgmt.pdp_context_list())
+        self.assertFalse(self.fallback.called)
+
+    def test_sim_not_inserted_should_be_nosim(self):
+        # arrange
+        self.modem.responses["AT+CPIN?"] = "+CME ERROR: SIM not inserted"
+
+        # act and assert
+        self.assertEqual(SimStatus.nosim, self.cell_mgmt.sim_status())
+
+    def test_unlock_pin_error_should_tell_modem_error(self):
+        # arrange
+        self.modem.responses["AT+CPIN=\"0000\""] = \
+            "+CPIN: SIM PIN\r\n\r\n+CME ERROR: incorrect password"
+
+        # act
+        with self.assertRaises(ErrorReturnCode_1) as context:
+            CellMgmt._backend.execute(self.fallback, "unlock_pin", "0000")
+
+        # assert
+        self.assertEqual(
+            "+CPIN: SIM PIN\n+CME ERROR: incorrect password",
+            context.exception.stdout)
+
+    def test_location_info_should_restore_registration_mode(self):
+        # arrange
+        modes = {"CREG": "0"}
+
+        def creg(cmd):
+            if cmd.endswith("?"):
+                if modes["CREG"] == "2":
+                    return ["+CREG: 2,1,\"2817\",\"01073AEE\",2"]
+                return ["+CREG: {},1".format(modes["CREG"])]
+            modes["CREG"] = cmd.split("=")[1]
+            return []
+        for cmd in ["AT+CREG?", "AT+CREG=0", "AT+CREG=2"]:
+            self.modem.responses[cmd] = creg
+
+        # act
+        location = self.cell_mgmt.get_cellular_location()
+
+        # assert
+        self.assertEqual("2817", location.lac)
+        self.assertEqual("01073AEE", location.cell_id)
+        self.assertEqual("0", modes["CREG"])
+
+    def test_start_should_fallback_to_cell_mgmt(self):
+        # arrange
+        self.fallback.return_value = (
+            "IP=10.24.42.11\n"
+            "SubnetMask=255.255.255.252\n"
+            "Gateway=10.24.42.10\n"
+            "DNS=168.95.1.1\n")
+
+        # act
+        nwk_info = self.cell_mgmt.start(apn="internet")
+
+        # assert
+        self.assertEqual("10.24.42.11", nwk_info.ip)
+        self.assertEqual("start", self.fallback.call_args[0][0])
+
+    def test_port_gone_should_fallback_to_cell_mgmt(self):
+        # arrange
+        CellMgmt.set_backend(AtSessionBackend("/dev/nonexistent"))
+        self.fallback.return_value = "Chunghwa Telecom\n"
+
+        # act
+        res = self.cell_mgmt.operator()
+
+        # assert
+        self.assertEqual("Chunghwa Telecom", res)
+        self.fallback.assert_called_once_with("operator")
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import Mock, patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cache import TtlCache
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestTtlCache(unittest.TestCase):
+    def setUp(self):
+        self.cache = TtlCache({"m_info": None, "signal": 5})
+
+    def tearDown(self):
+        pass
+
+    def test_get_should_call_loader_once(self):
+        # arrange
+        loader = Mock(return_value="MC7354")
+
+        # act
+        self.cache.get("m_info", (), loader)
+        res = self.cache.get("m_info", (), loader)
+
+        # assert
+        self.assertEqual("MC7354", res)
+        self.assertEqual(1, loader.call_count)
+        self.assertEqual(
+            {"hit": 1, "miss": 1, "invalidate": 0},
+            self.cache.stats()["m_info"])
+
+    @patch("cellular_utility.cache.monotonic")
+    def test_get_after_ttl_should_call_loader_again(self, monotonic):
+        # arrange
+        loader = Mock(return_value=-73)
+        monotonic.return_value = 100
+
+        # act
+        self.cache.get("signal", (), loader)
+        monotonic.return_value = 104
+        self.cache.get("signal", (), loader)
+        monotonic.return_value = 106
+        self.cache.get("signal", (), loader)
+
+        # assert
+        self.assertEqual(2, loader.call_count)
+
+    def test_get_after_invalidate_should_call_loader_again(self):
+        # arrange
+        loader = Mock(return_value="MC7354")
+
+        # act
+        self.cache.get("m_info", (), loader)
+        self.cache.invalidate("m_info")
+        self.cache.get("m_info", (), loader)
+
+        # assert
+        self.assertEqual(2, loader.call_count)
+        self.assertEqual(1, self.cache.stats()["m_info"]["invalidate"])
+
+    def test_store_after_invalidate_should_be_dropped(self):
+        # arrange
+        _, generation = self.cache.lookup("m_info")
+
+        # act
+        self.cache.invalidate()
+        self.cache.store("m_info", (), "stale", generation)
+
+        # assert
+        self.assertFalse(self.cache.lookup("m_info")[0])
+
+    def test_peek_should_not_count(self):
+        # arrange
+        self.cache.get("m_info", (), Mock(return_value="MC7354"))
+
+        # act
+        hit = self.cache.peek("m_info")
+        miss = self.cache.peek("signal")
+
+        # assert
+        self.assertEqual((True, "MC7354"), hit)
+        self.assertEqual((False, None), miss)
+        self.assertEqual(
+            {"hit": 0, "miss": 1, "invalidate": 0},
+            self.cache.stats()["m_info"])
+
+    def test_get_not_cacheable_should_always_call_loader(self):
+        # arrange
+        loader = Mock(return_value="ok")
+
+        # act
+        self.cache.get("at", (), loader)
+        self.cache.get("at", (), loader)
+
+        # assert
+        self.assertEqual(2, loader.call_count)
+        self.assertNotIn("at", self.cache.stats())
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
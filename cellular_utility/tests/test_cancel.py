@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from monotonic import monotonic
+from threading import Timer
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cancel import (
+        CancelToken, Cancelled, cancel_scope, check, current, sleep
+    )
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestCancel(unittest.TestCase):
+    def setUp(self):
+        self.token = CancelToken()
+
+    def tearDown(self):
+        pass
+
+    def test_cancel_should_call_callbacks_once(self):
+        # arrange
+        calls = []
+        self.token.add_callback(lambda: calls.append("a"))
+        self.token.add_callback(lambda: calls.append("b"))
+
+        # act
+        self.token.cancel()
+        self.token.cancel()
+
+        # assert
+        self.assertTrue(self.token.cancelled())
+        self.assertEqual(["a", "b"], calls)
+
+    def test_add_callback_after_cancel_should_call_it_now(self):
+        # arrange
+        calls = []
+        self.token.cancel()
+
+        # act
+        self.token.add_callback(lambda: calls.append("a"))
+
+        # assert
+        self.assertEqual(["a"], calls)
+
+    def test_removed_callback_should_not_be_called(self):
+        # arrange
+        calls = []
+
+        def callback():
+            calls.append("a")
+        self.token.add_callback(callback)
+
+        # act
+        self.token.remove_callback(callback)
+        self.token.cancel()
+
+        # assert
+        self.assertEqual([], calls)
+
+    def test_scope_should_restore_outer_token(self):
+        # act & assert
+        self.assertIsNone(current())
+        with cancel_scope(self.token):
+            self.assertIs(self.token, current())
+            with cancel_scope(None):
+                self.assertIsNone(current())
+            self.assertIs(self.token, current())
+        self.assertIsNone(current())
+
+    def test_check_after_cancel_should_raise_cancelled(self):
+        # arrange
+        check()
+
+        # act & assert
+        with cancel_scope(self.token):
+            check()
+            self.token.cancel()
+            with self.assertRaises(Cancelled):
+                check()
+
+    def test_sleep_should_end_on_cancel(self):
+        # arrange
+        Timer(0.1, self.token.cancel).start()
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(Cancelled):
+            with cancel_scope(self.token):
+                sleep(10)
+
+        # assert
+        self.assertLess(monotonic() - begin, 1)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
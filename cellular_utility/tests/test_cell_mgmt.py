@@ -4,8 +4,13 @@
 import os
 import sys
 import logging
+import shutil
+import tempfile
 import unittest
 from mock import patch, Mock
+from sh import ErrorReturnCode_1, ErrorReturnCode_60, TimeoutException
+from threading import Thread, Timer
+from time import sleep
 
 
 def mock_retrying(f):
@@ -17,7 +22,16 @@ def mock_retrying(f):
 try:
     sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
     patch('cellular_utility.cell_mgmt.retrying', lambda x: x).start()
-    from cellular_utility.cell_mgmt import CellMgmt, CellMgmtError
+    from cellular_utility.cancel import CancelToken, cancel_scope
+    from cellular_utility.cell_mgmt import (
+        CellMgmt, CellMgmtCancelled, CellMgmtError,
+        CellMgmtDeadlineExceeded, CellMgmtLockTimeout, MInfo, SimStatus,
+        sh_default_timeout
+    )
+    from cellular_utility.deadline import DeadlineExceeded, deadline
+    from cellular_utility.lock import ModemLock
+    from cellular_utility.metrics import MetricsRegistry
+    from cellular_utility.runner import Command
 except ImportError as e:
     print os.path.dirname(os.path.realpath(__file__)) + "/../"
     print sys.path
@@ -30,8 +44,9 @@ dirpath = os.path.dirname(os.path.realpath(__file__))
 
 
 class TestCellMgmt(unittest.TestCase):
-    @patch("cellular_utility.cell_mgmt.sh")
-    def setUp(self, mock_sh):
+    @patch("cellular_utility.cell_mgmt.Command")
+    def setUp(self, mock_command):
+        CellMgmt._cache.clear()
         self.cell_mgmt = CellMgmt()
 
     def tearDown(self):
@@ -296,6 +311,483 @@ class TestCellMgmt(unittest.TestCase):
         with self.assertRaises(CellMgmtError):
             self.cell_mgmt.at("at")
 
+    def test_at_with_timeout_should_not_retry(self):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(
+            side_effect=TimeoutException(-9))
+
+        # act
+        with self.assertRaises(CellMgmtError):
+            self.cell_mgmt.at("at")
+
+        # assert
+        self.assertEqual(1, self.cell_mgmt._cell_mgmt.call_count)
+
+    def test_batch_should_parse_each_section(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "CSQ: 20\nRSSI: umts -73 dBm\nEcIo: umts -5.5 dBm\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 1\n"
+            "Chunghwa Telecom\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 2\n"
+            "LAC: 2817\nCellID: 01073AEE\n"
+            "\n@@rc 0\n")
+
+        # act
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        res = self.cell_mgmt.batch(
+            ["signal_adv", "operator", "location_info"])
+
+        # assert
+        self.assertEqual(1, self.cell_mgmt._shell.call_count)
+        self.assertEqual(20, res["signal_adv"].csq)
+        self.assertEqual(-5.5, res["signal_adv"].ecio_dbm)
+        self.assertEqual("Chunghwa Telecom", res["operator"])
+        self.assertEqual("2817", res["location_info"].lac)
+        self.assertEqual("01073AEE", res["location_info"].cell_id)
+
+    def test_batch_with_failed_section_should_be_none(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "ICC-ID: 8988600000000000000\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 1\n"
+            "\n@@rc 3\n")
+
+        # act
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        res = self.cell_mgmt.batch(["sim_info"])
+
+        # assert
+        self.assertIsNone(res["sim_info"])
+
+    def test_at_batch_should_parse_each_section(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "\r\nOK\r\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 1\n"
+            "\r\n+CSQ: 21,99\r\n\r\nOK\r\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 2\n"
+            "\r\nERROR\r\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 3\n"
+            "\n@@rc 1\n")
+
+        # act
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        res = self.cell_mgmt.at_batch(
+            ["ATE0", "AT+CSQ", "AT!BAD", ("AT!priid?", 3)])
+
+        # assert
+        self.assertEqual(1, self.cell_mgmt._shell.call_count)
+        self.assertIn(
+            "cell_mgmt at 'AT!priid?' 3",
+            self.cell_mgmt._shell.call_args[0][1])
+        self.assertEqual(
+            [{"status": "ok", "info": ""},
+             {"status": "ok", "info": "+CSQ: 21,99"},
+             {"status": "err", "info": ""},
+             {"status": "err", "info": ""}],
+            res)
+
+    def test_at_batch_with_stop_on_error_should_stop_after_error(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "\r\nOK\r\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 1\n"
+            "\r\nERROR\r\n"
+            "\n@@rc 0\n")
+
+        # act
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        res = self.cell_mgmt.at_batch(
+            ["ATE0", "AT!BAD", "AT+CSQ"], stop_on_error=True)
+
+        # assert
+        self.assertEqual(
+            [{"status": "ok", "info": ""}, {"status": "err", "info": ""}],
+            res)
+
+    def test_at_batch_with_stop_on_error_should_raise_on_lost_section(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "\r\nOK\r\n"
+            "\n@@rc 0\n")
+
+        # act & assert
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        with self.assertRaises(CellMgmtError):
+            self.cell_mgmt.at_batch(["ATE0", "AT+CSQ"], stop_on_error=True)
+
+    def test_batch_should_time_out_each_section_on_its_own(self):
+        # arrange
+        bindir = tempfile.mkdtemp()
+        with open(os.path.join(bindir, "cell_mgmt"), "w") as script:
+            script.write(
+                "#!/bin/sh\n"
+                "[ \"$1\" = operator ] && exec sleep 10\n"
+                "echo 'LAC: 2817'\necho 'CellID: 01073AEE'\n")
+        os.chmod(os.path.join(bindir, "cell_mgmt"), 0755)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = bindir + os.pathsep + path
+        self.cell_mgmt._shell = sh_default_timeout(Command("sh"), 70)
+        self.cell_mgmt.CELL_MGMT_TIMEOUT_SEC = 1
+
+        # act
+        try:
+            res = self.cell_mgmt.batch(["operator", "location_info"])
+        finally:
+            os.environ["PATH"] = path
+            shutil.rmtree(bindir)
+
+        # assert
+        self.assertIsNone(res["operator"])
+        self.assertEqual("2817", res["location_info"].lac)
+
+    def test_batch_on_cancel_should_kill_cell_mgmt(self):
+        # arrange
+        bindir = tempfile.mkdtemp()
+        pidfile = os.path.join(bindir, "pid")
+        with open(os.path.join(bindir, "cell_mgmt"), "w") as script:
+            script.write("#!/bin/sh\necho $$ > {}\nexec sleep 10\n".format(
+                pidfile))
+        os.chmod(os.path.join(bindir, "cell_mgmt"), 0755)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = bindir + os.pathsep + path
+        self.cell_mgmt._shell = sh_default_timeout(Command("sh"), 70)
+        token = CancelToken()
+        Timer(0.5, token.cancel).start()
+
+        # act
+        try:
+            with self.assertRaises(CellMgmtCancelled):
+                with cancel_scope(token):
+                    self.cell_mgmt.at_batch(["ATE0", "AT+CSQ"])
+            sleep(0.2)
+            with open(pidfile) as pid:
+                stat = "/proc/{}/stat".format(pid.read().strip())
+        finally:
+            os.environ["PATH"] = path
+            shutil.rmtree(bindir)
+
+        # assert
+        if os.path.exists(stat):
+            # a zombie left for init to reap is not running
+            with open(stat) as proc:
+                self.assertEqual("Z", proc.read().split(") ")[1][0])
+
+    def test_at_batch_over_backend_should_stop_after_error(self):
+        # arrange
+        backend = Mock(spec=["execute", "close"])
+        backend.execute.side_effect = [
+            "\r\nOK\r\n", "\r\n+CME ERROR: SIM busy\r\n", "\r\nOK\r\n"]
+        CellMgmt.set_backend(backend)
+
+        # act
+        try:
+            res = self.cell_mgmt.at_batch(
+                ["ATE0", "AT+CPIN?", "AT+CSQ"], stop_on_error=True)
+        finally:
+            CellMgmt.set_backend(None)
+
+        # assert
+        self.assertEqual(2, backend.execute.call_count)
+        self.assertEqual("cme-err", res[1]["status"])
+        self.assertEqual(2, len(res))
+
+    def test_get_cellular_sim_info_should_run_once(self):
+        # arrange
+        SUT = (
+            "@@cell_mgmt 0\n"
+            "ICC-ID: 8988600000000000000\n"
+            "\n@@rc 0\n"
+            "@@cell_mgmt 1\n"
+            "IMSI: 466920000000000\n"
+            "\n@@rc 0\n")
+
+        # act
+        self.cell_mgmt._shell = Mock(return_value=SUT)
+        res = self.cell_mgmt.get_cellular_sim_info()
+
+        # assert
+        self.assertEqual(1, self.cell_mgmt._shell.call_count)
+        self.assertEqual("8988600000000000000", res.iccid)
+        self.assertEqual("466920000000000", res.imsi)
+
+    def test_m_info_should_be_cached_until_power_cycle(self):
+        # arrange
+        SUT = (
+            "Module=MC7304\n"
+            "WWAN_node=wwan0\n"
+            "AT_port=/dev/ttyUSB2\n"
+            "GPS_port=/dev/ttyUSB1\n"
+            "LAC=2817\n"
+            "CellID=01073AEE\n"
+            "ICC-ID=1234567890123456\n"
+            "IMEI=0123456789012345\n"
+            "QMI_port=/dev/cdc-wdm0\n")
+
+        # act
+        self.cell_mgmt._cell_mgmt = Mock(return_value=SUT)
+        self.cell_mgmt.m_info()
+        minfo = self.cell_mgmt.m_info()
+        self.cell_mgmt._cell_mgmt.reset_mock()
+        with patch("cellular_utility.cell_mgmt.sleep"):
+            self.cell_mgmt.power_cycle()
+        self.cell_mgmt.m_info()
+
+        # assert
+        self.assertEqual("/dev/ttyUSB2", minfo.at_port)
+        self.assertEqual(
+            ["power_off", "power_on", "m_info"],
+            [c[0][0] for c in self.cell_mgmt._cell_mgmt.call_args_list])
+        self.assertEqual(1, CellMgmt.cache_stats()["m_info"]["hit"])
+
+    def test_set_pdp_context_should_invalidate_pdp_context_list(self):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(return_value="1,internet,IP\n")
+
+        # act
+        self.cell_mgmt.pdp_context_list()
+        self.cell_mgmt.set_pdp_context(1, "internet")
+        self.cell_mgmt.pdp_context_list()
+
+        # assert
+        self.assertEqual(3, self.cell_mgmt._cell_mgmt.call_count)
+
+    def test_pdp_context_list_change_should_not_change_cache(self):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(return_value="1,internet,IP\n")
+        pdpc_list = self.cell_mgmt.pdp_context_list()
+
+        # act
+        pdpc_list[0]["apn"] = "TPC"
+        res = self.cell_mgmt.pdp_context_list()
+
+        # assert
+        self.assertEqual("internet", res[0]["apn"])
+        self.assertEqual(1, self.cell_mgmt._cell_mgmt.call_count)
+
+    def test_at_with_lock_timeout_should_raise_fail(self):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(return_value="\n\nOK\n\n")
+        lock = ModemLock()
+        holder = Thread(target=lambda: lock.acquire("start"))
+        holder.start()
+        holder.join()
+
+        # act and assert
+        with patch.object(CellMgmt, "_lock", lock), \
+                patch.object(CellMgmt, "LOCK_TIMEOUT_SEC", 0.01):
+            with self.assertRaises(CellMgmtLockTimeout):
+                self.cell_mgmt.at("at")
+        self.assertFalse(self.cell_mgmt._cell_mgmt.called)
+
+    @patch("cellular_utility.retry.sleep")
+    def test_operator_with_busy_should_retry_with_backoff(self, sleep):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(side_effect=[
+            ErrorReturnCode_60("cell_mgmt operator", "", ""),
+            ErrorReturnCode_60("cell_mgmt operator", "", ""),
+            "Chunghwa Telecom\n"])
+        retries = CellMgmt.retry_stats()["busy"]["retries"]
+
+        # act
+        res = self.cell_mgmt.operator()
+
+        # assert
+        self.assertEqual("Chunghwa Telecom", res)
+        self.assertEqual(2, sleep.call_count)
+        self.assertLess(sleep.call_args_list[0][0][0], 1)
+        self.assertEqual(
+            retries + 2, CellMgmt.retry_stats()["busy"]["retries"])
+
+    @patch("cellular_utility.retry.sleep")
+    def test_sim_status_with_busy_should_retry_not_nosim(self, sleep):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(side_effect=[
+            ErrorReturnCode_60("cell_mgmt sim_status", "", ""),
+            "+CPIN: READY\n"])
+
+        # act
+        res = self.cell_mgmt.sim_status()
+
+        # assert
+        self.assertEqual(SimStatus.ready, res)
+        self.assertEqual(1, sleep.call_count)
+
+    def test_commands_should_record_latency_per_subcommand(self):
+        # arrange
+        registry = MetricsRegistry()
+        self.cell_mgmt._sh_cell_mgmt = Mock(side_effect=[
+            "Chunghwa Telecom\n",
+            ErrorReturnCode_1("cell_mgmt sim_status", "", "")])
+
+        # act
+        with patch("cellular_utility.cell_mgmt.metrics", registry):
+            self.cell_mgmt.operator()
+            self.cell_mgmt.sim_status()
+
+        # assert
+        res = registry.snapshot()
+        self.assertEqual(1, res["cell_mgmt"]["operator"]["count"])
+        self.assertEqual(0, res["cell_mgmt"]["operator"]["errors"])
+        self.assertEqual(1, res["cell_mgmt"]["sim_status"]["errors"])
+        self.assertEqual(1, res["lock_wait"]["operator"]["count"])
+
+    def _fake_fw_at_batch(self):
+        responses = {
+            "AT+CGMR": "SWI9X15C_05.05.58.01 r27038 carmd-fwbuild1",
+            "AT!priid?": (
+                "PRI Part Number: 9904780\n"
+                "Carrier PRI: 9999999_9904609_SWI9X15C_05.05.58.01_00_"
+                "VZW_005.029_001\n"
+                "Carrier PRI: 9999999_9904594_SWI9X15C_05.05.58.00_00_"
+                "ATT_005.026_000"),
+            "AT!GOBIIMPREF?": (
+                "preferred fw version:   05.05.58.01\n"
+                "preferred carrier name: VZW\n"
+                "preferred config name:  VZW_005.029_001\n"
+                "current fw version:     05.05.58.01\n"
+                "current carrier name:   VZW\n"
+                "current config name:    VZW_005.029_001")
+        }
+        return Mock(side_effect=lambda cmds, stop_on_error=False: [
+            {"status": "ok",
+             "info": responses.get(cmd if isinstance(cmd, str) else cmd[0],
+                                   "")}
+            for cmd in cmds])
+
+    def test_get_cellular_fw_should_be_cached_per_module(self):
+        # arrange
+        self.cell_mgmt.at_batch = self._fake_fw_at_batch()
+        self.cell_mgmt.m_info = Mock(return_value=MInfo(
+            module="MC7354", wwan_node="wwan0", imei="359225050018813"))
+
+        # act
+        res = self.cell_mgmt.get_cellular_fw()
+        res["available"] = []
+        cached = self.cell_mgmt.get_cellular_fw()
+        self.cell_mgmt.m_info.return_value = MInfo(
+            module="MC7354", wwan_node="wwan0", imei="359225050018814")
+        other_module = self.cell_mgmt.get_cellular_fw()
+
+        # assert
+        self.assertEqual(2, self.cell_mgmt.at_batch.call_count)
+        self.assertEqual(
+            {"carrier": "VZW", "config": "VZW_005.029_001",
+             "fwver": "05.05.58.01"},
+            cached["current"])
+        self.assertEqual(2, len(cached["available"]))
+        self.assertEqual(cached, other_module)
+
+    def test_cached_cellular_fw_should_not_query_module(self):
+        # arrange
+        self.cell_mgmt.at_batch = self._fake_fw_at_batch()
+        minfo = MInfo(
+            module="MC7354", wwan_node="wwan0", imei="359225050018813")
+        self.cell_mgmt.m_info = Mock(return_value=minfo)
+        _, generation = CellMgmt._cache.lookup("m_info")
+        CellMgmt._cache.store("m_info", (), minfo, generation)
+
+        # act
+        before = CellMgmt.cached_cellular_fw()
+        self.cell_mgmt.get_cellular_fw()
+        after = CellMgmt.cached_cellular_fw()
+
+        # assert
+        self.assertIsNone(before)
+        self.assertEqual("05.05.58.01", after["current"]["fwver"])
+        self.assertEqual(1, self.cell_mgmt.at_batch.call_count)
+
+    def test_enter_engineering_mode_should_raise_when_refused(self):
+        # arrange
+        self.cell_mgmt.at_batch = Mock(return_value=[
+            {"status": "ok", "info": ""}, {"status": "err", "info": ""}])
+
+        # act & assert
+        with self.assertRaises(CellMgmtError):
+            self.cell_mgmt.enter_engineering_mode()
+
+    def test_power_cycle_should_invalidate_cellular_fw(self):
+        # arrange
+        self.cell_mgmt.at_batch = self._fake_fw_at_batch()
+        self.cell_mgmt.m_info = Mock(return_value=MInfo(
+            module="MC7354", wwan_node="wwan0", imei="359225050018813"))
+        self.cell_mgmt._cell_mgmt = Mock()
+        self.cell_mgmt.get_cellular_fw()
+
+        # act
+        with patch("cellular_utility.cell_mgmt.sleep"):
+            self.cell_mgmt.power_cycle()
+        self.cell_mgmt.get_cellular_fw()
+
+        # assert
+        self.assertEqual(2, self.cell_mgmt.at_batch.call_count)
+
+    def test_at_with_deadline_should_cap_cell_mgmt_timeout(self):
+        # arrange
+        sh_cell_mgmt = Mock(return_value="\n\nOK\n\n")
+        self.cell_mgmt._cell_mgmt = sh_default_timeout(sh_cell_mgmt, 70)
+
+        # act
+        with deadline(2):
+            self.cell_mgmt.at("at")
+
+        # assert
+        self.assertLessEqual(sh_cell_mgmt.call_args[1]["_timeout"], 2)
+
+    def test_sh_default_timeout_past_deadline_should_not_run(self):
+        # arrange
+        sh_cell_mgmt = Mock(return_value="\n\nOK\n\n")
+        sh = sh_default_timeout(sh_cell_mgmt, 70)
+
+        # act
+        with patch("cellular_utility.cell_mgmt.deadline_remaining",
+                   return_value=0.0):
+            with self.assertRaises(DeadlineExceeded):
+                sh("at")
+
+        # assert
+        self.assertFalse(sh_cell_mgmt.called)
+
+    def test_at_with_lock_held_past_deadline_should_raise_deadline(self):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(return_value="\n\nOK\n\n")
+        lock = ModemLock()
+        holder = Thread(target=lambda: lock.acquire("start"))
+        holder.start()
+        holder.join()
+
+        # act and assert
+        with patch.object(CellMgmt, "_lock", lock):
+            with self.assertRaises(CellMgmtDeadlineExceeded):
+                with deadline(0.05):
+                    self.cell_mgmt.at("at")
+
+    @patch("cellular_utility.retry.sleep")
+    def test_operator_with_busy_past_deadline_should_raise_deadline(
+            self, sleep):
+        # arrange
+        self.cell_mgmt._cell_mgmt = Mock(
+            side_effect=ErrorReturnCode_60("cell_mgmt operator", "", ""))
+
+        # act and assert
+        with self.assertRaises(CellMgmtDeadlineExceeded):
+            with deadline(0.3):
+                self.cell_mgmt.operator()
+        self.assertLess(self.cell_mgmt._cell_mgmt.call_count, 5)
+
 
 if __name__ == "__main__":
     FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.deadline import (
+        DeadlineExceeded, check, current, deadline, expired, remaining
+    )
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+@patch("cellular_utility.deadline.monotonic", return_value=100)
+class TestDeadline(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_remaining_without_deadline_should_be_default(self, monotonic):
+        # act and assert
+        self.assertIsNone(current())
+        self.assertIsNone(remaining())
+        self.assertEqual(70, remaining(70))
+        self.assertFalse(expired())
+
+    def test_remaining_should_be_capped_by_default(self, monotonic):
+        # act
+        with deadline(5):
+            monotonic.return_value = 102
+
+            # assert
+            self.assertEqual(3, remaining())
+            self.assertEqual(1, remaining(1))
+            self.assertEqual(3, remaining(70))
+        self.assertIsNone(current())
+
+    def test_nested_deadline_should_not_extend_outer(self, monotonic):
+        # act
+        with deadline(5):
+            with deadline(60):
+                # assert
+                self.assertEqual(105, current())
+            with deadline(1):
+                self.assertEqual(101, current())
+            self.assertEqual(105, current())
+
+    def test_check_after_deadline_should_raise_fail(self, monotonic):
+        # act
+        with deadline(5):
+            monotonic.return_value = 105
+
+            # assert
+            self.assertTrue(expired())
+            self.assertEqual(0, remaining(70))
+            with self.assertRaises(DeadlineExceeded):
+                check()
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
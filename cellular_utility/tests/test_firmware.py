@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from contextlib import contextmanager
+from threading import Event
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cell_mgmt import CellMgmtError
+    from cellular_utility.firmware import (
+        FirmwareJob, FirmwareJobBusy, FirmwareJobs
+    )
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class FakeCellMgmt(object):
+    def __init__(self):
+        self.calls = []
+        self.preference = {"status": "ok", "info": ""}
+        self.m_info_failures = 0
+        self.current = {"fwver": "05.05.58.01", "config": "ATT_005.029_001",
+                        "carrier": "ATT"}
+        self.power_cycle_release = None
+        self.engineering_mode_error = None
+
+    def enter_engineering_mode(self):
+        self.calls.append("enter_engineering_mode")
+        if self.engineering_mode_error is not None:
+            raise self.engineering_mode_error
+
+    def set_fw_preference(self, fwver, config, carrier):
+        self.calls.append("set_fw_preference")
+        return self.preference
+
+    def power_cycle(self, force=False, timeout_sec=60):
+        self.calls.append("power_cycle")
+        if self.power_cycle_release is not None:
+            self.power_cycle_release.wait()
+
+    def m_info(self):
+        self.calls.append("m_info")
+        if self.m_info_failures > 0:
+            self.m_info_failures -= 1
+            raise CellMgmtError
+        return None
+
+    def get_cellular_fw(self):
+        self.calls.append("get_cellular_fw")
+        return {"current": self.current}
+
+
+class TestFirmwareJob(unittest.TestCase):
+    def setUp(self):
+        self.cell_mgmt = FakeCellMgmt()
+        self.transitions = []
+        self.jobs = FirmwareJobs(
+            self.cell_mgmt,
+            callback=lambda job: self.transitions.append(job.state.name))
+        self._poll_sec = FirmwareJob.MODULE_BACK_POLL_SEC
+        FirmwareJob.MODULE_BACK_POLL_SEC = 0.01
+
+    def tearDown(self):
+        FirmwareJob.MODULE_BACK_POLL_SEC = self._poll_sec
+
+    def test_start_should_run_the_steps_until_verified(self):
+        # arrange
+        self.cell_mgmt.m_info_failures = 2
+
+        # act
+        job = self.jobs.start(
+            fwver="05.05.58.01", config="ATT_005.029_001", carrier="ATT")
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.verified, job.state)
+        self.assertEqual(
+            ["entering_engineering_mode", "setting_preference",
+             "power_cycling", "module_back", "verified"],
+            self.transitions)
+        self.assertEqual(
+            ["enter_engineering_mode", "set_fw_preference", "power_cycle",
+             "m_info", "m_info", "m_info", "get_cellular_fw"],
+            self.cell_mgmt.calls)
+        self.assertEqual(
+            ["pending"] + self.transitions,
+            [entry["state"] for entry in job.to_dict()["history"]])
+        self.assertIs(job, self.jobs.get(job.id))
+
+    def test_start_should_pause_around_the_steps(self):
+        # arrange
+        @contextmanager
+        def pause():
+            self.cell_mgmt.calls.append("pause")
+            yield
+            self.cell_mgmt.calls.append("resume")
+        jobs = FirmwareJobs(self.cell_mgmt, pause=pause)
+        self.cell_mgmt.power_cycle_release = Event()
+
+        # act
+        job = jobs.start(
+            fwver="05.05.58.01", config="ATT_005.029_001", carrier="ATT")
+        running = jobs.running()
+        self.cell_mgmt.power_cycle_release.set()
+        job.join(5)
+
+        # assert
+        self.assertIs(job, running)
+        self.assertIsNone(jobs.running())
+        self.assertEqual("pause", self.cell_mgmt.calls[0])
+        self.assertEqual("resume", self.cell_mgmt.calls[-1])
+
+    def test_start_should_fail_when_engineering_mode_refused(self):
+        # arrange
+        self.cell_mgmt.engineering_mode_error = CellMgmtError(
+            "AT!ENTERCND: err ")
+
+        # act
+        job = self.jobs.start(
+            fwver="05.05.58.01", config="ATT_005.029_001", carrier="ATT")
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.failed, job.state)
+        self.assertEqual(["enter_engineering_mode"], self.cell_mgmt.calls)
+
+    def test_start_should_fail_when_preference_rejected(self):
+        # arrange
+        self.cell_mgmt.preference = {"status": "err", "info": "ERROR"}
+
+        # act
+        job = self.jobs.start(
+            fwver="05.05.58.01", config="ATT_005.029_001", carrier="ATT")
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.failed, job.state)
+        self.assertNotIn("power_cycle", self.cell_mgmt.calls)
+        self.assertIn("ERROR", job.to_dict()["error"])
+
+    def test_start_should_fail_when_firmware_not_switched(self):
+        # act
+        job = self.jobs.start(
+            fwver="05.05.58.01", config="VZW_005.029_002", carrier="VZW")
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.failed, job.state)
+        self.assertEqual("module_back", self.transitions[-2])
+
+    def test_start_should_fail_when_module_not_back(self):
+        # arrange
+        FirmwareJob.MODULE_BACK_TIMEOUT_SEC, timeout_sec = \
+            0.05, FirmwareJob.MODULE_BACK_TIMEOUT_SEC
+        self.cell_mgmt.m_info_failures = 1000
+
+        # act
+        try:
+            job = self.jobs.start(
+                fwver="05.05.58.01", config="ATT_005.029_001",
+                carrier="ATT")
+            job.join(5)
+        finally:
+            FirmwareJob.MODULE_BACK_TIMEOUT_SEC = timeout_sec
+
+        # assert
+        self.assertEqual(FirmwareJob.State.failed, job.state)
+        self.assertEqual("module did not come back", job.error)
+
+    def test_start_should_raise_busy_while_a_job_runs(self):
+        # arrange
+        self.cell_mgmt.power_cycle_release = Event()
+        job = self.jobs.start(
+            fwver="05.05.58.01", config="ATT_005.029_001", carrier="ATT")
+
+        # act & assert
+        try:
+            with self.assertRaises(FirmwareJobBusy):
+                self.jobs.start(
+                    fwver="05.05.58.01", config="ATT_005.029_001",
+                    carrier="ATT")
+        finally:
+            self.cell_mgmt.power_cycle_release.set()
+            job.join(5)
+
+        self.assertEqual(
+            job.id + 1,
+            self.jobs.start(
+                fwver="05.05.58.01", config="ATT_005.029_001",
+                carrier="ATT").id)
+
+    def test_get_should_return_none_for_unknown_id(self):
+        # act & assert
+        self.assertIsNone(self.jobs.get(42))
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import subprocess
+import tempfile
+import unittest
+from mock import Mock
+from monotonic import monotonic
+from threading import Event, Thread, Timer
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cancel import CancelToken, Cancelled, cancel_scope
+    from cellular_utility.lock import ModemLock, ModemLockTimeout
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestModemLock(unittest.TestCase):
+    def setUp(self):
+        self.lock = ModemLock()
+
+    def tearDown(self):
+        pass
+
+    def _hold(self, name, hold_sec):
+        acquired = Event()
+
+        def _thread():
+            self.lock.acquire(name)
+            acquired.set()
+            sleep(hold_sec)
+            self.lock.release()
+
+        thread = Thread(target=_thread)
+        thread.start()
+        acquired.wait()
+        return thread
+
+    def test_acquire_should_be_reentrant(self):
+        # act
+        self.lock.acquire("get_cellular_fw")
+        self.lock.acquire("at")
+        self.lock.release()
+
+        # assert
+        self.assertEqual("get_cellular_fw", self.lock.owner())
+        self.lock.release()
+        self.assertIsNone(self.lock.owner())
+        self.assertEqual(1, self.lock.stats()["get_cellular_fw"]["count"])
+        self.assertNotIn("at", self.lock.stats())
+
+    def test_acquire_should_be_first_come_first_served(self):
+        # arrange
+        order = []
+        holder = self._hold("start", 0.2)
+
+        def _waiter(name):
+            self.lock.acquire(name)
+            order.append(name)
+            self.lock.release()
+
+        waiters = []
+        for name in ["signal_adv", "operator", "m_info"]:
+            waiters.append(Thread(target=_waiter, args=(name,)))
+            waiters[-1].start()
+            sleep(0.02)
+
+        # act
+        holder.join()
+        for waiter in waiters:
+            waiter.join()
+
+        # assert
+        self.assertEqual(["signal_adv", "operator", "m_info"], order)
+        stats = self.lock.stats()
+        self.assertGreaterEqual(stats["start"]["hold_max"], 0.2)
+        self.assertGreater(stats["signal_adv"]["wait_max"], 0.1)
+        self.assertEqual(3, stats["m_info"]["max_waiters"])
+
+    def test_acquire_with_timeout_should_raise_fail(self):
+        # arrange
+        holder = self._hold("start", 0.3)
+
+        # act and assert
+        with self.assertRaises(ModemLockTimeout):
+            self.lock.acquire("signal_adv", timeout=0.05)
+        holder.join()
+        self.assertEqual(1, self.lock.stats()["signal_adv"]["timeouts"])
+        self.assertEqual(0, self.lock.waiters())
+
+        # lock is still usable after a timeout
+        self.lock.acquire("signal_adv", timeout=0.05)
+        self.lock.release()
+
+    def test_acquire_with_timeout_should_wait_untimed(self):
+        # arrange
+        holder = self._hold("start", 0.3)
+        wait = self.lock._cond.wait
+        self.lock._cond.wait = Mock(wraps=wait)
+
+        # act
+        self.lock.acquire("signal_adv", timeout=5)
+        self.lock.release()
+        holder.join()
+
+        # assert
+        for call in self.lock._cond.wait.call_args_list:
+            self.assertEqual(((), {}), call)
+
+    def test_acquire_on_cancel_should_stop_waiting(self):
+        # arrange
+        holder = self._hold("start", 0.5)
+        token = CancelToken()
+        Timer(0.1, token.cancel).start()
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(Cancelled):
+            with cancel_scope(token):
+                self.lock.acquire("signal_adv")
+
+        # assert
+        self.assertLess(monotonic() - begin, 0.4)
+        self.assertEqual(0, self.lock.waiters())
+        holder.join()
+        self.lock.acquire("signal_adv")
+        self.lock.release()
+
+
+class TestModemLockFile(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mktemp()
+        self.lock = ModemLock(self.path)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def _flock_in_other_process(self, hold_sec):
+        return subprocess.Popen(
+            ["flock", self.path, "sleep", str(hold_sec)])
+
+    def test_acquire_should_wait_for_other_process(self):
+        # arrange
+        other = self._flock_in_other_process(0.3)
+        sleep(0.1)
+
+        # act
+        self.lock.acquire("signal_adv")
+        self.lock.release()
+
+        # assert
+        other.wait()
+        stats = self.lock.stats()["signal_adv"]
+        self.assertGreater(stats["ipc_wait_max"], 0.1)
+        self.assertGreaterEqual(stats["wait_max"], stats["ipc_wait_max"])
+
+    def test_acquire_should_block_other_process(self):
+        # arrange
+        self.lock.acquire("start")
+
+        # act
+        other = subprocess.Popen(["flock", "-n", self.path, "true"])
+        other.wait()
+        self.lock.release()
+
+        # assert
+        self.assertNotEqual(0, other.returncode)
+
+    def test_acquire_with_timeout_should_raise_fail(self):
+        # arrange
+        other = self._flock_in_other_process(0.3)
+        sleep(0.1)
+
+        # act and assert
+        with self.assertRaises(ModemLockTimeout):
+            self.lock.acquire("signal_adv", timeout=0.05)
+        self.assertIsNone(self.lock.owner())
+        other.wait()
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
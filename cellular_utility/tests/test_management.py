@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from monotonic import monotonic
+from threading import Timer
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cell_mgmt import (
+        CellMgmtError, NetworkInformation, SimStatus
+    )
+    from cellular_utility.management import Manager
+    from cellular_utility.profiler import ConnectProfiler, ConnectTrace
+    from cellular_utility.scheduler import CommandScheduler
+    from cellular_utility.urc import UrcEvent
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class FakeCellMgmt(object):
+    def __init__(self):
+        self.calls = []
+        self.apn = "internet"
+        self.attached = True
+        self.start_error = False
+
+    def sim_status(self):
+        self.calls.append("sim_status")
+        return SimStatus.ready
+
+    def stop(self):
+        self.calls.append("stop")
+        return NetworkInformation(
+            status=False, ip="", netmask="", gateway="", dns_list=[])
+
+    def pdp_context_list(self):
+        self.calls.append("pdp_context_list")
+        return [{"id": 1, "type": "ipv4v6", "apn": self.apn}]
+
+    def set_pdp_context(self, id, apn, type="ipv4v6"):
+        self.calls.append("set_pdp_context")
+        self.apn = apn
+
+    def attach(self):
+        self.calls.append("attach")
+        if isinstance(self.attached, list):
+            return self.attached.pop(0)
+        return self.attached
+
+    def start(self, apn, auth, username, password):
+        self.calls.append("start")
+        if self.start_error:
+            raise CellMgmtError
+        return NetworkInformation(
+            status=True, ip="10.24.42.11", netmask="255.255.255.252",
+            gateway="10.24.42.10", dns_list=["168.95.1.1"])
+
+    def status(self):
+        self.calls.append("status")
+        return True
+
+    def power_cycle(self, force=False, timeout_sec=60):
+        self.calls.append("power_cycle")
+
+
+class FakeUrcListener(object):
+    def __init__(self):
+        self.state = None
+
+    def registered(self):
+        return self.state
+
+    def subscribe(self, callback):
+        pass
+
+    def unsubscribe(self, callback):
+        pass
+
+
+class TestManagerConnect(unittest.TestCase):
+    def setUp(self):
+        self.cell_mgmt = FakeCellMgmt()
+        self.scheduler = CommandScheduler(self.cell_mgmt)
+        self.scheduler.start()
+        self.profiler = ConnectProfiler()
+        self.mgr = Manager(
+            dev_name="lo",
+            enabled=True,
+            pin=None,
+            pdp_context_static=True,
+            pdp_context_id=1,
+            pdp_context_primary_apn="internet",
+            pdp_context_primary_type="ipv4v6",
+            pdp_context_primary_auth="none",
+            pdp_context_retry_timeout=60,
+            keepalive_enabled=False,
+            keepalive_host="127.0.0.1",
+            keepalive_period_sec=60,
+            log_period_sec=60,
+            scheduler=self.scheduler,
+            profiler=self.profiler)
+        self.mgr.ATTACH_TIMEOUT_SEC = 0
+        # _connect() runs without the Manager thread, as if started
+        self.mgr._stop = False
+        del self.cell_mgmt.calls[:]
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def _connect(self, apn="internet"):
+        return self.mgr._connect(apn, "ipv4v6", "none", "", "")
+
+    def test_retry_should_skip_known_stop_and_pdp_context(self):
+        # arrange
+        self.cell_mgmt.attached = False
+        self.assertFalse(self._connect())
+        del self.cell_mgmt.calls[:]
+
+        # act
+        self.cell_mgmt.attached = True
+        res = self._connect()
+
+        # assert
+        self.assertTrue(res)
+        self.assertEqual(["attach", "start", "status"], self.cell_mgmt.calls)
+        self.assertTrue(self.mgr.network_information().status)
+
+    def test_retry_after_start_should_stop_again(self):
+        # arrange
+        self.cell_mgmt.start_error = True
+        self.assertFalse(self._connect())
+        del self.cell_mgmt.calls[:]
+
+        # act
+        self.cell_mgmt.start_error = False
+        res = self._connect()
+
+        # assert
+        self.assertTrue(res)
+        self.assertEqual(
+            ["stop", "attach", "start", "status"], self.cell_mgmt.calls)
+
+    def test_static_apn_should_be_set_once(self):
+        # arrange
+        self.cell_mgmt.attached = False
+
+        # act
+        self._connect(apn="TPC")
+        self._connect(apn="TPC")
+
+        # assert
+        self.assertEqual(1, self.cell_mgmt.calls.count("set_pdp_context"))
+        self.assertEqual(1, self.cell_mgmt.calls.count("sim_status"))
+        self.assertEqual(2, self.cell_mgmt.calls.count("pdp_context_list"))
+        self.assertEqual(1, self.cell_mgmt.calls.count("stop"))
+
+    def test_power_cycle_should_forget_connect_state(self):
+        # arrange
+        self.cell_mgmt.attached = False
+        self._connect()
+        self.mgr._power_cycle()
+        self.mgr._status = Manager.Status.ready
+        del self.cell_mgmt.calls[:]
+
+        # act
+        self._connect()
+
+        # assert
+        self.assertEqual(
+            ["stop", "pdp_context_list", "attach"], self.cell_mgmt.calls)
+
+    def test_connect_should_trace_attempts_in_progress(self):
+        # arrange
+        self.mgr._begin_trace("initialize")
+        self.cell_mgmt.attached = False
+        self._connect()
+
+        # act
+        self.cell_mgmt.attached = True
+        self._connect()
+        self.mgr._end_trace(ConnectTrace.Result.connected)
+
+        # assert
+        trace = self.profiler.traces()[0].to_dict()
+        self.assertEqual(1, len(self.profiler.traces()))
+        self.assertEqual("connected", trace["result"])
+        self.assertEqual(2, trace["attempts"])
+        self.assertEqual({"attach_timeout": 1}, trace["failures"])
+        self.assertEqual(
+            [("stop", 1), ("pdp_context", 1), ("attach", 1),
+             ("pdp_context", 2), ("attach", 2), ("start", 2), ("status", 2)],
+            [(phase["name"], phase["attempt"]) for phase in trace["phases"]])
+
+    def test_connect_should_trace_itself_without_trace(self):
+        # arrange
+        self.cell_mgmt.start_error = True
+
+        # act
+        self._connect()
+
+        # assert
+        trace = self.profiler.traces()[0]
+        self.assertEqual(ConnectTrace.Result.failed, trace.result)
+        self.assertEqual("start_error", trace.reason)
+        self.assertIsNone(self.mgr._trace)
+
+
+class TestManagerAttach(unittest.TestCase):
+    def setUp(self):
+        self.cell_mgmt = FakeCellMgmt()
+        self.scheduler = CommandScheduler(self.cell_mgmt)
+        self.scheduler.start()
+        self.urc_listener = FakeUrcListener()
+        self.mgr = Manager(
+            dev_name="lo",
+            enabled=True,
+            pin=None,
+            pdp_context_static=True,
+            pdp_context_id=1,
+            pdp_context_primary_apn="internet",
+            pdp_context_primary_type="ipv4v6",
+            pdp_context_primary_auth="none",
+            pdp_context_retry_timeout=60,
+            keepalive_enabled=False,
+            keepalive_host="127.0.0.1",
+            keepalive_period_sec=60,
+            log_period_sec=60,
+            scheduler=self.scheduler,
+            urc_listener=self.urc_listener)
+        self.mgr.ATTACH_TIMEOUT_SEC = 5
+        self.mgr.ATTACH_URC_POLL_SEC = 0.2
+        # _attach() runs without the Manager thread, as if started
+        self.mgr._stop = False
+        del self.cell_mgmt.calls[:]
+
+    def tearDown(self):
+        self.scheduler.stop()
+
+    def test_attach_should_query_while_reported_not_registered(self):
+        # arrange
+        self.urc_listener.state = False
+        self.cell_mgmt.attached = [False, True]
+        begin = monotonic()
+
+        # act
+        res = self.mgr._attach()
+
+        # assert
+        self.assertTrue(res)
+        self.assertLess(monotonic() - begin, 0.2 * 2)
+        self.assertEqual(["attach", "attach"], self.cell_mgmt.calls)
+        self.assertEqual(
+            Manager.Status.service_attached, self.mgr.status())
+
+    def test_attach_should_query_once_registration_reported(self):
+        # arrange
+        self.mgr.ATTACH_URC_POLL_SEC = 10
+        self.urc_listener.state = False
+        self.cell_mgmt.attached = [False, True]
+
+        def report():
+            self.urc_listener.state = True
+            self.mgr._on_urc(UrcEvent.parse("+CGREG: 1"))
+        Timer(0.1, report).start()
+        begin = monotonic()
+
+        # act
+        res = self.mgr._attach()
+
+        # assert
+        self.assertTrue(res)
+        self.assertLess(monotonic() - begin, 1)
+        self.assertEqual(["attach", "attach"], self.cell_mgmt.calls)
+
+    def test_attach_should_time_out(self):
+        # arrange
+        self.mgr.ATTACH_TIMEOUT_SEC = 0.3
+        self.urc_listener.state = False
+        self.cell_mgmt.attached = False
+
+        # act & assert
+        self.assertFalse(self.mgr._attach())
+        self.assertGreaterEqual(self.cell_mgmt.calls.count("attach"), 2)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.metrics import MetricsRegistry
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry(buckets=(0.1, 1.0))
+
+    def tearDown(self):
+        pass
+
+    def test_observe_should_count_cumulative_buckets(self):
+        # act
+        self.registry.observe("cell_mgmt", "signal", 0.05)
+        self.registry.observe("cell_mgmt", "signal", 0.1)
+        self.registry.observe("cell_mgmt", "signal", 0.5)
+        self.registry.observe("cell_mgmt", "signal", 3, error=True)
+
+        # assert
+        stats = self.registry.snapshot()["cell_mgmt"]["signal"]
+        self.assertEqual(
+            [[0.1, 2], [1.0, 3], ["+Inf", 4]], stats["buckets"])
+        self.assertEqual(4, stats["count"])
+        self.assertEqual(1, stats["errors"])
+        self.assertAlmostEqual(3.65, stats["sum"])
+
+    def test_timer_with_exception_should_count_error(self):
+        # act
+        with self.assertRaises(ValueError):
+            with self.registry.timer("vnstat", "dumpdb"):
+                raise ValueError
+        with self.registry.timer("vnstat", "dumpdb"):
+            pass
+
+        # assert
+        stats = self.registry.snapshot()["vnstat"]["dumpdb"]
+        self.assertEqual(2, stats["count"])
+        self.assertEqual(1, stats["errors"])
+
+    def test_exposition_should_be_prometheus_text(self):
+        # arrange
+        self.registry.describe("ping", "keepalive ping latency")
+        self.registry.observe("ping", "8.8.8.8", 0.5)
+
+        # act
+        res = self.registry.exposition()
+
+        # assert
+        self.assertEqual(
+            "# HELP sanji_cellular_ping_seconds keepalive ping latency\n"
+            "# TYPE sanji_cellular_ping_seconds histogram\n"
+            "sanji_cellular_ping_seconds_bucket{op=\"8.8.8.8\",le=\"0.1\"} 0\n"
+            "sanji_cellular_ping_seconds_bucket{op=\"8.8.8.8\",le=\"1.0\"} 1\n"
+            "sanji_cellular_ping_seconds_bucket"
+            "{op=\"8.8.8.8\",le=\"+Inf\"} 1\n"
+            "sanji_cellular_ping_seconds_sum{op=\"8.8.8.8\"} 0.500000\n"
+            "sanji_cellular_ping_seconds_count{op=\"8.8.8.8\"} 1\n"
+            "# TYPE sanji_cellular_ping_errors_total counter\n"
+            "sanji_cellular_ping_errors_total{op=\"8.8.8.8\"} 0\n",
+            res)
+
+
+    def test_exposition_should_include_counters_and_gauges(self):
+        # arrange
+        self.registry.describe("scheduler_depth", "modem commands queued")
+        self.registry.count("scheduler_coalesced", "signal")
+        self.registry.count("scheduler_coalesced", "signal", 2)
+        self.registry.gauge("scheduler_depth", None, 4)
+        self.registry.gauge("scheduler_depth", None, 3)
+
+        # act
+        res = self.registry.exposition()
+
+        # assert
+        self.assertEqual(
+            "# HELP sanji_cellular_scheduler_coalesced_total "
+            "scheduler_coalesced\n"
+            "# TYPE sanji_cellular_scheduler_coalesced_total counter\n"
+            "sanji_cellular_scheduler_coalesced_total{op=\"signal\"} 3\n"
+            "# HELP sanji_cellular_scheduler_depth modem commands queued\n"
+            "# TYPE sanji_cellular_scheduler_depth gauge\n"
+            "sanji_cellular_scheduler_depth 3\n",
+            res)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.parser import KeyValueParser
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestKeyValueParser(unittest.TestCase):
+    def setUp(self):
+        self.parser = KeyValueParser()
+
+    def tearDown(self):
+        pass
+
+    def test_parse_should_accept_both_separators(self):
+        # arrange
+        SUT = (
+            "LAC: 2817\n"
+            "CellID:01073AEE\r\n"
+            "Module=MC7354\n"
+            "no separator\n"
+            "DNS = 168.95.1.1 168.95.192.1 \n")
+
+        # act
+        res = self.parser.parse(SUT)
+
+        # assert
+        self.assertEqual(
+            {"LAC": "2817", "CellID": "01073AEE", "Module": "MC7354",
+             "DNS": "168.95.1.1 168.95.192.1"},
+            res)
+
+    def test_parse_should_keep_first_occurrence(self):
+        # arrange
+        SUT = "IMEI: 359225050018813\nIMEI: 0\nESN:\n"
+
+        # act
+        res = self.parser.parse(SUT)
+
+        # assert
+        self.assertEqual({"IMEI": "359225050018813", "ESN": ""}, res)
+
+    def test_parse_all_should_keep_repeated_keys(self):
+        # arrange
+        SUT = (
+            "Carrier PRI: 9999999_9902266_SWI9X15C_05.05.58.01_00_VZW\n"
+            "Carrier PRI: 9999999_9902574_SWI9X15C_05.05.58.01_00_ATT\n")
+
+        # act
+        res = self.parser.parse_all(SUT)
+
+        # assert
+        self.assertEqual(
+            [("Carrier PRI", "9999999_9902266_SWI9X15C_05.05.58.01_00_VZW"),
+             ("Carrier PRI", "9999999_9902574_SWI9X15C_05.05.58.01_00_ATT")],
+            res)
+
+    def test_parse_with_separator_should_split_at_first_one(self):
+        # arrange
+        parser = KeyValueParser(";")
+
+        # act
+        res = parser.parse("totalrx;857\nd;0;1459152201;0;0;857;4;1\n")
+
+        # assert
+        self.assertEqual(
+            {"totalrx": "857", "d": "0;1459152201;0;0;857;4;1"}, res)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from threading import Event
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.deadline import deadline, remaining
+    from cellular_utility.future import FutureTimeout, wait_all
+    from cellular_utility.pool import WorkerPool, WorkerPoolStopped
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestWorkerPool(unittest.TestCase):
+    def setUp(self):
+        self.pool = WorkerPool(2)
+        self.release = Event()
+
+    def tearDown(self):
+        self.release.set()
+        self.pool.stop()
+
+    def _block(self):
+        self.release.wait()
+        return "blocked"
+
+    def test_submit_should_run_at_most_max_workers_at_once(self):
+        # arrange
+        futures = [self.pool.submit(self._block) for _ in range(3)]
+        sleep(0.1)
+
+        # act
+        done = wait_all(futures, 0.1)
+        stats = self.pool.stats()
+        self.release.set()
+
+        # assert
+        self.assertFalse(done)
+        self.assertEqual(2, stats["workers"])
+        self.assertEqual(1, stats["depth"])
+        self.assertTrue(wait_all(futures, 5))
+        self.assertEqual(
+            ["blocked"] * 3, [future.result(0) for future in futures])
+
+    def test_submit_should_hand_over_deadline(self):
+        # act
+        with deadline(5):
+            future = self.pool.submit(remaining)
+
+        # assert
+        self.assertGreater(future.result(5), 4)
+        self.assertIsNone(self.pool.submit(remaining).result(5))
+
+    def test_result_should_raise_exception_of_function(self):
+        # act
+        future = self.pool.submit(int, "n/a")
+
+        # assert
+        with self.assertRaises(ValueError):
+            future.result(5)
+        self.assertIsInstance(future.exception(), ValueError)
+
+    def test_result_with_timeout_should_raise_future_timeout(self):
+        # act
+        future = self.pool.submit(self._block)
+
+        # assert
+        with self.assertRaises(FutureTimeout):
+            future.result(0.05)
+
+    def test_wait_all_should_honor_deadline(self):
+        # arrange
+        future = self.pool.submit(self._block)
+
+        # act
+        with deadline(0.1):
+            done = wait_all([future], 60)
+
+        # assert
+        self.assertFalse(done)
+
+    def test_submit_after_stop_should_raise(self):
+        # arrange
+        self.pool.stop()
+
+        # act & assert
+        with self.assertRaises(WorkerPoolStopped):
+            self.pool.submit(self._block)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.profiler import (
+        ConnectProfiler, ConnectTrace, _percentile
+    )
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestConnectTrace(unittest.TestCase):
+    def setUp(self):
+        self.trace = ConnectTrace(1, "drop", {"carrier": "ATT"})
+
+    def test_phase_should_be_recorded_with_its_attempt(self):
+        # arrange
+        self.trace.attempt()
+        with self.trace.phase("stop"):
+            pass
+        self.trace.attempt()
+
+        # act
+        with self.trace.phase("attach"):
+            pass
+
+        # assert
+        self.assertEqual(
+            [("stop", 1), ("attach", 2)],
+            [(phase["name"], phase["attempt"])
+             for phase in self.trace.phases()])
+        self.assertEqual(["attach"],
+                         [phase["name"] for phase in self.trace.phases(2)])
+
+    def test_phase_should_record_the_error(self):
+        # act
+        with self.assertRaises(ValueError):
+            with self.trace.phase("start"):
+                raise ValueError
+
+        # assert
+        self.assertEqual("ValueError", self.trace.phases()[0]["error"])
+
+    def test_finish_should_keep_the_first_result(self):
+        # arrange
+        self.trace.fail("attach_timeout")
+        self.trace.fail("attach_timeout")
+        self.trace.finish(ConnectTrace.Result.connected)
+
+        # act
+        self.trace.finish(ConnectTrace.Result.stopped)
+
+        # assert
+        res = self.trace.to_dict()
+        self.assertEqual("connected", res["result"])
+        self.assertEqual("attach_timeout", res["reason"])
+        self.assertEqual({"attach_timeout": 2}, res["failures"])
+        self.assertIsNotNone(self.trace.time_to_connect())
+
+    def test_time_to_connect_should_be_none_unless_connected(self):
+        # act
+        self.trace.finish(ConnectTrace.Result.failed)
+
+        # assert
+        self.assertIsNone(self.trace.time_to_connect())
+
+    def test_to_dict_should_tell_in_progress(self):
+        # act
+        res = self.trace.to_dict()
+
+        # assert
+        self.assertIsNone(res["result"])
+        self.assertEqual("drop", res["trigger"])
+        self.assertEqual({"carrier": "ATT"}, res["labels"])
+
+
+class TestConnectProfiler(unittest.TestCase):
+    def _trace(self, profiler, carrier, result, attempts=1):
+        trace = profiler.begin("initialize", {"carrier": carrier})
+        for _ in xrange(attempts):
+            trace.attempt()
+        trace.finish(result)
+        return trace
+
+    def test_begin_should_keep_the_last_traces(self):
+        # arrange
+        profiler = ConnectProfiler(keep=2)
+
+        # act
+        traces = [profiler.begin("drop") for _ in xrange(3)]
+
+        # assert
+        self.assertEqual(traces[1:], profiler.traces())
+        self.assertIsNone(profiler.get(traces[0].id))
+        self.assertIs(traces[2], profiler.get(traces[2].id))
+
+    def test_stats_should_count_finished_traces(self):
+        # arrange
+        profiler = ConnectProfiler()
+        self._trace(profiler, "ATT", ConnectTrace.Result.connected)
+        failed = self._trace(
+            profiler, "ATT", ConnectTrace.Result.failed, attempts=2)
+        failed.fail("attach_timeout")
+        profiler.begin("drop")
+
+        # act
+        res = profiler.stats()
+
+        # assert
+        self.assertEqual(2, res["traces"])
+        self.assertEqual(1, res["connected"])
+        self.assertEqual(3, res["attempts"])
+        self.assertEqual({"attach_timeout": 1}, res["failures"])
+        self.assertIsNotNone(res["timeToConnect"]["p50"])
+
+    def test_stats_should_group_by_label(self):
+        # arrange
+        profiler = ConnectProfiler()
+        self._trace(profiler, "ATT", ConnectTrace.Result.connected)
+        self._trace(profiler, "VZW", ConnectTrace.Result.failed)
+
+        # act
+        res = profiler.stats(group_by="carrier")
+
+        # assert
+        self.assertEqual(["ATT", "VZW"], sorted(res.keys()))
+        self.assertEqual(1, res["ATT"]["connected"])
+        self.assertEqual(0, res["VZW"]["connected"])
+        self.assertIsNone(res["VZW"]["timeToConnect"]["max"])
+
+    def test_percentile_should_be_nearest_rank(self):
+        # arrange
+        values = range(1, 11)
+
+        # assert
+        self.assertEqual(5, _percentile(values, 50))
+        self.assertEqual(9, _percentile(values, 90))
+        self.assertEqual(10, _percentile(values, 99))
+        self.assertIsNone(_percentile([], 50))
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import struct
+import unittest
+from mock import Mock, patch
+from monotonic import monotonic
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    patch('cellular_utility.cell_mgmt.retrying', lambda x: x).start()
+    from cellular_utility.cell_mgmt import CellMgmt, SimStatus
+    from cellular_utility.qmi import (
+        QmiBackend, QmiClient, QmiError, QmiRequest, QmiResultError
+    )
+    from cellular_utility.tests.fake_qmi import FakeQmi
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+def profile_settings(request):
+    index = struct.unpack_from("<BB", request[0x01])[1]
+    return {
+        1: {0x11: "\x00", 0x14: "internet"},
+        2: {0x11: "\x03", 0x14: "TPC"}
+    }[index]
+
+
+# recorded from an MC7354 on UMTS
+RESPONSES = {
+    # NAS get signal strength: -71 dBm on UMTS, EcIo -3.5 dB
+    (0x03, 0x0020): (
+        "\x01\x02\x00\xb9\x05"
+        "\x12\x03\x00\x01\x07\x05"),
+    # NAS get serving system: registered, CS/PS attached, UMTS,
+    # 466-92 Chunghwa Telecom, LAC 2817, CellID 01073AEE
+    (0x03, 0x0024): (
+        "\x01\x06\x00\x01\x01\x01\x01\x01\x05"
+        "\x12\x15\x00\xd2\x01\x5c\x00\x10Chunghwa Telecom"
+        "\x1d\x02\x00\x17\x28"
+        "\x1e\x04\x00\xee\x3a\x07\x01"),
+    # DMS UIM get PIN status: PIN1 disabled, 3 retries
+    (0x02, 0x002B): "\x11\x03\x00\x03\x03\x0a",
+    (0x02, 0x003C): "\x01\x14\x0089886920041308467183",
+    (0x02, 0x0043): "\x01\x0f\x00466920411401101",
+    (0x02, 0x0025): {0x11: "359225050018813"},
+    # WDS get profile list: 3GPP profile 1 and 2
+    (0x01, 0x002A): "\x01\x07\x00\x02\x00\x01\x00\x00\x02\x00",
+    (0x01, 0x002B): profile_settings,
+}
+
+
+class TestQmiClient(unittest.TestCase):
+    def setUp(self):
+        self.qmi = FakeQmi(dict(RESPONSES))
+        self.client = QmiClient(self.qmi.fd)
+
+    def tearDown(self):
+        self.client.close()
+        self.qmi.close()
+
+    def test_request_should_allocate_client_id_once(self):
+        # act
+        self.client.request(QmiClient.NAS, 0x0020)
+        tlvs = self.client.request(QmiClient.NAS, 0x0020)
+
+        # assert
+        self.assertEqual("\xb9\x05", tlvs[0x01])
+        self.assertEqual(
+            [(0x00, 0x0022), (0x03, 0x0020), (0x03, 0x0020)],
+            [(service, message_id)
+             for service, message_id, _ in self.qmi.received])
+
+    def test_requests_in_flight_should_be_matched_by_transaction(self):
+        # arrange
+        self.client.client_id(QmiClient.NAS)
+        self.client.client_id(QmiClient.DMS)
+
+        # act
+        requests = [
+            self.client.send(QmiClient.NAS, 0x0020),
+            self.client.send(QmiClient.DMS, 0x003C),
+            self.client.send(QmiClient.NAS, 0x0024)]
+        responses = [request.wait(1) for request in requests]
+
+        # assert
+        self.assertEqual(3, self.qmi.max_inflight)
+        self.assertEqual("\xb9\x05", responses[0][0x01])
+        self.assertEqual("89886920041308467183", responses[1][0x01])
+        self.assertIn(0x12, responses[2])
+
+    def test_failure_result_should_raise_result_error(self):
+        # act and assert
+        with self.assertRaises(QmiResultError) as context:
+            self.client.request(QmiClient.DMS, 0x0026)
+        self.assertEqual(0x005E, context.exception.error)
+
+    def test_hang_up_should_fail_pending_requests(self):
+        # arrange
+        self.client.client_id(QmiClient.NAS)
+        self.qmi.hang_up()
+
+        # act and assert
+        with self.assertRaises(QmiError):
+            self.client.request(QmiClient.NAS, 0x0020, timeout=1)
+
+    def test_ctl_indication_should_not_answer_request(self):
+        # arrange
+        request = QmiRequest(QmiClient.CTL, 0x0022)
+        self.client._pending[(QmiClient.CTL, 0, 1)] = request
+        sdu = struct.pack("<BBHH", QmiClient.CTL_INDICATION, 1, 0x0027, 0)
+        frame = struct.pack(
+            "<BHBBB", 0x01, 5 + len(sdu), 0x80, QmiClient.CTL, 0) + sdu
+
+        # act
+        self.client._dispatch(frame)
+
+        # assert
+        self.assertIs(request, self.client._pending[(QmiClient.CTL, 0, 1)])
+
+    def test_malformed_frame_should_be_dropped(self):
+        # arrange
+        self.client.client_id(QmiClient.NAS)
+
+        # act: a frame too short for the QMUX header
+        os.write(self.qmi._sock.fileno(), "\x01\x04\x00\x80\x03")
+        tlvs = self.client.request(QmiClient.NAS, 0x0020, timeout=1)
+
+        # assert
+        self.assertTrue(self.client._thread.is_alive())
+        self.assertEqual("\xb9\x05", tlvs[0x01])
+
+    def test_close_should_release_client_ids(self):
+        # arrange
+        self.client.request(QmiClient.NAS, 0x0020)
+        self.client.request(QmiClient.DMS, 0x003C)
+
+        # act
+        self.client.close()
+        self.client.request(QmiClient.NAS, 0x0020)
+        self.client.close()
+
+        # assert
+        self.assertEqual(
+            [(QmiClient.DMS, 2), (QmiClient.NAS, 1), (QmiClient.NAS, 3)],
+            sorted(self.qmi.released))
+        self.assertEqual(
+            [(0x00, 0x0022), (0x03, 0x0020), (0x00, 0x0022), (0x02, 0x003C),
+             (0x00, 0x0023), (0x00, 0x0023),
+             (0x00, 0x0022), (0x03, 0x0020), (0x00, 0x0023)],
+            [(service, message_id)
+             for service, message_id, _ in self.qmi.received])
+
+    def test_close_should_wake_idle_reader(self):
+        # arrange
+        self.client.request(QmiClient.NAS, 0x0020)
+        thread = self.client._thread
+        begin = monotonic()
+
+        # act
+        self.client.close()
+
+        # assert
+        self.assertFalse(thread.is_alive())
+        self.assertLess(monotonic() - begin, 0.1)
+
+
+class TestQmiBackend(unittest.TestCase):
+    @patch("cellular_utility.cell_mgmt.Command")
+    def setUp(self, mock_command):
+        CellMgmt._cache.clear()
+        self.qmi = FakeQmi(dict(RESPONSES))
+        self.fallback = Mock(return_value="")
+        self.cell_mgmt = CellMgmt()
+        self.cell_mgmt._sh_cell_mgmt = self.fallback
+        CellMgmt.set_backend(QmiBackend(self.qmi.fd))
+
+    def tearDown(self):
+        CellMgmt.set_backend(None)
+        self.qmi.close()
+
+    def test_queries_should_be_parsed_by_cell_mgmt(self):
+        # act
+        signal = self.cell_mgmt.signal_adv()
+
+        # assert
+        self.assertEqual(21, signal.csq)
+        self.assertEqual(-71, signal.rssi_dbm)
+        self.assertEqual(-3.5, signal.ecio_dbm)
+        self.assertEqual("umts", signal.mode)
+        self.assertEqual(SimStatus.ready, self.cell_mgmt.sim_status())
+        self.assertEqual(3, self.cell_mgmt.get_pin_retry_remain())
+        self.assertTrue(self.cell_mgmt.attach())
+        self.assertEqual("Chunghwa Telecom", self.cell_mgmt.operator())
+        self.assertEqual(
+            [{"id": 1, "type": "ipv4", "apn": "internet"},
+             {"id": 2, "type": "ipv4v6", "apn": "TPC"}],
+            self.cell_mgmt.pdp_context_list())
+        self.assertFalse(self.fallback.called)
+
+    def test_batch_should_keep_queries_in_flight_at_once(self):
+        # act
+        res = self.cell_mgmt.batch(
+            ["signal_adv", "operator", "location_info", "sim_info"])
+
+        # assert
+        self.assertEqual(5, self.qmi.max_inflight)
+        self.assertEqual(-71, res["signal_adv"].rssi_dbm)
+        self.assertEqual("Chunghwa Telecom", res["operator"])
+        self.assertEqual("2817", res["location_info"].lac)
+        self.assertEqual("01073AEE", res["location_info"].cell_id)
+        self.assertEqual("89886920041308467183", res["sim_info"].iccid)
+        self.assertEqual("466920411401101", res["sim_info"].imsi)
+        self.assertFalse(self.fallback.called)
+
+    def test_sim_not_inserted_should_be_nosim(self):
+        # arrange
+        self.qmi.responses[(0x02, 0x002B)] = {
+            0x02: struct.pack("<HH", 1, 0x0003)}
+
+        # act and assert
+        self.assertEqual(SimStatus.nosim, self.cell_mgmt.sim_status())
+
+    def test_truncated_response_should_fallback_to_cell_mgmt(self):
+        # arrange
+        self.qmi.responses[(0x03, 0x0024)] = {0x01: "\x01"}
+        self.fallback.return_value = "CS: attached\nPS: attached\n"
+
+        # act and assert
+        self.assertTrue(self.cell_mgmt.attach())
+        self.fallback.assert_called_once_with("attach_status")
+
+    def test_start_should_fallback_to_cell_mgmt(self):
+        # arrange
+        self.fallback.return_value = (
+            "IP=10.24.42.11\n"
+            "SubnetMask=255.255.255.252\n"
+            "Gateway=10.24.42.10\n"
+            "DNS=168.95.1.1\n")
+
+        # act
+        nwk_info = self.cell_mgmt.start(apn="internet")
+
+        # assert
+        self.assertEqual("10.24.42.11", nwk_info.ip)
+        self.assertEqual("start", self.fallback.call_args[0][0])
+
+    def test_device_gone_should_fallback_to_cell_mgmt(self):
+        # arrange
+        CellMgmt.set_backend(QmiBackend("/dev/nonexistent"))
+        self.fallback.return_value = "Chunghwa Telecom\n"
+
+        # act
+        res = self.cell_mgmt.operator()
+
+        # assert
+        self.assertEqual("Chunghwa Telecom", res)
+        self.fallback.assert_called_once_with("operator")
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import Mock, patch
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cancel import CancelToken, Cancelled, cancel_scope
+    from cellular_utility.retry import RetryPolicy
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class BusyError(Exception):
+    pass
+
+
+class TestRetryPolicy(unittest.TestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(
+            max_attempts=5, initial_delay_sec=0.1, max_delay_sec=0.5,
+            multiplier=2, jitter=0)
+
+    def tearDown(self):
+        pass
+
+    def test_delay_should_grow_exponentially_up_to_max(self):
+        # act
+        delays = [self.policy.delay(retry) for retry in xrange(1, 6)]
+
+        # assert
+        self.assertEqual([0.1, 0.2, 0.4, 0.5, 0.5], delays)
+
+    @patch("cellular_utility.retry.random.random", return_value=1.0)
+    def test_delay_with_jitter_should_be_shortened(self, random):
+        # arrange
+        policy = RetryPolicy(initial_delay_sec=0.1, jitter=0.5)
+
+        # act and assert
+        self.assertAlmostEqual(0.05, policy.delay(1))
+
+    @patch("cellular_utility.retry.sleep")
+    def test_call_should_retry_until_success(self, sleep):
+        # arrange
+        func = Mock(side_effect=[BusyError(), BusyError(), "ok"])
+
+        # act
+        res = self.policy.call(
+            lambda exc: isinstance(exc, BusyError), func, "at")
+
+        # assert
+        self.assertEqual("ok", res)
+        self.assertEqual(3, func.call_count)
+        self.assertEqual(
+            [0.1, 0.2], [c[0][0] for c in sleep.call_args_list])
+        stats = self.policy.stats()
+        self.assertEqual(1, stats["calls"])
+        self.assertEqual(2, stats["retries"])
+        self.assertEqual(0, stats["gave_up"])
+
+    @patch("cellular_utility.retry.sleep")
+    def test_call_should_not_retry_other_error(self, sleep):
+        # arrange
+        func = Mock(side_effect=ValueError())
+
+        # act and assert
+        with self.assertRaises(ValueError):
+            self.policy.call(lambda exc: isinstance(exc, BusyError), func)
+        self.assertEqual(1, func.call_count)
+        self.assertFalse(sleep.called)
+
+    @patch("cellular_utility.retry.sleep")
+    def test_call_should_give_up_after_max_attempts(self, sleep):
+        # arrange
+        func = Mock(side_effect=BusyError())
+
+        # act and assert
+        with self.assertRaises(BusyError):
+            self.policy.call(lambda exc: True, func)
+        self.assertEqual(5, func.call_count)
+        self.assertEqual(1, self.policy.stats()["gave_up"])
+        self.assertEqual(4, self.policy.stats()["max_retries"])
+
+    @patch("cellular_utility.retry.sleep")
+    @patch("cellular_utility.retry.monotonic", return_value=100)
+    def test_call_should_give_up_at_deadline(self, monotonic, sleep):
+        # arrange
+        policy = RetryPolicy(
+            max_attempts=10, initial_delay_sec=1, max_delay_sec=10,
+            jitter=0, deadline_sec=2.5)
+        func = Mock(side_effect=BusyError())
+        sleep.side_effect = lambda sec: setattr(
+            monotonic, "return_value", monotonic.return_value + sec)
+
+        # act and assert
+        with self.assertRaises(BusyError):
+            policy.call(lambda exc: True, func)
+        # 1st retry after 1s, 2nd retry would end at 3s
+        self.assertEqual(2, func.call_count)
+
+    def test_call_on_cancel_should_stop_retrying(self):
+        # arrange
+        token = CancelToken()
+
+        def func():
+            token.cancel()
+            raise BusyError()
+
+        # act and assert
+        with self.assertRaises(Cancelled):
+            with cancel_scope(token):
+                self.policy.call(lambda exc: True, func)
+        with self.assertRaises(Cancelled):
+            self.policy.call(lambda exc: True, Mock(side_effect=Cancelled()))
+        self.assertEqual(1, self.policy.stats()["gave_up"])
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from monotonic import monotonic
+from threading import Timer
+from sh import (
+    ErrorReturnCode, ErrorReturnCode_3, ErrorReturnCode_127,
+    SignalException_SIGTERM, TimeoutException
+)
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cancel import CancelToken, Cancelled, cancel_scope
+    from cellular_utility.runner import Command, run
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestRunner(unittest.TestCase):
+    def setUp(self):
+        self.sh = Command("sh")
+
+    def tearDown(self):
+        pass
+
+    def test_command_should_return_stdout(self):
+        # act
+        res = self.sh("-c", "echo CSQ: 21; echo ignored >&2")
+
+        # assert
+        self.assertEqual("CSQ: 21\n", res)
+
+    def test_command_with_exit_code_should_raise_error_return_code(self):
+        # act
+        with self.assertRaises(ErrorReturnCode_3) as context:
+            self.sh("-c", "echo out; echo err >&2; exit 3")
+
+        # assert
+        self.assertEqual(3, context.exception.exit_code)
+        self.assertEqual("out\n", context.exception.stdout)
+        self.assertEqual("err\n", context.exception.stderr)
+        self.assertIsInstance(context.exception, ErrorReturnCode)
+
+    def test_command_killed_by_signal_should_raise_signal_exception(self):
+        # act & assert
+        with self.assertRaises(SignalException_SIGTERM):
+            self.sh("-c", "kill -TERM $$")
+
+    def test_command_with_timeout_should_be_killed(self):
+        # arrange
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(TimeoutException):
+            self.sh("-c", "sleep 10", _timeout=0.2)
+
+        # assert
+        self.assertLess(monotonic() - begin, 2)
+
+    def test_command_with_zero_timeout_should_be_killed(self):
+        # arrange
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(TimeoutException):
+            self.sh("-c", "sleep 10", _timeout=0)
+
+        # assert
+        self.assertLess(monotonic() - begin, 2)
+
+    def test_command_on_cancel_should_be_killed(self):
+        # arrange
+        token = CancelToken()
+        Timer(0.2, token.cancel).start()
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(Cancelled):
+            with cancel_scope(token):
+                self.sh("-c", "sleep 10", _timeout=70)
+
+        # assert
+        self.assertLess(monotonic() - begin, 2)
+        with self.assertRaises(Cancelled):
+            with cancel_scope(token):
+                self.sh("-c", "echo not run")
+
+    def test_command_leaving_daemon_should_not_wait_for_it(self):
+        # arrange
+        begin = monotonic()
+
+        # act
+        res = self.sh("-c", "sleep 5 & echo started")
+
+        # assert
+        self.assertEqual("started\n", res)
+        self.assertLess(monotonic() - begin, 2)
+
+    def test_run_not_found_should_raise_127(self):
+        # act & assert
+        with self.assertRaises(ErrorReturnCode_127):
+            run(["/nonexistent/cell_mgmt", "signal"])
+
+    def test_command_with_unknown_argument_should_raise_type_error(self):
+        # act & assert
+        with self.assertRaises(TypeError):
+            self.sh("-c", "true", _tty_out=False)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import patch
+from monotonic import monotonic
+from threading import Event, Thread, Timer
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cancel import (
+        CancelToken, cancel_scope, current as current_token
+    )
+    from cellular_utility.cell_mgmt import (
+        CellMgmtCancelled, CellMgmtError, CellMgmtDeadlineExceeded
+    )
+    from cellular_utility.deadline import deadline, remaining
+    from cellular_utility.metrics import MetricsRegistry
+    from cellular_utility.scheduler import (
+        CommandScheduler, CommandSchedulerStopped, Priority
+    )
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class FakeCellMgmt(object):
+    def __init__(self):
+        self.calls = []
+        self.holding = Event()
+        self.release = Event()
+
+    def hold(self):
+        self.holding.set()
+        self.release.wait()
+
+    def status(self):
+        self.hold()
+        return "status"
+
+    def signal(self):
+        self.calls.append("signal")
+        return "signal"
+
+    def start(self):
+        self.calls.append("start")
+
+    def pdp_context_list(self):
+        self.calls.append("pdp_context_list")
+        return remaining()
+
+    def operator(self):
+        self.calls.append("operator")
+        return current_token()
+
+    def sim_status(self):
+        raise CellMgmtError("sim_status")
+
+    def get_cellular_module_ids(self):
+        self.calls.append("get_cellular_module_ids")
+        return [{"id": 0}]
+
+
+class TestCommandScheduler(unittest.TestCase):
+    def setUp(self):
+        self.cell_mgmt = FakeCellMgmt()
+        self.scheduler = CommandScheduler(self.cell_mgmt)
+        self.scheduler.start()
+
+    def tearDown(self):
+        self.cell_mgmt.release.set()
+        self.scheduler.stop()
+
+    def _hold(self):
+        future = self.scheduler.submit(Priority.control, "hold")
+        self.cell_mgmt.holding.wait()
+        return future
+
+    def test_call_should_serve_user_before_background(self):
+        # arrange
+        hold = self._hold()
+        futures = [
+            self.scheduler.submit(Priority.background, "signal"),
+            self.scheduler.submit(Priority.control, "start"),
+            self.scheduler.submit(Priority.user, "pdp_context_list")
+        ]
+
+        # act
+        self.cell_mgmt.release.set()
+        hold.result(1)
+        for future in futures:
+            future.result(1)
+
+        # assert
+        self.assertEqual(
+            ["pdp_context_list", "start", "signal"], self.cell_mgmt.calls)
+        stats = self.scheduler.stats()
+        self.assertEqual(0, stats["depth"])
+        self.assertEqual(3, stats["max_depth"])
+        self.assertEqual(1, stats["priorities"]["user"]["count"])
+        self.assertGreater(stats["priorities"]["background"]["wait_max"], 0)
+
+    def test_call_should_serve_short_before_long_of_same_priority(self):
+        # arrange
+        hold = self._hold()
+        start = self.scheduler.submit(Priority.control, "start")
+        signal = self.scheduler.submit(Priority.control, "signal")
+
+        # act
+        self.cell_mgmt.release.set()
+        hold.result(1)
+        start.result(1)
+        signal.result(1)
+
+        # assert
+        self.assertEqual(["signal", "start"], self.cell_mgmt.calls)
+
+    def test_call_should_age_waiting_background_commands(self):
+        # arrange
+        self.scheduler.AGING_SEC = 0.05
+        hold = self._hold()
+        start = self.scheduler.submit(Priority.background, "start")
+        sleep(0.3)
+        signal = self.scheduler.submit(Priority.user, "signal")
+
+        # act
+        self.cell_mgmt.release.set()
+        hold.result(1)
+        start.result(1)
+        signal.result(1)
+
+        # assert
+        self.assertEqual(["start", "signal"], self.cell_mgmt.calls)
+
+    def test_call_should_return_result_and_hand_over_deadline(self):
+        # act
+        with deadline(5):
+            res = self.scheduler.call(Priority.user, "pdp_context_list")
+
+        # assert
+        self.assertGreater(res, 4)
+        self.assertIsNone(
+            self.scheduler.call(Priority.user, "pdp_context_list"))
+
+    def test_call_with_expired_deadline_should_not_run_queued(self):
+        # arrange
+        self._hold()
+
+        # act
+        with self.assertRaises(CellMgmtDeadlineExceeded):
+            with deadline(0.1):
+                self.scheduler.call(Priority.user, "signal")
+        self.cell_mgmt.release.set()
+        self.scheduler.call(Priority.user, "start")
+
+        # assert
+        self.assertEqual(["start"], self.cell_mgmt.calls)
+
+    def test_call_should_not_wait_for_running_past_deadline(self):
+        # arrange
+        self.scheduler.DEADLINE_GRACE_SEC = 0.1
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(CellMgmtDeadlineExceeded):
+            with deadline(0.1):
+                self.scheduler.call(Priority.user, "hold")
+
+        # assert
+        self.assertLess(monotonic() - begin, 0.5)
+        self.assertEqual("hold", self.scheduler.stats()["running"])
+
+    def test_call_should_hand_over_cancel_token(self):
+        # arrange
+        token = CancelToken()
+
+        # act
+        with cancel_scope(token):
+            res = self.scheduler.call(Priority.user, "operator")
+
+        # assert
+        self.assertIs(token, res)
+        self.assertIsNone(self.scheduler.call(Priority.user, "operator"))
+
+    def test_call_on_cancel_should_not_wait_for_queued(self):
+        # arrange
+        self._hold()
+        token = CancelToken()
+        Timer(0.1, token.cancel).start()
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(CellMgmtCancelled):
+            with cancel_scope(token):
+                self.scheduler.call(Priority.user, "signal")
+        self.cell_mgmt.release.set()
+        self.scheduler.call(Priority.user, "start")
+
+        # assert
+        self.assertLess(monotonic() - begin, 1)
+        self.assertEqual(["start"], self.cell_mgmt.calls)
+
+    def test_submit_should_not_coalesce_other_cancel_token(self):
+        # arrange
+        hold = self._hold()
+        token = CancelToken()
+        with cancel_scope(token):
+            first = self.scheduler.submit(Priority.user, "signal")
+        second = self.scheduler.submit(Priority.user, "signal")
+
+        # act
+        self.cell_mgmt.release.set()
+        hold.result(1)
+
+        # assert
+        self.assertIsNot(first, second)
+        self.assertEqual("signal", second.result(1))
+
+    def test_proxy_should_raise_command_exception(self):
+        # arrange
+        cell_mgmt = self.scheduler.proxy(Priority.control)
+
+        # act & assert
+        self.assertEqual("signal", cell_mgmt.signal())
+        with self.assertRaises(CellMgmtError):
+            cell_mgmt.sim_status()
+
+    def test_submit_should_coalesce_identical_read_commands(self):
+        # arrange
+        hold = self._hold()
+        futures = [
+            self.scheduler.submit(Priority.background, "signal"),
+            self.scheduler.submit(Priority.control, "start"),
+            self.scheduler.submit(Priority.control, "start"),
+            self.scheduler.submit(Priority.user, "signal"),
+            self.scheduler.submit(Priority.user, "signal")
+        ]
+
+        # act
+        self.cell_mgmt.release.set()
+        hold.result(1)
+        results = [future.result(1) for future in futures]
+
+        # assert
+        self.assertEqual(
+            ["signal", None, None, "signal", "signal"], results)
+        self.assertEqual(["signal", "start", "start"], self.cell_mgmt.calls)
+        self.assertEqual(
+            {"signal": 2}, self.scheduler.stats()["coalesced"])
+
+    def test_coalesced_and_depth_should_be_exported(self):
+        # arrange
+        registry = MetricsRegistry()
+        with patch("cellular_utility.scheduler.metrics", registry):
+            hold = self._hold()
+            futures = [
+                self.scheduler.submit(Priority.user, "signal"),
+                self.scheduler.submit(Priority.user, "signal"),
+                self.scheduler.submit(Priority.control, "start")
+            ]
+
+            # act
+            depth = registry.gauges()["scheduler_depth"][None]
+            self.cell_mgmt.release.set()
+            hold.result(1)
+            for future in futures:
+                future.result(1)
+
+        # assert
+        self.assertEqual(2, depth)
+        self.assertEqual(0, registry.gauges()["scheduler_depth"][None])
+        self.assertEqual(
+            {"signal": 1}, registry.counters()["scheduler_coalesced"])
+        self.assertIn(
+            "sanji_cellular_scheduler_coalesced_total{op=\"signal\"} 1",
+            registry.exposition())
+
+    def test_coalesced_callers_should_get_own_result(self):
+        # arrange
+        hold = self._hold()
+        first = self.scheduler.submit(Priority.user, "get_cellular_module_ids")
+        second = self.scheduler.submit(
+            Priority.user, "get_cellular_module_ids")
+        self.cell_mgmt.release.set()
+        hold.result(1)
+
+        # act
+        first.result(1)[0]["id"] = 1
+
+        # assert
+        self.assertIs(first, second)
+        self.assertEqual([{"id": 0}], second.result(1))
+        self.assertEqual(["get_cellular_module_ids"], self.cell_mgmt.calls)
+
+    def test_coalesced_caller_should_wait_within_own_deadline(self):
+        # arrange
+        self.scheduler.DEADLINE_GRACE_SEC = 0.1
+        with deadline(5):
+            first = self.scheduler.submit(Priority.user, "status")
+        self.cell_mgmt.holding.wait()
+        begin = monotonic()
+
+        # act
+        with self.assertRaises(CellMgmtDeadlineExceeded):
+            with deadline(0.1):
+                self.scheduler.call(Priority.user, "status")
+        elapsed = monotonic() - begin
+        self.cell_mgmt.release.set()
+
+        # assert
+        self.assertLess(elapsed, 0.5)
+        self.assertEqual("status", first.result(1))
+        self.assertEqual(
+            {"status": 1}, self.scheduler.stats()["coalesced"])
+
+    def test_cancel_should_keep_command_of_other_coalesced_callers(self):
+        # arrange
+        hold = self._hold()
+        first = self.scheduler.submit(Priority.user, "signal")
+        second = self.scheduler.submit(Priority.user, "signal")
+
+        # act
+        cancelled = first.cancel()
+        self.cell_mgmt.release.set()
+        hold.result(1)
+
+        # assert
+        self.assertTrue(cancelled)
+        self.assertEqual("signal", second.result(1))
+        self.assertEqual(["signal"], self.cell_mgmt.calls)
+
+    def test_stop_should_fail_queued_commands(self):
+        # arrange
+        hold = self._hold()
+        signal = self.scheduler.submit(Priority.user, "signal")
+
+        # act
+        stopper = Thread(target=self.scheduler.stop)
+        stopper.start()
+        sleep(0.1)
+        self.cell_mgmt.release.set()
+        stopper.join()
+
+        # assert
+        hold.result(1)
+        with self.assertRaises(CommandSchedulerStopped):
+            signal.result(1)
+        with self.assertRaises(CommandSchedulerStopped):
+            self.scheduler.submit(Priority.user, "signal")
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
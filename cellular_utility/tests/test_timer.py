@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from monotonic import monotonic
+from Queue import Queue
+from threading import Condition, Event
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.timer import Timer
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestTimer(unittest.TestCase):
+    def setUp(self):
+        self.timer = Timer("test.timer")
+        self.runs = Queue()
+
+    def tearDown(self):
+        self.timer.stop()
+
+    def test_call_later_should_run_once_after_delay(self):
+        # act
+        begin = monotonic()
+        self.timer.call_later(0.2, lambda: self.runs.put(monotonic()))
+
+        # assert
+        self.assertGreaterEqual(self.runs.get(timeout=5) - begin, 0.2)
+        sleep(0.3)
+        self.assertTrue(self.runs.empty())
+
+    def test_call_every_should_run_now_and_every_period(self):
+        # act
+        begin = monotonic()
+        self.timer.call_every(0.1, lambda: self.runs.put(monotonic()))
+        runs = [self.runs.get(timeout=5) - begin for _ in xrange(3)]
+
+        # assert
+        self.assertLess(runs[0], 0.1)
+        self.assertGreaterEqual(runs[1] - runs[0], 0.1)
+        self.assertGreaterEqual(runs[2] - runs[1], 0.1)
+
+    def test_call_every_should_take_returned_delay(self):
+        # arrange
+        def func():
+            self.runs.put(monotonic())
+            return 0.3
+
+        # act
+        self.timer.call_every(0.01, func)
+        runs = [self.runs.get(timeout=5) for _ in xrange(2)]
+
+        # assert
+        self.assertGreaterEqual(runs[1] - runs[0], 0.3)
+
+    def test_wake_should_run_before_period(self):
+        # arrange
+        task = self.timer.call_every(60, lambda: self.runs.put(monotonic()))
+        self.runs.get(timeout=5)
+
+        # act
+        begin = monotonic()
+        task.wake()
+
+        # assert
+        self.assertLess(self.runs.get(timeout=5) - begin, 1)
+
+    def test_wake_while_running_should_run_again_after(self):
+        # arrange
+        release = Event()
+
+        def func():
+            self.runs.put(monotonic())
+            release.wait()
+        task = self.timer.call_every(60, func)
+        self.runs.get(timeout=5)
+
+        # act
+        task.wake()
+        release.set()
+
+        # assert
+        self.runs.get(timeout=5)
+
+    def test_cancel_should_stop_runs(self):
+        # arrange
+        task = self.timer.call_later(0.2, lambda: self.runs.put(1))
+
+        # act
+        task.cancel()
+        sleep(0.4)
+
+        # assert
+        self.assertTrue(task.cancelled())
+        self.assertTrue(self.runs.empty())
+
+    def test_idle_timer_should_not_wake_up(self):
+        # arrange
+        self.timer.call_later(0.1, lambda: self.runs.put(1))
+        self.timer.call_later(60, lambda: None)
+        self.runs.get(timeout=5)
+
+        # act
+        sleep(1)
+
+        # assert
+        self.assertLessEqual(self.timer.stats()["wakeups"], 3)
+        self.assertEqual(1, self.timer.stats()["tasks"])
+
+    def test_stop_should_drop_pending_tasks(self):
+        # arrange
+        task = self.timer.call_later(0.2, lambda: self.runs.put(1))
+
+        # act
+        self.timer.stop()
+        sleep(0.3)
+
+        # assert
+        self.assertTrue(task.cancelled())
+        self.assertTrue(self.runs.empty())
+
+    def test_stopped_timer_should_start_again(self):
+        # arrange
+        self.timer.call_later(0, lambda: self.runs.put(1))
+        self.runs.get(timeout=5)
+        self.timer.stop()
+
+        # act
+        self.timer.call_later(0, lambda: self.runs.put(2))
+
+        # assert
+        self.assertEqual(2, self.runs.get(timeout=5))
+
+    def test_notify_later_should_not_wait_for_busy_workers(self):
+        # arrange
+        release = Event()
+        for _ in xrange(Timer.MAX_WORKERS):
+            self.timer.call_later(0, release.wait)
+        cond = Condition()
+
+        # act
+        begin = monotonic()
+        with cond:
+            self.timer.notify_later(0.1, cond)
+            cond.wait(5)
+        release.set()
+
+        # assert
+        self.assertLess(monotonic() - begin, 4)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+from mock import Mock
+from monotonic import monotonic
+from Queue import Queue, Empty
+from time import sleep
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.at_session import AtSession
+    from cellular_utility.tests.fake_modem import FakeModem
+    from cellular_utility.urc import UrcEvent, UrcListener
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+RESPONSES = {
+    "AT+CREG=2": [],
+    "AT+CGREG=2": [],
+    "AT+CEREG=2": [],
+    "AT+CMER=3,0,0,1": [],
+    "AT+CGREG?": ["+CGREG: 2,0"],
+    "AT+CEREG?": ["+CEREG: 2,0"],
+    "AT+CSQ": ["+CSQ: 21,99"],
+}
+
+
+class TestUrcEvent(unittest.TestCase):
+    def test_parse_should_split_params(self):
+        # act
+        event = UrcEvent.parse("+CEREG: 5,\"2817\",\"01073AEE\",7")
+
+        # assert
+        self.assertEqual("+CEREG", event.name)
+        self.assertEqual(["5", "2817", "01073AEE", "7"], event.params)
+        self.assertTrue(event.registered())
+
+    def test_registered_should_be_none_for_other_urcs(self):
+        # act & assert
+        self.assertIsNone(UrcEvent.parse("+CIEV: 2,3").registered())
+        self.assertIsNone(UrcEvent.parse("RING").registered())
+        self.assertFalse(UrcEvent.parse("+CGREG: 2").registered())
+
+
+class TestUrcListener(unittest.TestCase):
+    def setUp(self):
+        self.modem = FakeModem(dict(RESPONSES))
+        self.session = AtSession(self.modem.port)
+        self.listener = UrcListener(self.session)
+        self.events = Queue()
+        self.listener.subscribe(self.events.put)
+
+    def tearDown(self):
+        self.listener.stop()
+        self.session.close()
+        self.modem.close()
+
+    def _next_event(self, name):
+        while True:
+            event = self.events.get(timeout=5)
+            if event.name == name:
+                return event
+
+    def test_start_should_enable_reports_and_read_current_state(self):
+        # act
+        self.listener.start()
+        event = self._next_event("+CEREG")
+
+        # assert
+        for cmd in UrcListener.ENABLE_COMMANDS:
+            self.assertIn(cmd, self.modem.received)
+        self.assertEqual(["0"], event.params)
+        self.assertFalse(self.listener.registered())
+
+    def test_urc_between_commands_should_be_dispatched(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+
+        # act
+        self.modem.send_urc("+CEREG: 1,\"2817\",\"01073AEE\",7")
+        event = self._next_event("+CEREG")
+        self.modem.send_urc("+CIEV: 2,4")
+        signal = self._next_event("+CIEV")
+
+        # assert
+        self.assertEqual("01073AEE", event.params[2])
+        self.assertTrue(self.listener.registered())
+        self.assertEqual(["2", "4"], signal.params)
+
+    def test_urc_during_command_should_be_dispatched(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+
+        def csq(cmd):
+            self.modem.send_urc("+CGREG: 5")
+            return ["+CSQ: 21,99"]
+        self.modem.responses["AT+CSQ"] = csq
+
+        # act
+        res = self.session.command("AT+CSQ")
+        event = self._next_event("+CGREG")
+
+        # assert
+        self.assertEqual("\r\n+CSQ: 21,99\r\n\r\nOK\r\n", res)
+        self.assertEqual(["5"], event.params)
+        self.assertTrue(self.listener.registered())
+
+    def test_port_in_use_should_be_waited_for(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+        self.session.read_urcs = Mock(wraps=self.session.read_urcs)
+
+        # act
+        with self.session.lock:
+            self.modem.send_urc("+CGREG: 5")
+            sleep(0.5)
+        event = self._next_event("+CGREG")
+
+        # assert
+        self.assertEqual(["5"], event.params)
+        self.assertLessEqual(self.session.read_urcs.call_count, 3)
+
+    def test_idle_listener_should_not_wake_up(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+        self.session.read_urcs = Mock(wraps=self.session.read_urcs)
+
+        # act
+        sleep(1.5)
+        calls = self.session.read_urcs.call_count
+        begin = monotonic()
+        self.listener.stop()
+
+        # assert
+        self.assertEqual(0, calls)
+        self.assertLess(monotonic() - begin, 0.5)
+
+    def test_reopen_should_enable_reports_again(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+        del self.modem.received[:]
+
+        # act
+        self.session.close()
+        self._next_event("+CEREG")
+
+        # assert
+        self.assertIn("AT+CEREG=2", self.modem.received)
+
+    def test_unsubscribe_should_stop_callbacks(self):
+        # arrange
+        self.listener.start()
+        self._next_event("+CEREG")
+
+        # act
+        self.listener.unsubscribe(self.events.put)
+        self.modem.send_urc("+CEREG: 1")
+
+        # assert
+        with self.assertRaises(Empty):
+            self.events.get(timeout=0.5)
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Utility Test")
+    unittest.main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import os
+import sys
+import logging
+import unittest
+
+try:
+    sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from cellular_utility.cell_mgmt import (
+        CellularLocation, NetworkInformation, Signal
+    )
+    from cellular_utility.management import CellularInformation
+except ImportError as e:
+    print os.path.dirname(os.path.realpath(__file__)) + "/../"
+    print sys.path
+    print e
+    print "Please check the python PATH for import test module. (%s)" \
+        % __file__
+    exit(1)
+
+dirpath = os.path.dirname(os.path.realpath(__file__))
+
+
+class TestValue(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def _cinfo(self, csq=21):
+        return CellularInformation(
+            "lte", csq, -73, -3.5, "Chunghwa Telecom", "2817", "",
+            "", "01073AEE", "")
+
+    def test_same_samples_should_be_equal(self):
+        # assert
+        self.assertEqual(self._cinfo(), self._cinfo())
+        self.assertEqual(hash(self._cinfo()), hash(self._cinfo()))
+        self.assertNotEqual(self._cinfo(), self._cinfo(csq=20))
+
+    def test_equal_values_of_other_types_should_differ(self):
+        # assert
+        self.assertNotEqual(
+            CellularLocation(cell_id="01073AEE", lac="2817"),
+            Signal())
+        self.assertNotEqual(Signal(), None)
+
+    def test_network_information_with_dns_list_should_be_hashable(self):
+        # arrange
+        info = NetworkInformation(
+            True, "10.24.42.11", "255.255.255.252", "10.24.42.10",
+            ["168.95.1.1"])
+
+        # act
+        infos = set([info, NetworkInformation(
+            True, "10.24.42.11", "255.255.255.252", "10.24.42.10",
+            ["168.95.1.1"])])
+
+        # assert
+        self.assertEqual(1, len(infos))
+
+    def test_value_should_be_immutable(self):
+        # arrange
+        info = NetworkInformation(
+            True, "10.24.42.11", "255.255.255.252", "10.24.42.10",
+            ["168.95.1.1"])
+
+        # act
+        info.dns_list.append("168.95.192.1")
+
+        # assert
+        self.assertEqual(["168.95.1.1"], info.dns_list)
+        with self.assertRaises(AttributeError):
+            info._ip = "10.24.42.12"
+        with self.assertRaises(AttributeError):
+            del info._ip
+        self.assertEqual("10.24.42.11", info.ip)
+
+    def test_value_should_have_no_instance_dict(self):
+        # assert
+        self.assertFalse(hasattr(Signal(), "__dict__"))
+        with self.assertRaises(AttributeError):
+            self._cinfo().signal_csq = 0
+        self.assertEqual(
+            "Signal(mode='none', rssi_dbm=0, ecio_dbm=0.0, csq=0)",
+            repr(Signal()))
+
+
+if __name__ == "__main__":
+    FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
+    logging.basicConfig(level=20, format=FORMAT)
+    logger = logging.getLogger("Cellular Test")
+    unittest.main()
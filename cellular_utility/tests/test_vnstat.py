@@ -31,9 +31,9 @@ class TestVnStat(unittest.TestCase):
     def tearDown(self):
         pass
 
-    @patch("vnstat.sh")
+    @patch("vnstat.Command")
     def test_vnstat_get_usage_with_huge_txrx_output_should_raise_fail(
-            self, sh):
+            self, command):
         # arrange
         interface = VnStat("wwan0")
         return_text = '''version;3
@@ -58,7 +58,11 @@ d;5;0;0;0;0;0;0
 d;6;0;0;0;0;0;0
 d;7;0;0;0;0;0;0
 '''
-        sh.vnstat = Mock(return_value=return_text)
+        commands = {
+            "vnstat": Mock(return_value=return_text),
+            "service": Mock()
+        }
+        command.side_effect = lambda name: commands[name]
 
         # act and assert
         with self.assertRaises(VnStatError):
@@ -66,7 +70,7 @@ d;7;0;0;0;0;0;0
 
         # more asserts
         self.assertEquals(
-            sh.vnstat.call_args_list,
+            commands["vnstat"].call_args_list,
             [
                 call("-i", "wwan0", "--dumpdb"),
                 call("-i", "wwan0", "--delete", "--force")
@@ -74,7 +78,7 @@ d;7;0;0;0;0;0;0
         )
 
         self.assertEquals(
-            sh.service.call_args_list,
+            commands["service"].call_args_list,
             [
                 call('vnstat', 'stop'),
                 call('vnstat', 'start')
@@ -0,0 +1,284 @@
+"""
+Delayed and periodic tasks of the bundle on one timer thread.
+
+    task = timer.call_every(30, observe)
+    task.wake()      # run it now, then every 30s again
+    task.cancel()
+
+    timer.notify_later(10, cond)
+
+The timer thread sleeps in select() until the next task is due. A timed
+Condition.wait() of Python 2 polls every 50ms and sleep(1) loops wake up
+every second, so waiting threads should let notify_later() wake them up
+and keep their own timeout only as a safety bound.
+"""
+
+import errno
+import heapq
+import logging
+import os
+import select
+from itertools import count
+from monotonic import monotonic
+from threading import Lock, Thread
+from traceback import format_exc
+
+from cellular_utility.pool import WorkerPool
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class TimerTask(object):
+    """Handle of a scheduled function, see Timer."""
+
+    def __init__(self, timer, func, args, kwargs, period, inline=False):
+        self._timer = timer
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._period = period
+        self._inline = inline
+
+        # guarded by the timer lock
+        self._when = None
+        self._generation = None
+        self._running = False
+        self._cancelled = False
+        self._woken = False
+
+    @property
+    def period(self):
+        return self._period
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        """Do not run it again, a run in progress finishes."""
+        self._timer._cancel(self)
+
+    def wake(self):
+        """Run it as soon as possible instead of waiting for its time."""
+        self._timer._wake(self)
+
+    def _run(self):
+        """Return the delay until the next run of a periodic task."""
+        try:
+            delay = self._func(*self._args, **self._kwargs)
+        except Exception:
+            _logger.warning(format_exc())
+            delay = None
+
+        return self._period if delay is None else delay
+
+
+class Timer(object):
+    """
+    Run functions after a delay or periodically. The timer thread only
+    dispatches, functions run on a small worker pool, so a slow one
+    does not hold back the others. A periodic task never overlaps with
+    itself, the period counts from the end of a run. A stopped timer
+    starts again with the next scheduled task.
+    """
+
+    # a slow observation and a logger leave one for quick wake-ups
+    MAX_WORKERS = 3
+
+    def __init__(self, name="sanji.cellular.timer"):
+        self._name = name
+
+        self._lock = Lock()
+        self._heap = []
+        self._seq = count()
+        self._thread = None
+        self._pool = None
+        # bumped by stop(), tasks of an older generation are dropped
+        self._generation = 0
+
+        # written to wake the timer thread up
+        self._wakeup_r, self._wakeup_w = None, None
+
+        self._wakeups = 0
+        self._runs = 0
+
+    def call_later(self, delay, func, *args, **kwargs):
+        """Run func(*args, **kwargs) once after delay seconds."""
+        task = TimerTask(self, func, args, kwargs, None)
+        self._schedule(task, delay)
+        return task
+
+    def notify_later(self, delay, cond):
+        """
+        Notify all waiters of cond after delay seconds. It runs on the
+        timer thread itself, so busy workers do not hold the wake-up
+        back.
+        """
+        task = TimerTask(self, self._notify_all, (cond,), {}, None, True)
+        self._schedule(task, delay)
+        return task
+
+    def call_every(self, period, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) now and every period seconds. func may
+        return the delay until its next run instead.
+        """
+        task = TimerTask(self, func, args, kwargs, period)
+        self._schedule(task, 0)
+        return task
+
+    def stop(self):
+        """Drop the pending tasks, finish the running ones."""
+        with self._lock:
+            self._generation += 1
+            thread, self._thread = self._thread, None
+            pool, self._pool = self._pool, None
+            wakeup_r, wakeup_w = self._wakeup_r, self._wakeup_w
+            self._wakeup_r, self._wakeup_w = None, None
+            for _, _, task in self._heap:
+                task._cancelled = True
+            self._heap = []
+        if thread is None:
+            return
+
+        os.write(wakeup_w, "x")
+        thread.join()
+        pool.stop()
+
+        os.close(wakeup_r)
+        os.close(wakeup_w)
+
+    def stats(self):
+        """
+        Return dict like:
+            {
+                "tasks": 3,
+                "wakeups": 120,
+                "runs": 118
+            }
+        Wakeups count how often the timer thread woke up.
+        """
+        with self._lock:
+            return {
+                "tasks": len(self._heap),
+                "wakeups": self._wakeups,
+                "runs": self._runs
+            }
+
+    def _schedule(self, task, delay):
+        with self._lock:
+            task._generation = self._generation
+            task._when = monotonic() + delay
+            heapq.heappush(self._heap, (task._when, next(self._seq), task))
+            first = self._heap[0][2] is task
+
+            if self._thread is None:
+                # started on demand, importing this module spawns nothing
+                self._wakeup_r, self._wakeup_w = os.pipe()
+                self._pool = WorkerPool(self.MAX_WORKERS, self._name)
+                self._thread = Thread(
+                    name=self._name, target=self._main_thread,
+                    args=(self._generation, self._wakeup_r, self._pool))
+                self._thread.daemon = True
+                self._thread.start()
+
+        if first:
+            self._notify()
+
+    def _cancel(self, task):
+        with self._lock:
+            task._cancelled = True
+            self._remove(task)
+
+    def _wake(self, task):
+        with self._lock:
+            if task._cancelled:
+                return
+            if task._running:
+                # run again once the current run is over
+                task._woken = True
+                return
+            self._remove(task)
+            task._when = monotonic()
+            heapq.heappush(self._heap, (task._when, next(self._seq), task))
+        self._notify()
+
+    def _remove(self, task):
+        for index, (_, _, queued) in enumerate(self._heap):
+            if queued is task:
+                self._heap[index] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                return
+
+    def _notify(self):
+        try:
+            os.write(self._wakeup_w, "x")
+        except (OSError, TypeError):
+            # not started or already stopped
+            pass
+
+    def _notify_all(self, cond):
+        with cond:
+            cond.notify_all()
+
+    def _main_thread(self, generation, wakeup_r, pool):
+        while True:
+            inline = []
+            with self._lock:
+                if self._generation != generation:
+                    return
+
+                now = monotonic()
+                while self._heap and self._heap[0][0] <= now:
+                    _, _, task = heapq.heappop(self._heap)
+                    task._running = True
+                    self._runs += 1
+                    if task._inline:
+                        inline.append(task)
+                    else:
+                        pool.submit(self._run, task)
+
+            # outside the lock, they may take locks of their own
+            for task in inline:
+                self._run(task)
+
+            with self._lock:
+                timeout = None if not self._heap \
+                    else max(0, self._heap[0][0] - monotonic())
+
+            try:
+                readable = select.select([wakeup_r], [], [], timeout)[0]
+            except select.error as exc:
+                if exc.args[0] != errno.EINTR:
+                    raise
+                continue
+
+            with self._lock:
+                self._wakeups += 1
+            if readable:
+                os.read(wakeup_r, 4096)
+
+    def _run(self, task):
+        delay = task._run()
+
+        with self._lock:
+            task._running = False
+            woken, task._woken = task._woken, False
+            if task._generation != self._generation:
+                # the timer was stopped while it ran
+                task._cancelled = True
+            if task._cancelled or task._period is None:
+                return
+            if woken:
+                delay = 0
+
+            task._when = monotonic() + delay
+            heapq.heappush(self._heap, (task._when, next(self._seq), task))
+            first = self._heap[0][2] is task
+
+        if first:
+            self._notify()
+
+
+# shared by all modules
+timer = Timer()
@@ -0,0 +1,251 @@
+"""
+Unsolicited result codes (URC) of the modem as in-process events.
+
+    listener = UrcListener(backend.session)
+    listener.subscribe(callback)     # callback(UrcEvent)
+    listener.start()
+    ...
+    listener.registered()            # PS registered, None if not reported
+
+Registration (+CREG, +CGREG, +CEREG) and indicator (+CIEV, like signal)
+reports are enabled on the AT port and read between commands, queries
+keep using the same AtSession.
+"""
+
+import errno
+import logging
+import os
+import select
+from threading import Lock, Thread
+from traceback import format_exc
+
+from cellular_utility.at_session import AtSessionError
+from cellular_utility.value import Value
+
+_logger = logging.getLogger("sanji.cellular")
+
+
+class UrcEvent(Value):
+    """
+    One unsolicited result code, like
+        +CEREG: 1,"2817","01073AEE",7
+    is name "+CEREG" with params ["1", "2817", "01073AEE", "7"].
+    """
+
+    __slots__ = ["_name", "_params"]
+
+    REGISTRATIONS = ("+CREG", "+CGREG", "+CEREG")
+
+    # 3GPP TS 27.007 <stat>: registered home network, roaming
+    _registered_stats = ("1", "5")
+
+    def __init__(self, name, params=None):
+        self._name = name
+        self._params = () if params is None else tuple(params)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def params(self):
+        """Return a new list, the value itself cannot change."""
+        return list(self._params)
+
+    @classmethod
+    def parse(cls, line):
+        name, sep, params = line.partition(":")
+        if not sep:
+            return cls(line.strip())
+        return cls(name.strip(), [
+            param.strip().strip("\"") for param in params.split(",")])
+
+    def is_registration(self):
+        return self._name in self.REGISTRATIONS
+
+    def registered(self):
+        """
+        Return True if it reports registered, False if not,
+        None if it is not a registration report.
+        """
+        if not self.is_registration() or not self._params:
+            return None
+        return self._params[0] in self._registered_stats
+
+
+class UrcListener(object):
+    """
+    Read URCs from the AT port in the background and call the
+    subscribers with a UrcEvent for each of them. Subscribers are called
+    with the port held and should return quickly.
+    """
+
+    ENABLE_COMMANDS = [
+        # <stat>,<lac>,<ci>,<AcT> on registration and cell changes
+        "AT+CREG=2", "AT+CGREG=2", "AT+CEREG=2",
+        # +CIEV on indicator changes, signal among them
+        "AT+CMER=3,0,0,1"]
+
+    # how long to wait before trying again after an error
+    RETRY_SEC = 1.0
+
+    def __init__(self, session):
+        self._session = session
+        session.set_urc_callback(self._dispatch)
+        # a closed port is reopened and enabled again
+        session.set_close_callback(self._wake)
+
+        self._lock = Lock()
+        self._callbacks = []
+        # "+CEREG": UrcEvent, the last one of each registration
+        self._registrations = {}
+
+        # reporting is enabled again whenever the port is reopened
+        self._enabled_open_count = None
+
+        self._stop = True
+        self._thread = None
+        # written by stop() and on close to wake the reader out of select()
+        self._wakeup = None
+
+    def subscribe(self, callback):
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def registered(self):
+        """
+        Return True if the module reported PS registration (+CGREG or
+        +CEREG), False if it reported not registered, None if unknown.
+        """
+        with self._lock:
+            states = [
+                self._registrations[name].registered()
+                for name in ("+CGREG", "+CEREG")
+                if name in self._registrations]
+        if not states:
+            return None
+        return any(states)
+
+    def start(self):
+        self._stop = False
+        self._wakeup = os.pipe()
+
+        self._thread = Thread(
+            name="sanji.cellular.urc", target=self._main_thread,
+            args=(self._wakeup[0],))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+
+        self._stop = True
+        wakeup = self._wakeup
+        self._wake()
+        self._thread.join()
+
+        self._thread = None
+        self._wakeup = None
+        os.close(wakeup[0])
+        os.close(wakeup[1])
+
+    def _wake(self):
+        wakeup = self._wakeup
+        if wakeup is None:
+            return
+        try:
+            os.write(wakeup[1], "x")
+        except OSError:
+            # already stopped
+            pass
+
+    def _main_thread(self, wakeup):
+        while not self._stop:
+            try:
+                if self._session.open_count != self._enabled_open_count or \
+                        not self._session.is_open():
+                    self._enable()
+
+                self._wait_readable(wakeup)
+                if not self._session.read_urcs():
+                    # a command holds the port and dispatches the URCs
+                    # it reads, wait for it to finish
+                    with self._session.lock:
+                        pass
+
+            except AtSessionError as exc:
+                _logger.debug("urc: {}".format(exc))
+                self._wait(wakeup, timeout=self.RETRY_SEC)
+
+            except Exception:
+                _logger.error("should not reach here")
+                _logger.warning(format_exc())
+                self._wait(wakeup, timeout=self.RETRY_SEC)
+
+    def _enable(self):
+        # module state is unknown until it reports again
+        with self._lock:
+            self._registrations = {}
+
+        with self._session.lock:
+            self._session.open()
+            for cmd in self.ENABLE_COMMANDS:
+                output = self._session.command(cmd)
+                if not output.rstrip("\r\n").endswith("OK"):
+                    _logger.info("urc: {} not supported".format(cmd))
+            self._enabled_open_count = self._session.open_count
+
+            # current PS registration, "+CEREG: <n>,<stat>,..." is the
+            # URC form prefixed with <n>
+            for name in ("+CGREG", "+CEREG"):
+                output = self._session.command("AT{}?".format(name))
+                for line in output.split("\r\n"):
+                    if line.startswith(name + ":"):
+                        event = UrcEvent.parse(line)
+                        self._dispatch_event(
+                            UrcEvent(event.name, event.params[1:]))
+
+    def _wait_readable(self, wakeup):
+        fd = self._session.fileno()
+        if fd is None:
+            # closed meanwhile, reopened by the next round
+            return
+
+        # no timeout, stop() and close wake it up
+        self._wait(wakeup, fd)
+
+    def _wait(self, wakeup, fd=None, timeout=None):
+        """Wait until fd is readable, wakeup is written or timeout."""
+        fds = [wakeup] if fd is None else [fd, wakeup]
+        try:
+            readable = select.select(fds, [], [], timeout)[0]
+        except (select.error, ValueError) as exc:
+            # closed by a command meanwhile
+            if isinstance(exc, select.error) and \
+                    exc.args[0] not in (errno.EINTR, errno.EBADF):
+                raise
+            return
+
+        if wakeup in readable:
+            os.read(wakeup, 4096)
+
+    def _dispatch(self, line):
+        self._dispatch_event(UrcEvent.parse(line))
+
+    def _dispatch_event(self, event):
+        with self._lock:
+            if event.is_registration():
+                self._registrations[event.name] = event
+            callbacks = list(self._callbacks)
+
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                _logger.warning(format_exc())
@@ -0,0 +1,76 @@
+"""
+Base of the information objects sampled from the modem, like Signal or
+CellularInformation.
+"""
+
+from operator import attrgetter
+
+# class: attrgetter of all its slots
+_getters = {}
+
+
+class _ValueType(type):
+    """Freeze a Value once its __init__ returns."""
+
+    def __call__(cls, *args, **kwargs):
+        value = cls.__new__(cls)
+        object.__setattr__(value, "_frozen", False)
+        value.__init__(*args, **kwargs)
+        object.__setattr__(value, "_frozen", True)
+        return value
+
+
+class Value(object):
+    """
+    Immutable value object stored in __slots__, compared and hashed by
+    the values of its slots, so that consecutive samples can be checked
+    for changes with ==. Slots are set by __init__ only, assigning them
+    later raises AttributeError.
+
+    Subclasses list their fields in __slots__ and expose them as
+    properties. Sequences are stored as tuples.
+    """
+
+    __metaclass__ = _ValueType
+
+    __slots__ = ("_frozen",)
+
+    def __setattr__(self, name, value):
+        if self._frozen:
+            raise AttributeError("{} is immutable".format(
+                type(self).__name__))
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        raise AttributeError("{} is immutable".format(type(self).__name__))
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def _values(self):
+        getter = _getters.get(type(self))
+        if getter is None:
+            names = list(self.__slots__)
+            # attrgetter of one name does not return a tuple
+            getter = attrgetter(*(names + names[:1] if len(names) == 1
+                                  else names))
+            _getters[type(self)] = getter
+        return getter(self)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and \
+            self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join([
+            "{}={!r}".format(name.lstrip("_"), getattr(self, name))
+            for name in self.__slots__]))
@@ -1,9 +1,11 @@
 import logging
 import re
-import sh
 from sh import ErrorReturnCode
 from traceback import format_exc
 
+from cellular_utility.metrics import registry as metrics
+from cellular_utility.runner import Command
+
 _logger = logging.getLogger("sanji.cellular")
 
 
@@ -22,10 +24,11 @@ class VnStat(object):
         self._interface = interface
 
     def update(self):
-        vnstat = sh.vnstat
+        vnstat = Command("vnstat")
 
         try:
-            vnstat("-i", self._interface, "-u")
+            with metrics.timer("vnstat", "update"):
+                vnstat("-i", self._interface, "-u")
 
         except ErrorReturnCode:
             _logger.warning(format_exc())
@@ -33,13 +36,14 @@ class VnStat(object):
             raise VnStatError
 
     def delete(self):
-        vnstat = sh.vnstat
-        service = sh.service
+        vnstat = Command("vnstat")
+        service = Command("service")
 
         try:
-            service("vnstat", "stop")
-            vnstat("-i", self._interface, "--delete", "--force")
-            service("vnstat", "start")
+            with metrics.timer("vnstat", "delete"):
+                service("vnstat", "stop")
+                vnstat("-i", self._interface, "--delete", "--force")
+                service("vnstat", "start")
         except ErrorReturnCode:
             _logger.warning(format_exc())
 
@@ -53,11 +57,12 @@ class VnStat(object):
                 "rxkbyte": 3002
             }
         """
-        vnstat = sh.vnstat
+        vnstat = Command("vnstat")
 
         try:
-            output = vnstat("-i", self._interface, "--dumpdb")
-            output = str(output)
+            with metrics.timer("vnstat", "dumpdb"):
+                output = vnstat("-i", self._interface, "--dumpdb")
+                output = str(output)
 
         except ErrorReturnCode:
             _logger.warning(format_exc())
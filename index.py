@@ -1,9 +1,10 @@
 #!/usr/bin/env python
 # -*- coding: UTF-8 -*-
 
+from contextlib import contextmanager
 import logging
 import os
-from threading import Thread
+from threading import Lock, Thread
 from traceback import format_exc
 
 from sanji.connection.mqtt import Mqtt
@@ -14,9 +15,20 @@ from sanji.model_initiator import ModelInitiator
 from voluptuous import All, Any, Length, Match, Range, Required, Schema
 from voluptuous import REMOVE_EXTRA, Optional, In
 
+from cellular_utility.at_session import AtSessionBackend
+from cellular_utility.qmi import QmiBackend
 from cellular_utility.cell_mgmt import CellMgmt, CellMgmtError
 from cellular_utility.cell_mgmt import CellAllModuleNotSupportError
+from cellular_utility.cell_mgmt import CellMgmtDeadlineExceeded
+from cellular_utility.deadline import deadline
+from cellular_utility.firmware import FirmwareJobBusy, FirmwareJobs
+from cellular_utility.future import FutureTimeout, wait_all
 from cellular_utility.management import Manager
+from cellular_utility.metrics import registry as metrics
+from cellular_utility.pool import WorkerPool
+from cellular_utility.profiler import ConnectProfiler
+from cellular_utility.scheduler import CommandScheduler, Priority
+from cellular_utility.urc import UrcListener
 from cellular_utility.vnstat import VnStat, VnStatError
 
 from sh import rm, service
@@ -30,6 +42,14 @@ _logger = logging.getLogger("sanji.cellular")
 
 class Index(Sanji):
 
+    # "cell_mgmt" spawns /sbin/cell_mgmt per query,
+    # "at" keeps the AT port open and serves queries over it,
+    # "qmi" serves queries with QMI requests on the QMI port
+    BACKEND = os.getenv("CELLULAR_BACKEND", "cell_mgmt")
+
+    # budget of modem queries made by a GET request
+    GET_BUDGET_SEC = 5
+
     CONF_PROFILE_SCHEMA = Schema(
         {
             Required("apn", default="internet"):
@@ -87,7 +107,30 @@ class Index(Sanji):
 
         self._dev_name = None
         self._mgr = None
+        # held while self._mgr is stopped or replaced
+        self._mgr_lock = Lock()
         self._vnstat = None
+        self._urc_listener = None
+
+        # owns the modem, request handlers are served before Manager and
+        # the observer
+        self._scheduler = CommandScheduler(CellMgmt())
+        self._scheduler.start()
+        self._cell_mgmt = self._scheduler.proxy(Priority.user)
+
+        # vnstat and other non-modem work overlapped with modem queries
+        self._pool = WorkerPool(2, "sanji.cellular.index")
+
+        # firmware switches run in the background, step by step, with the
+        # Manager paused
+        self._fw_jobs = FirmwareJobs(
+            self._cell_mgmt, self._publish_fw_job,
+            pause=self._manager_paused)
+        # connect traces of all Manager instances, see get_connections()
+        self._profiler = ConnectProfiler()
+
+        # served when the modem does not answer in time
+        self._pdpc_list = []
 
         self.__init_monit_config(
             enable=(self.model.db[0]["enable"] and
@@ -104,12 +147,19 @@ class Index(Sanji):
         self._init_thread.daemon = True
         self._init_thread.start()
 
+    def before_stop(self):
+        """Called by Sanji.stop()."""
+        if self._urc_listener is not None:
+            self._urc_listener.stop()
+            self._urc_listener = None
+
     def __initial_procedure(self):
         """
         Continuously check Cellular modem existence.
         Set self._dev_name, self._mgr, self._vnstat properly.
         """
-        cell_mgmt = CellMgmt()
+        cell_mgmt = self._scheduler.proxy(Priority.control)
+        minfo = None
         wwan_node = None
 
         for retry in xrange(0, 4):
@@ -117,7 +167,8 @@ class Index(Sanji):
                 return
 
             try:
-                wwan_node = cell_mgmt.m_info().wwan_node
+                minfo = cell_mgmt.m_info()
+                wwan_node = minfo.wwan_node
                 break
             except CellAllModuleNotSupportError:
                 break
@@ -125,6 +176,18 @@ class Index(Sanji):
                 _logger.warning("get wwan_node failure: " + format_exc())
                 cell_mgmt.power_cycle(timeout_sec=60)
 
+        if (Index.BACKEND == "at" and
+                minfo is not None and minfo.at_port is not None):
+            backend = AtSessionBackend(minfo.at_port)
+            CellMgmt.set_backend(backend)
+
+            # registration and signal reports over the same AT port
+            self._urc_listener = UrcListener(backend.session)
+            self._urc_listener.start()
+        elif (Index.BACKEND == "qmi" and
+                minfo is not None and minfo.qmi_port is not None):
+            CellMgmt.set_backend(QmiBackend(minfo.qmi_port))
+
         self._dev_name = wwan_node
         self.__init_monit_config(
             enable=(self.model.db[0]["enable"] and
@@ -190,7 +253,10 @@ class Index(Sanji):
             keepalive_enabled=self.model.db[0]["keepalive"]["enable"],
             keepalive_host=self.model.db[0]["keepalive"]["targetHost"],
             keepalive_period_sec=self.model.db[0]["keepalive"]["intervalSec"],
-            log_period_sec=60)
+            log_period_sec=60,
+            scheduler=self._scheduler,
+            urc_listener=self._urc_listener,
+            profiler=self._profiler)
 
         # clear PIN code if pin error
         if self._mgr.status() == Manager.Status.pin_error and pin != "":
@@ -224,12 +290,13 @@ class Index(Sanji):
                    else "-I {}".format(iface)
         config = """check program ping-test with path "/bin/ping {target_host} {ifacecmd} -c 3 -W 20"
     if status != 0
-    then exec "/bin/bash -c '/usr/sbin/cell_mgmt power_off force && /bin/sleep 5 && /usr/local/sbin/reboot -i -f -d'"
+    then exec "/bin/bash -c '/usr/bin/flock -w 120 {lock_file} /usr/sbin/cell_mgmt power_off force; /bin/sleep 5; /usr/local/sbin/reboot -i -f -d'"
     every {cycles} cycles
 """  # noqa
         with open("/etc/monit/conf.d/keepalive", "w") as f:
             f.write(config.format(
-                target_host=target_host, ifacecmd=ifacecmd, cycles=cycles))
+                target_host=target_host, ifacecmd=ifacecmd, cycles=cycles,
+                lock_file=CellMgmt.LOCK_FILE))
         service("monit", "restart")
 
     @Route(methods="get", resource="/network/cellulars")
@@ -279,14 +346,21 @@ class Index(Sanji):
 
         # since all items are required in PUT,
         # its schema is identical to cellular.json
-        self.model.db[0] = data
-        self.model.save_db()
+        with self._mgr_lock:
+            # the paused Manager is created again once the switch is done
+            if self._fw_jobs.running() is not None:
+                return response(
+                    code=400, data={"message": "firmware switch in progress"})
 
-        if self._mgr is not None:
-            self._mgr.stop()
-            self._mgr = None
+            self.model.db[0] = data
+            self.model.save_db()
+
+            if self._mgr is not None:
+                self._mgr.stop()
+                self._mgr = None
+
+            self.__create_manager()
 
-        self.__create_manager()
         self.__init_monit_config(
             enable=(self.model.db[0]["enable"] and
                     self.model.db[0]["keepalive"]["enable"] and True and
@@ -312,20 +386,23 @@ class Index(Sanji):
         sinfo = self._mgr.static_information()
         cinfo = self._mgr.cellular_information()
         ninfo = self._mgr.network_information()
+
+        # query the modem while vnstat runs
+        usage_future = self._pool.submit(self._usage)
+        with deadline(Index.GET_BUDGET_SEC):
+            pdpc_future = self._cell_mgmt.submit("pdp_context_list")
+            wait_all([pdpc_future, usage_future])
         try:
-            pdpc_list = self._mgr.pdp_context_list()
+            pdpc_list = pdpc_future.result(0)
+            self._pdpc_list = pdpc_list
+        except (CellMgmtDeadlineExceeded, FutureTimeout):
+            pdpc_future.cancel()
+            _logger.warning("pdp_context_list timeout, use last known")
+            pdpc_list = self._pdpc_list
         except CellMgmtError:
             pdpc_list = []
 
-        try:
-            self._vnstat.update()
-            usage = self._vnstat.get_usage()
-
-        except VnStatError:
-            usage = {
-                "txkbyte": -1,
-                "rxkbyte": -1
-            }
+        usage = usage_future.result()
 
         # clear PIN code if pin error
         if (config["pinCode"] != "" and
@@ -387,6 +464,17 @@ class Index(Sanji):
             }
         }
 
+    def _usage(self):
+        try:
+            self._vnstat.update()
+            return self._vnstat.get_usage()
+
+        except VnStatError:
+            return {
+                "txkbyte": -1,
+                "rxkbyte": -1
+            }
+
     def _publish_network_info(
             self,
             nwk_info):
@@ -411,6 +499,29 @@ class Index(Sanji):
         self.publish.event.put("/network/interfaces/{}".format(name),
                                data=data)
 
+    @Route(methods="get", resource="/network/cellulars/:id/metrics")
+    def get_metrics(self, message, response):
+        id_ = int(message.param["id"])
+        if id_ != 1:
+            return response(code=400, data={"message": "resource not exist"})
+
+        return response(code=200, data=metrics.exposition())
+
+    @Route(methods="get", resource="/network/cellulars/:id/connections")
+    def get_connections(self, message, response):
+        id_ = int(message.param["id"])
+        if id_ != 1:
+            return response(code=400, data={"message": "resource not exist"})
+
+        stats = {"all": self._profiler.stats()}
+        for label in ["firmware", "carrier", "config"]:
+            stats[label] = self._profiler.stats(group_by=label)
+
+        return response(code=200, data={
+            "stats": stats,
+            "traces": [trace.to_dict() for trace in self._profiler.traces()]
+        })
+
     @Route(methods="get", resource="/network/cellulars/:id/firmware")
     def get_fw(self, message, response):
         if not self.__init_completed():
@@ -420,7 +531,7 @@ class Index(Sanji):
         if id_ != 1:
             return response(code=400, data={"message": "resource not exist"})
 
-        m_info = self._mgr._cell_mgmt.m_info()
+        m_info = self._cell_mgmt.m_info()
         if m_info.module != "MC7354":
             return response(code=200, data={
                 "switchable": False,
@@ -429,7 +540,7 @@ class Index(Sanji):
                 "avaliable": None
             })
 
-        fw_info = self._mgr._cell_mgmt.get_cellular_fw()
+        fw_info = self._cell_mgmt.get_cellular_fw()
         return response(code=200, data=fw_info)
 
     @Route(methods="put", resource="/network/cellulars/:id/firmware")
@@ -441,13 +552,61 @@ class Index(Sanji):
         if id_ != 1:
             return response(code=400, data={"message": "resource not exist"})
 
-        response(code=200)
+        try:
+            job = self._fw_jobs.start(
+                fwver=message.data["fwver"],
+                config=message.data["config"],
+                carrier=message.data["carrier"]
+            )
+        except FirmwareJobBusy:
+            return response(
+                code=400, data={"message": "firmware switch in progress"})
+
+        return response(code=200, data=job.to_dict())
+
+    @Route(methods="get",
+           resource="/network/cellulars/:id/firmware/jobs/:jobId")
+    def get_fw_job(self, message, response):
+        if not self.__init_completed():
+            return response(code=400, data={"message": "resource not exist"})
 
-        self._mgr._cell_mgmt.set_cellular_fw(
-            fwver=message.data["fwver"],
-            config=message.data["config"],
-            carrier=message.data["carrier"]
-        )
+        id_ = int(message.param["id"])
+        if id_ != 1:
+            return response(code=400, data={"message": "resource not exist"})
+
+        job = self._fw_jobs.get(int(message.param["jobId"]))
+        if job is None:
+            return response(code=404, data={"message": "resource not exist"})
+
+        return response(code=200, data=job.to_dict())
+
+    @contextmanager
+    def _manager_paused(self):
+        """
+        Stop the Manager, so that it neither power cycles nor reconnects
+        the module in the middle of a firmware switch, create it again
+        afterwards.
+        """
+        with self._mgr_lock:
+            paused = self._mgr
+            if paused is not None:
+                paused.stop()
+
+        try:
+            yield
+        finally:
+            with self._mgr_lock:
+                # unless put() has replaced it meanwhile
+                if paused is not None and self._mgr is paused:
+                    try:
+                        self.__create_manager()
+                    except Exception:
+                        _logger.warning(format_exc())
+
+    def _publish_fw_job(self, job):
+        self.publish.event.put(
+            "/network/cellulars/1/firmware/jobs/{}".format(job.id),
+            data=job.to_dict())
 
 
 if __name__ == "__main__":
@@ -6,9 +6,17 @@ import os
 import sys
 import logging
 import unittest
+from copy import deepcopy
+from mock import Mock, patch
+from threading import Event
 
 try:
     sys.path.append(os.path.dirname(os.path.realpath(__file__)) + "/../")
+    from sanji.connection.mockup import Mockup
+    from cellular_utility.cell_mgmt import MInfo
+    from cellular_utility.firmware import FirmwareJob
+    from cellular_utility.metrics import MetricsRegistry
+    from cellular_utility.profiler import ConnectTrace
     from index import Index
 except ImportError as e:
     print "Please check the python PATH for import test module. (%s)" \
@@ -152,6 +160,210 @@ class TestCellularStatic(unittest.TestCase):
         self.assertEqual(SUT, data)
 
 
+CONFIG = {
+    "id": 1,
+    "enable": False,
+    "pinCode": "",
+    "pdpContext": {
+        "static": True,
+        "id": 1,
+        "retryTimeout": 600,
+        "primary": {
+            "apn": "internet",
+            "type": "ipv4v6",
+            "auth": {
+                "protocol": "none"
+            }
+        },
+        "secondary": {
+            "apn": "",
+            "type": "ipv4v6",
+            "auth": {
+                "protocol": "none"
+            }
+        }
+    },
+    "keepalive": {
+        "enable": True,
+        "targetHost": "8.8.8.8",
+        "intervalSec": 60,
+        "reboot": {
+            "enable": False,
+            "cycles": 1
+        }
+    }
+}
+
+FW = {"fwver": "05.05.58.01", "config": "VZW_005.029_001", "carrier": "VZW"}
+
+
+class TestIndexRoutes(unittest.TestCase):
+    def setUp(self):
+        for name in ["rm", "service", "VnStat"]:
+            patch("index." + name).start()
+        model = patch("index.ModelInitiator").start().return_value
+        model.db = [deepcopy(CONFIG)]
+        self.manager = patch("index.Manager").start()
+        self.manager.side_effect = lambda **kwargs: Mock()
+        self.cell_mgmt = patch("index.CellMgmt").start().return_value
+
+        # the init thread waits for m_info until released
+        self.init_release = Event()
+
+        def m_info():
+            self.init_release.wait()
+            return MInfo(module="MC7354", wwan_node="wwan0")
+        self.cell_mgmt.m_info.side_effect = m_info
+        self.cell_mgmt.set_fw_preference.return_value = {
+            "status": "ok", "info": ""}
+        self.cell_mgmt.get_cellular_fw.return_value = {"current": FW}
+
+        self.index = Index(connection=Mockup())
+        self.index.publish = Mock()
+
+    def tearDown(self):
+        self._init()
+        self.index._scheduler.stop()
+        patch.stopall()
+
+    def _init(self):
+        self.init_release.set()
+        if self.index._init_thread is not None:
+            self.index._init_thread.join(5)
+
+    def _call(self, route, data=None, **param):
+        param.setdefault("id", "1")
+        response = Mock()
+        getattr(self.index, route)(
+            message=Mock(param=param, data=data), response=response,
+            test=True)
+        return response.call_args[1]["code"], response.call_args[1]["data"]
+
+    def _traced_connect(self):
+        trace = self.index._profiler.begin(
+            "connect", {"config": "1a2b3c4d", "carrier": "VZW"})
+        trace.attempt()
+        for phase in ["stop", "attach", "start"]:
+            with trace.phase(phase):
+                pass
+        trace.finish(ConnectTrace.Result.connected)
+        return trace
+
+    def _put_fw(self):
+        code, data = self._call("put_fw", data=dict(FW))
+        self.assertEqual(200, code)
+        return self.index._fw_jobs.get(data["id"])
+
+    def test_put_fw_should_start_job_and_resume_manager(self):
+        # arrange
+        self._init()
+        paused = self.index._mgr
+
+        # act
+        job = self._put_fw()
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.verified, job.state)
+        paused.stop.assert_called_once_with()
+        self.assertEqual(2, self.manager.call_count)
+        self.assertIsNot(paused, self.index._mgr)
+        self.assertFalse(self.index._mgr.stop.called)
+        self.assertEqual(
+            (200, job.to_dict()),
+            self._call("get_fw_job", jobId=str(job.id)))
+
+    def test_failed_fw_job_should_resume_manager(self):
+        # arrange
+        self._init()
+        self.cell_mgmt.set_fw_preference.return_value = {
+            "status": "err", "info": "ERROR"}
+        paused = self.index._mgr
+
+        # act
+        job = self._put_fw()
+        job.join(5)
+
+        # assert
+        self.assertEqual(FirmwareJob.State.failed, job.state)
+        paused.stop.assert_called_once_with()
+        self.assertIsNot(paused, self.index._mgr)
+
+    def test_get_fw_job_should_wait_for_init(self):
+        # act
+        before = self._call("get_fw_job", jobId="1")
+        self._init()
+        after = self._call("get_fw_job", jobId="1")
+
+        # assert
+        self.assertEqual(400, before[0])
+        self.assertEqual(404, after[0])
+
+    def test_put_should_be_rejected_while_fw_job_runs(self):
+        # arrange
+        self._init()
+        power_cycle_release = Event()
+        self.cell_mgmt.power_cycle.side_effect = \
+            lambda *args, **kwargs: power_cycle_release.wait()
+        job = self._put_fw()
+
+        # act
+        try:
+            code, data = self._call("put", data=deepcopy(CONFIG))
+        finally:
+            power_cycle_release.set()
+            job.join(5)
+
+        # assert
+        self.assertEqual(400, code)
+        self.assertEqual("firmware switch in progress", data["message"])
+        self.assertEqual(2, self.manager.call_count)
+        self.assertEqual(
+            (200, CONFIG), self._call("put", data=deepcopy(CONFIG)))
+        self.assertEqual(3, self.manager.call_count)
+
+    def test_get_metrics_should_expose_connect_phases(self):
+        # arrange
+        registry = MetricsRegistry()
+        patch("index.metrics", registry).start()
+        patch("cellular_utility.profiler.metrics", registry).start()
+        self._traced_connect()
+
+        # act
+        code, data = self._call("get_metrics")
+
+        # assert
+        self.assertEqual(200, code)
+        self.assertIn(
+            "# TYPE sanji_cellular_connect_seconds histogram\n", data)
+        for phase in ["stop", "attach", "start"]:
+            self.assertIn(
+                "sanji_cellular_connect_seconds_count{{op=\"{}\"}} 1\n"
+                .format(phase), data)
+        self.assertEqual(400, self._call("get_metrics", id="2")[0])
+
+    def test_get_connections_should_return_stats_and_traces(self):
+        # arrange
+        trace = self._traced_connect()
+
+        # act
+        code, data = self._call("get_connections")
+
+        # assert
+        self.assertEqual(200, code)
+        self.assertEqual(
+            ["all", "carrier", "config", "firmware"],
+            sorted(data["stats"].keys()))
+        self.assertEqual(1, data["stats"]["all"]["connected"])
+        self.assertEqual(1, data["stats"]["carrier"]["VZW"]["traces"])
+        self.assertEqual([None], data["stats"]["firmware"].keys())
+        self.assertEqual([trace.to_dict()], data["traces"])
+        self.assertEqual(
+            ["stop", "attach", "start"],
+            [phase["name"] for phase in data["traces"][0]["phases"]])
+        self.assertEqual(400, self._call("get_connections", id="2")[0])
+
+
 if __name__ == "__main__":
     FORMAT = "%(asctime)s - %(levelname)s - %(lineno)s - %(message)s"
     logging.basicConfig(level=20, format=FORMAT)